@@ -0,0 +1,154 @@
+import sys
+sys.path.insert(0, 'deco')
+
+import argparse
+import json
+import os
+import time
+import traceback
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os.path import basename, isdir, join, splitext
+
+from archive import FunctionArchive, MAGIC as ARCHIVE_MAGIC
+from cache import FunctionCache, analyze
+
+# Archives and caches opened by this (worker) process, keyed on path.
+ARCHIVES = {}
+CACHES = {}
+
+
+def is_archive(path):
+    with open(path, 'rb') as f:
+        return f.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
+
+
+def find_jobs(path):
+    """
+    (name, path, in_archive) for every exported function in `path`, which
+    is either a directory of .json/.pcb files, a function archive or a
+    single exported function.
+
+    Outputs are named after the job, so when a directory has both foo.json
+    and foo.pcb those two are named by their full file name instead of
+    both writing foo's output.
+    """
+    if isdir(path):
+        fnames = [fname for fname in sorted(os.listdir(path)) if splitext(fname)[1] in ['.json', '.pcb']]
+        stems = [splitext(fname)[0] for fname in fnames]
+
+        return [(stem if stems.count(stem) == 1 else fname, join(path, fname), False) \
+                for stem, fname in zip(stems, fnames)]
+
+    if is_archive(path):
+        with FunctionArchive(path) as archive:
+            return [(name, path, True) for name in sorted(archive.names())]
+
+    return [(splitext(basename(path))[0], path, False)]
+
+
+def read_job(name, path, in_archive):
+    """
+    The raw bytes of the function's export and whether they're a binary container.
+    """
+    if in_archive:
+        if path not in ARCHIVES:
+            ARCHIVES[path] = FunctionArchive(path)
+
+        return bytes(ARCHIVES[path].container(name)), True
+
+    with open(path, 'rb') as f:
+        return f.read(), path.endswith('.pcb')
+
+
+def decompile(name, path, in_archive, out_dir, cache_dir=None):
+    """
+    Decompile one function, write its output and return its summary row.
+    Runs in a worker process so it never raises, failures go in the row.
+    """
+    row = {'name': name, 'status': 'ok', 'cached': False, 'blocks': 0, 'ops': 0, 'seconds': 0.0, 'error': ''}
+    start = time.time()
+
+    try:
+        cache = None
+
+        if cache_dir is not None:
+            if cache_dir not in CACHES:
+                CACHES[cache_dir] = FunctionCache(cache_dir)
+
+            cache = CACHES[cache_dir]
+
+        data, binary = read_job(name, path, in_archive)
+        record, row['cached'] = analyze(data, binary=binary, cache=cache)
+
+        row['blocks'] = record['blocks']
+        row['ops'] = record['ops']
+
+        with open(join(out_dir, '%s.json' % name), 'w') as f:
+            json.dump(record['func'], f)
+
+        with open(join(out_dir, '%s.cfg.txt' % name), 'w') as f:
+            f.write(record['text'])
+    except Exception as e:
+        row['status'] = 'error'
+        row['error'] = '%s: %s' % (type(e).__name__, e)
+
+        with open(join(out_dir, '%s.error.txt' % name), 'w') as f:
+            f.write(traceback.format_exc())
+
+    row['seconds'] = time.time() - start
+    return row
+
+
+def format_summary(rows):
+    name_width = max([len('function')] + [len(row['name']) for row in rows])
+    lines = ['%-*s  %-6s  %-6s  %6s  %7s  %8s  %s' % (name_width, 'function', 'status', 'cached',
+                                                     'blocks', 'ops', 'seconds', 'error')]
+
+    for row in rows:
+        lines.append('%-*s  %-6s  %-6s  %6d  %7d  %8.3f  %s' % (name_width, row['name'], row['status'],
+                                                                'yes' if row['cached'] else 'no', row['blocks'],
+                                                                row['ops'], row['seconds'], row['error']))
+
+    num_failed = len([row for row in rows if row['status'] != 'ok'])
+    num_cached = len([row for row in rows if row['cached']])
+    lines.append('%d functions, %d failed, %d from cache' % (len(rows), num_failed, num_cached))
+
+    return '\n'.join(lines)
+
+
+def run_batch(path, out_dir, workers=None, cache_dir=None):
+    jobs = find_jobs(path)
+    os.makedirs(out_dir, exist_ok=True)
+
+    rows = []
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(decompile, name, job_path, in_archive, out_dir, cache_dir) \
+                   for name, job_path, in_archive in jobs]
+
+        for future in as_completed(futures):
+            rows.append(future.result())
+
+    rows.sort(key=lambda row: row['name'])
+
+    with open(join(out_dir, 'summary.tsv'), 'w') as f:
+        f.write('\t'.join(['function', 'status', 'cached', 'blocks', 'ops', 'seconds', 'error']) + '\n')
+
+        for row in rows:
+            f.write('%s\t%s\t%d\t%d\t%d\t%.3f\t%s\n' % (row['name'], row['status'], row['cached'], row['blocks'],
+                                                        row['ops'], row['seconds'], row['error']))
+
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decompile every function in a directory or archive.')
+    parser.add_argument('input', help='directory of exported .json/.pcb functions or a function archive')
+    parser.add_argument('-o', '--output', default='output', help='directory to write results to')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes')
+    parser.add_argument('-c', '--cache', default=None, help='directory of the analysis cache (off by default)')
+    args = parser.parse_args()
+
+    rows = run_batch(args.input, args.output, workers=args.jobs, cache_dir=args.cache)
+    print(format_summary(rows))
@@ -0,0 +1,263 @@
+import sys
+sys.path.insert(0, 'deco')
+
+import argparse
+import json
+import math
+import os
+import time
+import tracemalloc
+
+from os.path import join, splitext
+
+from cfg import CFG
+from context import AnalysisContext
+from func import Function
+from instrument import Trace
+from synth import synthesize
+
+# The instrumented passes reported on, in pipeline order. Anything else that
+# runs (and the time between passes) is counted as `other`.
+STAGE_NAMES = ['json.load', 'Instruction.fromjson', 'decompose_into_blocks', 'update_structure',
+               'sort_by_postorder', 'generate_dom_tree', 'generate_dom_frontiers', 'insert_phis',
+               'convert_to_ssa', 'propagate_constants', 'number_values', 'simplify', 'build_ast',
+               'simplify_ast', 'tojson', 'other']
+
+# Stages taking less than this in the baseline are too noisy to flag.
+MIN_REGRESSION_SECONDS = 0.005
+
+# Same for working out how a stage scales, and how it may scale before we call it out.
+MIN_SCALING_SECONDS = 0.001
+SUPERLINEAR_EXPONENT = 1.3
+
+
+def run_pipeline(data, trace, serialize=True):
+    """
+    Load, decompile and serialize an exported function like Function.fromjson
+    followed by tojson, in `trace`. Returns (#instructions, #ops).
+    """
+    j = trace.run('json.load', None, json.loads, (data,), {})
+
+    with AnalysisContext() as ctx:
+        cfg = CFG.fromjson(j)
+
+    func = Function(cfg, ctx)
+
+    if serialize:
+        func.tojson()
+
+    return len(j), sum(len(ij['pcode']) for ij in j)
+
+
+def stage_seconds(trace, total):
+    """
+    The time spent in each stage, not counting the time spent in the other
+    stages it calls (convert_to_ssa calls insert_phis, every CFG calls
+    update_structure and so on).
+    """
+    passes = trace.passes()
+    seconds = {name: passes[name]['self_seconds'] if name in passes else 0.0 for name in STAGE_NAMES}
+
+    seconds['other'] = total - sum(seconds.values())
+    seconds['total'] = total
+
+    return seconds, {name: totals['calls'] for name, totals in passes.items()}
+
+
+def bench_function(data, repeats=3, serialize=True):
+    """
+    The fastest of `repeats` runs for each stage and for the whole pipeline,
+    plus the peak memory of a separate run (tracing slows everything down).
+    """
+    best = {name: None for name in STAGE_NAMES + ['total']}
+    calls = {}
+
+    for _ in range(repeats):
+        with Trace() as trace:
+            start = time.perf_counter()
+            num_insns, num_ops = run_pipeline(data, trace, serialize)
+            total = time.perf_counter() - start - trace.overhead
+
+        seconds, calls = stage_seconds(trace, total)
+
+        for name in best:
+            if best[name] is None or seconds[name] < best[name]:
+                best[name] = seconds[name]
+
+    tracemalloc.start()
+
+    try:
+        with Trace() as trace:
+            run_pipeline(data, trace, serialize)
+
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'insns': num_insns,
+        'ops': num_ops,
+        'seconds': best,
+        'calls': calls,
+        'insns_per_second': num_insns / best['total'],
+        'peak_bytes': peak
+    }
+
+
+def find_inputs(func_dir, sizes, seed=0):
+    """
+    (name, JSON text) for each function in `func_dir` and a synthetic one of each size.
+    """
+    inputs = []
+
+    for fname in sorted(os.listdir(func_dir)):
+        name, ext = splitext(fname)
+
+        if ext == '.json':
+            with open(join(func_dir, fname)) as f:
+                inputs.append((name, f.read()))
+
+    for size in sizes:
+        inputs.append(('synthetic-%d' % size, json.dumps(synthesize(size, seed=seed))))
+
+    return inputs
+
+
+def run_bench(inputs, repeats=3, serialize=True):
+    results = {}
+
+    for name, data in inputs:
+        try:
+            results[name] = bench_function(data, repeats=repeats, serialize=serialize)
+        except Exception as e:
+            results[name] = {'error': '%s: %s' % (type(e).__name__, e)}
+
+    return results
+
+
+def find_regressions(results, baseline, threshold):
+    """
+    (function, stage, baseline seconds, seconds) for each stage that got more
+    than `threshold` (a fraction) slower than in `baseline`.
+    """
+    regressions = []
+
+    for name, result in sorted(results.items()):
+        old = baseline.get(name)
+
+        if old is None or 'error' in result or 'error' in old:
+            continue
+
+        for stage in STAGE_NAMES + ['total']:
+            old_seconds = old['seconds'].get(stage)
+            seconds = result['seconds'][stage]
+
+            if old_seconds is None or old_seconds < MIN_REGRESSION_SECONDS:
+                continue
+
+            if seconds > old_seconds * (1 + threshold):
+                regressions.append((name, stage, old_seconds, seconds))
+
+    return regressions
+
+
+def scaling(results):
+    """
+    For each stage, the k in seconds ~ instructions^k going from the smallest
+    to the largest synthetic function. Stages too quick to time are left out.
+    """
+    synthetic = sorted([result for name, result in results.items() \
+                        if name.startswith('synthetic-') and 'error' not in result],
+                       key=lambda result: result['insns'])
+
+    if len(synthetic) < 2:
+        return {}
+
+    small, large = synthetic[0], synthetic[-1]
+    exponents = {}
+
+    for stage in STAGE_NAMES + ['total']:
+        if min(small['seconds'][stage], large['seconds'][stage]) < MIN_SCALING_SECONDS:
+            continue
+
+        exponents[stage] = math.log(large['seconds'][stage] / small['seconds'][stage]) / \
+                           math.log(float(large['insns']) / small['insns'])
+
+    return exponents
+
+
+def short_name(name, width=40):
+    return name if len(name) <= width else name[:width-3] + '...'
+
+
+def format_report(results, regressions=[], exponents={}):
+    lines = []
+
+    for name, result in sorted(results.items()):
+        lines.append(short_name(name, 72))
+
+        if 'error' in result:
+            lines.append('  failed: %s' % result['error'])
+            continue
+
+        lines.append('  %d instructions, %d ops, %.0f instructions/s, peak %.1f MB' % \
+                     (result['insns'], result['ops'], result['insns_per_second'], result['peak_bytes'] / 1e6))
+
+        total = result['seconds']['total']
+
+        for stage in STAGE_NAMES + ['total']:
+            seconds = result['seconds'][stage]
+            lines.append('  %-24s %9.4f s  %5.1f%%  %s' % (stage, seconds, 100 * seconds / total,
+                                                          '(x%d)' % result['calls'][stage] \
+                                                          if result['calls'].get(stage, 1) > 1 else ''))
+
+    if len(exponents) > 0:
+        lines.append('')
+        lines.append('scaling with the size of the synthetic functions (seconds ~ instructions^k):')
+
+        for stage in STAGE_NAMES + ['total']:
+            if stage in exponents:
+                lines.append('  %-24s k = %.2f%s' % (stage, exponents[stage],
+                                                     '  superlinear' if exponents[stage] > SUPERLINEAR_EXPONENT else ''))
+
+    if len(regressions) > 0:
+        lines.append('')
+        lines.append('%d regressions:' % len(regressions))
+
+        for name, stage, old_seconds, seconds in regressions:
+            lines.append('  %-40s %-24s %9.4f s -> %9.4f s (+%.0f%%)' % \
+                         (short_name(name), stage, old_seconds, seconds, 100 * (seconds / old_seconds - 1)))
+
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time each stage of the decompilation pipeline.')
+    parser.add_argument('-f', '--funcs', default='funcs', help='directory of exported .json functions')
+    parser.add_argument('-s', '--sizes', default='100,1000,5000',
+                        help='comma separated block counts of the synthetic functions '
+                             '(about 5 instructions each, so 20000 is ~100k instructions)')
+    parser.add_argument('-r', '--repeats', type=int, default=3, help='runs per function, the fastest is kept')
+    parser.add_argument('-b', '--baseline', default=None, help='results of an earlier run to compare against')
+    parser.add_argument('-t', '--threshold', type=float, default=0.2,
+                        help='how much slower (as a fraction) a stage can get before it counts as a regression')
+    parser.add_argument('--no-json', action='store_true',
+                        help="don't time tojson, which is quadratic in the number of uses")
+    parser.add_argument('-o', '--output', default=None, help='file to save the results to (for use as a baseline)')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if len(size) > 0]
+    results = run_bench(find_inputs(args.funcs, sizes), repeats=args.repeats, serialize=not args.no_json)
+
+    regressions = []
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.threshold)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    print(format_report(results, regressions, scaling(results)))
+    sys.exit(1 if len(regressions) > 0 else 0)
@@ -0,0 +1,233 @@
+"""
+Single-file archive holding the P-code of many functions.
+
+Each function is stored as a pcode_bin container. An index at the end of
+the file maps function names and entry addresses to the byte range of
+their container, so opening an archive only reads the header and index
+and loading a function only touches that function's pages of the mmap.
+
+Layout (all little-endian):
+
+    header
+    containers      n_funcs x pcode_bin container
+    index           n_funcs x (INDEX_ENTRY, utf-8 name)
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from io import BytesIO
+from os.path import abspath, basename, dirname, splitext
+
+from loader import iter_binary_insns, unpack_strings
+from pcode_bin import write_pcode, HEADER as PCODE_HEADER, INSN
+
+MAGIC = b'PCAR'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHHIQ')      # magic, version, flags, n_funcs, index offset
+INDEX_ENTRY = struct.Struct('<qQQH')   # entry addr, container offset, container length, name length
+
+NO_ENTRY = -1
+
+
+def container_entry(buf):
+    """
+    The address of the first instruction in a pcode_bin container.
+    """
+    buf = memoryview(buf)
+    _, _, _, n_spaces, n_mnemonics, n_insns, _, _, _ = PCODE_HEADER.unpack_from(buf, 0)
+
+    if n_insns == 0:
+        return NO_ENTRY
+
+    _, offset = unpack_strings(buf, PCODE_HEADER.size, n_spaces)
+    _, offset = unpack_strings(buf, offset, n_mnemonics)
+    addr, _, _, _ = INSN.unpack_from(buf, offset)
+
+    return addr
+
+
+class FunctionArchive(object):
+    def __init__(self, path):
+        self.path = path
+        self.f = open(path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, _, n_funcs, index_off = HEADER.unpack_from(self.mm, 0)
+
+        if magic != MAGIC:
+            raise ValueError('%s is not a function archive (bad magic %r)' % (path, magic))
+
+        if version > VERSION:
+            raise ValueError('Unsupported function archive version %d' % version)
+
+        self.index = {}
+        self.entries = {}
+
+        offset = index_off
+
+        for _ in range(n_funcs):
+            entry, cont_off, cont_len, name_len = INDEX_ENTRY.unpack_from(self.mm, offset)
+            offset += INDEX_ENTRY.size
+
+            name = self.mm[offset:offset+name_len].decode('utf-8')
+            offset += name_len
+
+            self.index[name] = (entry, cont_off, cont_len)
+
+            if entry != NO_ENTRY:
+                self.entries[entry] = name
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        return list(self.index.keys())
+
+    def name_at(self, addr):
+        return self.entries.get(addr)
+
+    def container(self, name):
+        """
+        A zero-copy view of the function's pcode_bin container.
+        """
+        _, cont_off, cont_len = self.index[name]
+        return memoryview(self.mm)[cont_off:cont_off+cont_len]
+
+    def insns(self, name):
+        # Hand over the mmap itself rather than a view of it, a generator
+        # that's never started would otherwise keep the view (and the mmap)
+        # from being released.
+        _, cont_off, _ = self.index[name]
+        return iter_binary_insns(self.mm, cont_off)
+
+    def insns_at(self, addr):
+        return self.insns(self.entries[addr])
+
+    def close(self):
+        self.mm.close()
+        self.f.close()
+
+
+class ArchiveWriter(object):
+    """
+    Writes to a temporary file next to `path` and only moves it over `path`
+    once closed, so a failed rebuild leaves any archive already there alone.
+    """
+    def __init__(self, path):
+        self.path = path
+        fd, self.tmp_path = tempfile.mkstemp(prefix='.%s.' % basename(path), suffix='.tmp',
+                                             dir=dirname(abspath(path)))
+        self.f = os.fdopen(fd, 'wb')
+        self.index = []
+        self.names = set()
+
+        # Zeroed until close() writes the real header, so an archive whose
+        # writing didn't finish never opens as a valid (shorter) one.
+        self.f.write(bytes(HEADER.size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def add_container(self, name, buf, entry=None):
+        if name in self.names:
+            raise ValueError('Duplicate function %s in archive %s' % (name, self.path))
+
+        if entry is None:
+            entry = container_entry(buf)
+
+        self.names.add(name)
+        self.index.append((name, entry, self.f.tell(), len(buf)))
+        self.f.write(buf)
+
+    def add_json(self, name, insn_js):
+        buf = BytesIO()
+        write_pcode(buf, insn_js)
+        self.add_container(name, buf.getvalue())
+
+    def add_file(self, path):
+        name, ext = splitext(basename(path))
+
+        if ext == '.json':
+            with open(path) as f:
+                self.add_json(name, json.load(f))
+        else:
+            with open(path, 'rb') as f:
+                self.add_container(name, f.read())
+
+    def add_files(self, paths):
+        """
+        Add exported functions, taking the .pcb when a function was exported
+        as both foo.json and foo.pcb (the exporter writes both).
+        """
+        by_name = {}
+
+        for path in paths:
+            name, ext = splitext(basename(path))
+            other = by_name.get(name)
+
+            if other is None:
+                by_name[name] = path
+                continue
+
+            if {ext, splitext(other)[1]} != {'.json', '.pcb'}:
+                raise ValueError('Duplicate function %s in %s and %s' % (name, other, path))
+
+            kept, skipped = (path, other) if ext == '.pcb' else (other, path)
+            print('Skipping %s, using %s' % (skipped, kept), file=sys.stderr)
+            by_name[name] = kept
+
+        for path in paths:
+            if by_name[splitext(basename(path))[0]] == path:
+                self.add_file(path)
+
+    def close(self):
+        index_off = self.f.tell()
+
+        for name, entry, cont_off, cont_len in self.index:
+            name_b = name.encode('utf-8')
+            self.f.write(INDEX_ENTRY.pack(entry, cont_off, cont_len, len(name_b)))
+            self.f.write(name_b)
+
+        self.f.seek(0)
+        self.f.write(HEADER.pack(MAGIC, VERSION, 0, len(self.index), index_off))
+        self.f.close()
+
+        # mkstemp makes the file private, give it the mode open() would have.
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(self.tmp_path, 0o666 & ~umask)
+
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """
+        Drop the partly written archive.
+        """
+        self.f.close()
+        os.remove(self.tmp_path)
+
+
+if __name__ == '__main__':
+    # archive.py out.pca funcs/*.json funcs/*.pcb
+    #   a function exported as both .json and .pcb is only added once, from the .pcb
+    with ArchiveWriter(sys.argv[1]) as writer:
+        writer.add_files(sys.argv[2:])
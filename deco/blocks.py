@@ -24,18 +24,17 @@ class Block(Node):
     def update_elems(self, new_elems):
         self.elems = new_elems
 
-    def tojson(self):
-        etype = self.elem_type()
+    def skeleton_json(self):
+        """
+        Everything but the block's body, enough to lay out the graph.
+        """
         j = {
                 'start': addr_to_str(self.start),
-                etype: [],
+                'size': len(self.elems),
                 'successors': [],
                 'predecessors': []
             }
 
-        for elem in self.elems:
-            j[etype].append(elem.tojson())
-
         for succ in self.successors:
             j['successors'].append(addr_to_str(succ.start))
 
@@ -44,6 +43,16 @@ class Block(Node):
 
         return j
 
+    def tojson(self):
+        etype = self.elem_type()
+        j = self.skeleton_json()
+        j[etype] = []
+
+        for elem in self.elems:
+            j[etype].append(elem.tojson())
+
+        return j
+
     def fallthrough(self):
         if len(self.successors) == 0:
             return None
@@ -0,0 +1,184 @@
+"""
+Content-addressed on-disk cache of analysis results.
+
+Entries are keyed on a hash of the exported P-code plus ANALYSIS_VERSION,
+so an unchanged function is never re-analysed and bumping the version
+invalidates everything at once. Each entry is a gzipped JSON file under
+the cache root. The cache is bounded in size: when it grows past
+`max_bytes` the least recently used entries (by mtime, which `get`
+refreshes) are deleted until it is back under the low watermark.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from io import StringIO
+from os.path import exists, getsize, join
+
+from func import Function
+from loader import iter_binary_insns, iter_insns
+
+# Bump whenever a change to the pipeline changes its output.
+#   2: blocks split during decomposition keep their pending successors,
+#      incremental re-analysis, columnar phi placement
+#   3: never-taken branches are dropped by SCCP, reads of [ram] aren't value numbered
+ANALYSIS_VERSION = 3
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+LOW_WATERMARK = 0.9
+
+ENTRY_EXT = '.json.gz'
+
+
+def content_key(data, version=ANALYSIS_VERSION):
+    h = hashlib.sha256()
+    h.update(b'mydeco-analysis-%d\0' % version)
+    h.update(data)
+    return h.hexdigest()
+
+
+class FunctionCache(object):
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+        os.makedirs(root, exist_ok=True)
+        self.size = sum(size for _, _, size in self.entries())
+
+    def path(self, key):
+        return join(self.root, key[:2], key + ENTRY_EXT)
+
+    def entries(self):
+        """
+        (path, mtime, size) of every entry currently on disk.
+        """
+        entries = []
+
+        for subdir in os.listdir(self.root):
+            subdir = join(self.root, subdir)
+
+            if not os.path.isdir(subdir):
+                continue
+
+            for fname in os.listdir(subdir):
+                if not fname.endswith(ENTRY_EXT):
+                    continue
+
+                path = join(subdir, fname)
+
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+
+                entries.append((path, st.st_mtime, st.st_size))
+
+        return entries
+
+    def __contains__(self, key):
+        return exists(self.path(key))
+
+    def get(self, key):
+        path = self.path(key)
+
+        try:
+            with gzip.open(path, 'rt') as f:
+                value = json.load(f)
+        except (FileNotFoundError, EOFError, OSError, ValueError):
+            return None
+
+        # Mark as recently used.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        return value
+
+    def put(self, key, value):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file first so that readers (possibly other
+        # processes) never see a partial entry. mkstemp gives each writer,
+        # thread or process, its own.
+        fd, tmp_path = tempfile.mkstemp(prefix=key, suffix='.tmp', dir=os.path.dirname(path))
+
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt') as f:
+                json.dump(value, f, separators=(',', ':'))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        # Overwriting an entry only adds the difference.
+        try:
+            old_size = getsize(path)
+        except FileNotFoundError:
+            old_size = 0
+
+        os.replace(tmp_path, path)
+        self.size += getsize(path) - old_size
+
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        entries = sorted(self.entries(), key=lambda e: e[1])
+        size = sum(size for _, _, size in entries)
+        target = self.max_bytes * LOW_WATERMARK
+
+        for path, _, entry_size in entries:
+            if size <= target:
+                break
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            size -= entry_size
+
+        self.size = size
+
+    def clear(self):
+        for path, _, _ in self.entries():
+            os.remove(path)
+
+        self.size = 0
+
+
+def analyze(data, binary=False, cache=None):
+    """
+    Analyse an exported function given the raw bytes of its .json export
+    (or pcode_bin container when `binary`) and return (record, cache hit).
+
+    The record holds the Function's JSON and text forms plus a few counts.
+    """
+    key = None
+
+    if cache is not None:
+        key = content_key(data)
+        record = cache.get(key)
+
+        if record is not None:
+            return record, True
+
+    if binary:
+        insns = iter_binary_insns(data)
+    else:
+        insns = iter_insns(StringIO(data.decode('utf-8')))
+
+    func = Function.frominsns(insns)
+    record = {
+        'blocks': len(func.cfg.blocks),
+        'ops': sum(len(blk.pcode) for blk in func.cfg.blocks),
+        'func': func.tojson(),
+        'text': str(func)
+    }
+
+    if cache is not None:
+        cache.put(key, record)
+
+    return record, False
@@ -1,21 +1,82 @@
 import pdb
+from bisect import bisect_left, insort
 from collections import defaultdict
 from functools import reduce
 from graphviz import Digraph
 
 from blocks import InstructionBlock, PcodeBlock
+from columnar import PcodeColumns
 from graph import Graph
+from gvn import number_values
+from incremental import block_defs, rebuild_subtree
 from insn import Instruction
+from instrument import cfg_counts, instrumented
+from liveness import Liveness
+from sccp import propagate_constants
+from simplify import simplify_pcode
 from utils import addr_to_str
 
+PHI_MODES = ['minimal', 'semi-pruned', 'pruned']
 
-def get_block_containing(addr, blocks):
-    for start, blk in blocks.items():
-        if blk.contains(addr, inclusive=False):
-            return start
-    return None
 
+class BlockIndex(object):
+    """
+    Blocks keyed on their start address.
+
+    The starts are also kept sorted so that finding the block containing an
+    address is a bisect instead of a scan over every block found so far.
+    """
+    def __init__(self):
+        self.starts = []
+        self.blocks = {}
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def __contains__(self, start):
+        return start in self.blocks
+
+    def __getitem__(self, start):
+        return self.blocks[start]
+
+    def add(self, blk):
+        if blk.start not in self.blocks:
+            insort(self.starts, blk.start)
+
+        self.blocks[blk.start] = blk
+
+    def remove(self, blk):
+        del self.blocks[blk.start]
+        del self.starts[bisect_left(self.starts, blk.start)]
+
+    def containing(self, addr):
+        """
+        The block that contains `addr` somewhere after its first instruction.
+        """
+        i = bisect_left(self.starts, addr) - 1
+
+        if i >= 0:
+            blk = self.blocks[self.starts[i]]
+
+            if blk.contains(addr, inclusive=False):
+                return blk
 
+        return None
+
+    def split(self, blk, at_addr):
+        new_blk1, new_blk2 = blk.split(at_addr)
+
+        self.remove(blk)
+        self.add(new_blk1)
+        self.add(new_blk2)
+
+        return new_blk1, new_blk2
+
+    def values(self):
+        return [self.blocks[start] for start in self.starts]
+
+
+@instrumented('decompose_into_blocks')
 def decompose_into_blocks(insns):
     """
     Group the instructions into basic blocks.
@@ -24,10 +85,17 @@ def decompose_into_blocks(insns):
         there is an edge from an instruction to its fallthrough (if applicable)
         and edges from branches to target.
     """
-    blocks = {}
+    blocks = BlockIndex()
 
     insn_lookup = {insn.addr: insn for insn in insns}
     addr_buff = [(insns[0].addr, [], None)]
+    pending = {}    # block -> positions in addr_buff of entries it's the predecessor of
+
+    def push(addr, curr_block, predecessor):
+        if predecessor is not None:
+            pending.setdefault(predecessor, []).append(len(addr_buff))
+
+        addr_buff.append((addr, curr_block, predecessor))
 
     while len(addr_buff) > 0:
         addr, curr_block, predecessor = addr_buff.pop(-1)
@@ -37,7 +105,7 @@ def decompose_into_blocks(insns):
         if addr in blocks:
             if len(curr_block) > 0:
                 blk = InstructionBlock(curr_block, predecessor=predecessor)
-                blocks[blk.start] = blk
+                blocks.add(blk)
 
                 curr_block = []
                 predecessor = blk
@@ -45,16 +113,14 @@ def decompose_into_blocks(insns):
             blocks[addr].add_predecessor(predecessor)
             continue
 
-        cont_blk_start = get_block_containing(addr, blocks)
+        cont_blk = blocks.containing(addr)
 
         # In this case, we are branching into the middle of a sequence of instructions we
         # previously thought made up a basic block. Therefore, we want to split said block.
-        if cont_blk_start is not None:
-            cont_blk = blocks[cont_blk_start]
-            new_blk1, new_blk2 = cont_blk.split(addr)
-
-            # In addition to deleting the stale block, we need to unlink it from its predecessors.
-            del blocks[cont_blk_start]
+        if cont_blk is not None:
+            # The index drops the stale block and picks up the two halves,
+            # we still need to unlink it from its predecessors.
+            new_blk1, new_blk2 = blocks.split(cont_blk, addr)
 
             # Now we also need to transfer the old predecessors to the new first block
             # and the old successors to the new second block. And also add an edge between
@@ -70,8 +136,13 @@ def decompose_into_blocks(insns):
             new_blk2.add_predecessor(predecessor)
             new_blk2.add_predecessor(new_blk1)
 
-            blocks[new_blk1.start] = new_blk1
-            blocks[new_blk2.start] = new_blk2
+            # Successors of the old block that we haven't gotten to yet are the second block's now.
+            # A position may since have been popped (and maybe reused), so check it's still ours.
+            for pos in pending.pop(cont_blk, []):
+                if pos < len(addr_buff) and addr_buff[pos][2] is cont_blk:
+                    a, blk_insns, _ = addr_buff[pos]
+                    addr_buff[pos] = (a, blk_insns, new_blk2)
+                    pending.setdefault(new_blk2, []).append(pos)
 
             continue
 
@@ -87,7 +158,7 @@ def decompose_into_blocks(insns):
         # from the current instruction buffer.
         if insn is None or insn.terminates():
             blk = InstructionBlock(curr_block, predecessor=predecessor)
-            blocks[blk.start] = blk
+            blocks.add(blk)
 
             curr_block = []
             predecessor = None
@@ -98,28 +169,52 @@ def decompose_into_blocks(insns):
         # Add the successors to the current instruction to the DFS queue (buffer, whatever).
         if insn is not None:
             if insn.fallthrough() is not None:
-                addr_buff.append((insn.fallthrough(), curr_block, predecessor))
+                push(insn.fallthrough(), curr_block, predecessor)
 
             if insn.target() is not None:
-                addr_buff.append((insn.target(), [], blk))
+                push(insn.target(), [], blk)
 
     if len(curr_block) > 0:
         blk = InstructionBlock(curr_block, predecessor=predecessor)
-        blocks[blk.start] = blk
+        blocks.add(blk)
 
-    return sorted(blocks.values(), key=lambda b: b.start)
+    return blocks.values()
 
 
 class CFG(Graph):
     def __init__(self, blocks):
         super().__init__(blocks)
-
+        self.update_structure()
+
+        # Kept by convert_to_ssa so that edits can be re-analyzed incrementally.
+        self.raw_pcode = {}     # block -> its ops from before SSA
+        self.exit_defs = {}     # block -> the last SSA def of each base varnode in it
+        self.dirty = set()      # blocks edited since the last reanalyze
+
+    @instrumented('update_structure')
+    def update_structure(self):
+        """
+        Recompute the block order, dominator tree and frontiers after the
+        shape of the CFG changed.
+        """
         self.sort_by_postorder()
         self.generate_dom_tree()
         self.generate_dom_frontiers()
 
         self.blocks = self.nodes
         self.entry = self.start
+        self.block_addrs = None     # built by find_block when it's first needed
+
+    def remove_blocks(self, dead):
+        """
+        Drop blocks that have already been unlinked from the rest of the CFG.
+        """
+        if len(dead) == 0:
+            return
+
+        dead = set(dead)
+        self.nodes = [self.entry] + [blk for blk in self.blocks if blk is not self.entry and blk not in dead]
+        self.update_structure()
 
     def __repr__(self):
         sorted_blocks = sorted(self.blocks, key=lambda b: b.start)
@@ -131,8 +226,11 @@ class CFG(Graph):
 
     @staticmethod
     def fromjson(j):
-        insns = reduce(lambda x,y: x+y, [Instruction.fromjson(ij) for ij in j])
-        insn_blocks = decompose_into_blocks(insns)
+        return CFG.frominsns(insn for ij in j for insn in Instruction.fromjson(ij))
+
+    @staticmethod
+    def frominsns(insns):
+        insn_blocks = decompose_into_blocks(list(insns))
         insn_CFG = CFG(insn_blocks)
         return insn_CFG.copy(lambda iblock: PcodeBlock.fromiblock(iblock))
 
@@ -145,64 +243,225 @@ class CFG(Graph):
         def convert_block_to_json(blk):
             j['blocks'][addr_to_str(blk.start)] = blk.tojson()
 
-        self.dfs_(self.entry,
-                  set(),
-                  pre_fn=convert_block_to_json)
+        for blk in self.traversal().preorder:
+            convert_block_to_json(blk)
 
         return j
 
-    def insert_phis(self):
-        phis_inserted = 0
-        visited = set()
-        all_varnodes = reduce(lambda x,y: x.union(y),
-                              [blk.written_varnodes(ignore_uniq=True) for blk in self.blocks])
+    def skeleton_json(self):
+        """
+        Like tojson but without the blocks' bodies, whose size is what makes
+        big functions slow to send. Fetch those one at a time with find_block.
+        """
+        j = {
+                'entry': addr_to_str(self.entry.start),
+                'blocks': {}
+            }
+
+        for blk in self.traversal().preorder:
+            j['blocks'][addr_to_str(blk.start)] = blk.skeleton_json()
+
+        return j
+
+    def find_block(self, addr):
+        """
+        The block starting at `addr`, formatted like the keys of tojson, or None.
+        """
+        if self.block_addrs is None:
+            self.block_addrs = {addr_to_str(blk.start): blk for blk in self.blocks}
+
+        return self.block_addrs.get(addr)
+
+    def live_in_varnodes(self, ignore_uniq=True):
+        """
+        Map each block to the varnodes live on entry to it.
+        """
+        liveness = Liveness(self, ignore_uniq=ignore_uniq)
+        return {blk: liveness.live_in_varnodes(blk) for blk in self.blocks}
+
+    @instrumented('insert_phis', cfg_counts)
+    def insert_phis(self, mode='pruned'):
+        """
+        Place phis for each variable at the iterated dominance frontier of the
+        blocks that define it.
+
+        `mode` picks how many of those phis we actually keep:
+            minimal      - all of them (Cytron et al.)
+            semi-pruned  - only for variables that are read in some block before being
+                           written there, block-local temporaries never need a phi
+            pruned       - only where the variable is also live on entry to the block
+        """
+        if mode not in PHI_MODES:
+            raise ValueError('Unknown phi placement mode %s' % mode)
+
+        columns = PcodeColumns.fromcfg(self)
+        def_blocks = defaultdict(list)
+        exposed = 0
 
         for blk in self.blocks:
-            buff = {b for b in self.frontier(blk)} # Don't consume from the frontier!
+            uses, defs, _ = columns.scan_block(blk, ignore_uniq=True)
+            exposed |= uses
+
+            for vnode in columns.index.varnodes(defs):
+                def_blocks[vnode].append(blk)
+
+        candidates = set(def_blocks.keys())
+        liveness = None
+
+        if mode != 'minimal':
+            candidates &= columns.index.varnodes(exposed)
+
+        if mode == 'pruned':
+            liveness = Liveness(self, columns=columns)
+
+        block_phis = defaultdict(list)
+
+        for vnode in candidates:
+            has_phi = set()
+            buff = list(def_blocks[vnode])
+            queued = set(buff)
 
             while len(buff) > 0:
-                df_blk = buff.pop()
+                blk = buff.pop()
+
+                for df_blk in self.frontier(blk):
+                    if df_blk in has_phi:
+                        continue
 
-                if df_blk in visited:
-                    continue
+                    has_phi.add(df_blk)
 
-                phis_inserted += df_blk.insert_phis(all_varnodes)
+                    if liveness is None or liveness.is_live_in(vnode, df_blk):
+                        block_phis[df_blk].append(vnode)
 
-                visited.add(df_blk)
-                buff.update(self.frontier(df_blk))
+                    if df_blk not in queued:
+                        queued.add(df_blk)
+                        buff.append(df_blk)
+
+        phis_inserted = 0
+
+        for blk, vnodes in block_phis.items():
+            vnodes = sorted(vnodes, key=lambda v: (v.space_id, v.offset, v.size))
+            phis_inserted += blk.insert_phis(vnodes)
 
         return phis_inserted
 
-    def convert_to_ssa(self):
-        self.insert_phis()
+    @instrumented('convert_to_ssa', cfg_counts)
+    def convert_to_ssa(self, phi_mode='pruned'):
+        self.raw_pcode = {blk: [pcop.clone() for pcop in blk.pcode] for blk in self.blocks}
+        self.insert_phis(mode=phi_mode)
 
         def convert_block_to_ssa(blk):
             blk.convert_to_ssa()
+            self.exit_defs[blk] = block_defs(blk)
 
         def unwind_version(blk):
             blk.unwind_version()
 
-        self.dom_tree.dfs_(self.entry, 
-                           set(), 
-                           pre_fn=convert_block_to_ssa, 
-                           post_fn=unwind_version)
+        # Rename along the dominator tree so each block sees the latest definitions
+        # from the blocks that dominate it, and only those.
+        self.dom_tree_dfs(pre_fn=convert_block_to_ssa,
+                          post_fn=unwind_version)
 
     def convert_from_ssa(self):
         for block in self.blocks:
             block.convert_from_ssa()
 
+    @instrumented('propagate_constants', cfg_counts)
+    def propagate_constants(self):
+        """
+        Fold constants with SCCP and remove the blocks it proves unreachable.
+        """
+        dead = propagate_constants(self)
+        self.remove_blocks(dead)
+        return len(dead)
+
+    @instrumented('number_values', cfg_counts)
+    def number_values(self):
+        """
+        Merge computations that are already available from a dominating op.
+        """
+        return number_values(self)
+
+    @instrumented('simplify', cfg_counts)
     def simplify(self):
+        """
+        Simplify every reachable block in one def-use worklist so that
+        a rewrite only revisits the ops it affects.
+        """
         # TODO: Handle case where blocks may become empty
-        self.changed = True
-
-        def simplify_block(blk):
-            self.changed |= blk.simplify()
-
-        while self.changed:
-            self.changed = False
-            self.dfs_(self.entry,
-                      set(),
-                      post_fn=simplify_block)
+        blocks = self.traversal().postorder
+        removed = simplify_pcode([pcop for blk in blocks for pcop in blk.pcode])
+
+        for blk in blocks:
+            blk.update_elems([pcop for pcop in blk.pcode if id(pcop) not in removed])
+
+    def replace_pcode(self, blk, pcode):
+        """
+        Give `blk` new (pre-SSA) P-code, e.g. after re-exporting or patching
+        its instructions. It's analyzed on the next reanalyze.
+        """
+        self.raw_pcode[blk] = [pcop.clone() for pcop in pcode]
+        self.dirty.add(blk)
+
+    def add_block(self, blk):
+        """
+        Add a new block with (pre-SSA) P-code, link it in with add_edge.
+        """
+        self.add_node(blk)
+        self.replace_pcode(blk, blk.pcode)
+        self.block_addrs = None
+
+    def add_edge(self, src, dst):
+        affected = super().add_edge(src, dst)
+        self.dirty.update([src, dst])
+        return affected
+
+    def remove_edge(self, src, dst):
+        unreachable = set(blk for blk in self.blocks if not self.is_reachable(blk))
+
+        super().remove_edge(src, dst)
+        self.dirty.update([src, dst])
+
+        # Phis only know about the edges there were at the last reanalyze.
+        for phi in dst.phis():
+            if src in phi.preds:
+                phi.remove_pred(src)
+
+        dead = [blk for blk in self.blocks if not self.is_reachable(blk) and blk not in unreachable]
+
+        for blk in dead:
+            for pcop in blk.pcode:
+                pcop.relink_inputs(start_idx=0)
+
+            for succ in blk.successors:
+                succ.remove_predecessor(blk)
+
+                for phi in succ.phis():
+                    if blk in phi.preds:
+                        phi.remove_pred(blk)
+
+                self.dirty.add(succ)
+
+            for pred in blk.predecessors:
+                pred.remove_successor(blk)
+
+        self.dirty.difference_update(dead)
+        self.remove_blocks(dead)
+
+    @instrumented('reanalyze', cfg_counts)
+    def reanalyze(self):
+        """
+        Bring the SSA form up to date with the edits made since the last
+        call by rebuilding only the dominator subtree they're in. Returns
+        how many blocks were rebuilt.
+        """
+        dirty = [blk for blk in self.dirty if self.is_reachable(blk)]
+        self.dirty = set()
+
+        if len(dirty) == 0:
+            return 0
+
+        return rebuild_subtree(self, reduce(self.nearest_common_dominator, dirty))
 
     def draw(self):
         g = Digraph(comment='CFG')
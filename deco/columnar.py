@@ -0,0 +1,324 @@
+"""
+Columnar storage of the P-code of a list of blocks.
+
+Instead of a PcodeOp object per op, each holding a list of Varnode objects,
+every op is a row across a few typed arrays: its opcode id, its address,
+the id of its output varnode and a span of input varnode ids (and of
+killed varnode ids for calls). The varnodes themselves are in one table
+with a flag byte each, so the scans over whole functions that phi
+placement and liveness do are loops over ints rather than method calls
+building a set per op.
+
+Varnodes other than consts get dense ids from a VarnodeIndex, the same ids
+the bitsets here and in Liveness use. Consts aren't in any of those sets,
+so they're kept apart (as negative ids) to keep the bitsets narrow.
+
+The columns are a snapshot: build them, run what needs them and drop them
+once the ops change (SSA conversion rewrites every op). OpView gives the
+read-only PcodeOp API over a row.
+"""
+from array import array
+
+from liveness import VarnodeIndex
+from pcode import PcodeOp
+from varnode import Varnode
+
+NOT_A_VARNODE = -1      # e.g. a block standing in for a phi input, kept in `others`
+NO_OUTPUT = -1
+
+UNIQUE_FLAG = 1
+PC_FLAG = 2
+
+
+def const_id(idx):
+    return -2 - idx
+
+
+def is_const_id(vid):
+    return vid < NOT_A_VARNODE
+
+
+class PcodeColumns(object):
+    def __init__(self):
+        self.index = VarnodeIndex()
+        self.flags = array('B')         # varnode id -> UNIQUE_FLAG | PC_FLAG
+        self.consts = []
+        self.ids = {}                   # varnode -> its id here, consts included
+
+        self.mnemonics = []
+        self.mnemonic_ids = {}
+
+        self.opcodes = array('H')
+        self.addrs = array('d')
+        self.outputs = array('l')
+        self.input_starts = array('L', [0])
+        self.inputs = array('l')
+        self.others = {}                # position in `inputs` -> what's there if not a varnode
+        self.killed_starts = array('L', [0])
+        self.killed = array('l')
+        self.phi_preds = {}             # op row -> the phi's predecessor blocks
+        self.scans = {}                 # (block position, skipped flags) -> scan_block
+        self.masks = {}                 # skipped flags -> bitset of the varnodes without them
+
+        self.blocks = []
+        self.block_rows = {}            # block -> its position in `blocks`
+        self.block_starts = array('L', [0])
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    @staticmethod
+    def fromblocks(blocks):
+        columns = PcodeColumns()
+
+        for blk in blocks:
+            columns.add_block(blk)
+
+        return columns
+
+    @staticmethod
+    def fromcfg(cfg):
+        return PcodeColumns.fromblocks(cfg.blocks)
+
+    def varnode_id(self, vnode):
+        if not isinstance(vnode, Varnode):
+            return NOT_A_VARNODE
+
+        vid = self.ids.get(vnode)
+
+        if vid is not None:
+            return vid
+
+        if vnode.is_const():
+            vid = const_id(len(self.consts))
+            self.consts.append(vnode)
+        else:
+            vid = self.index.id(vnode)
+            self.flags.append((UNIQUE_FLAG if vnode.is_unique() else 0) | (PC_FLAG if vnode.is_pc() else 0))
+
+        self.ids[vnode] = vid
+        return vid
+
+    def varnode(self, vid):
+        if vid == NOT_A_VARNODE:
+            return None
+
+        if is_const_id(vid):
+            return self.consts[const_id(vid)]
+
+        return self.index.vnodes[vid]
+
+    def mnemonic_id(self, mnemonic):
+        mid = self.mnemonic_ids.get(mnemonic)
+
+        if mid is None:
+            mid = len(self.mnemonics)
+            self.mnemonic_ids[mnemonic] = mid
+            self.mnemonics.append(mnemonic)
+
+        return mid
+
+    def add_block(self, blk):
+        self.block_rows[blk] = len(self.blocks)
+        self.blocks.append(blk)
+
+        # This runs over every op of the function, so the common case (a
+        # mnemonic and varnodes we've seen) is kept to dict lookups.
+        ids = self.ids
+        mnemonic_ids = self.mnemonic_ids
+        inputs = self.inputs
+
+        for pcop in blk.pcode:
+            row = len(self.opcodes)
+            mid = mnemonic_ids.get(pcop.mnemonic)
+
+            self.opcodes.append(self.mnemonic_id(pcop.mnemonic) if mid is None else mid)
+            self.addrs.append(pcop.addr)
+
+            if pcop.output is None:
+                self.outputs.append(NO_OUTPUT)
+            else:
+                vid = ids.get(pcop.output)
+                self.outputs.append(self.varnode_id(pcop.output) if vid is None else vid)
+
+            for inpt in pcop.inputs:
+                vid = ids.get(inpt)
+
+                if vid is None:
+                    vid = self.varnode_id(inpt)
+
+                    if vid == NOT_A_VARNODE:
+                        self.others[len(inputs)] = inpt
+
+                inputs.append(vid)
+
+            self.input_starts.append(len(inputs))
+
+            if pcop.is_call():
+                self.killed.extend(self.varnode_id(vnode) for vnode in pcop.killed_varnodes)
+            elif pcop.is_phi():
+                self.phi_preds[row] = list(pcop.preds)
+
+            self.killed_starts.append(len(self.killed))
+
+        self.block_starts.append(len(self.opcodes))
+
+    def rows(self, blk):
+        pos = self.block_rows[blk]
+        return range(self.block_starts[pos], self.block_starts[pos + 1])
+
+    def views(self, blk):
+        return [OpView(self, row) for row in self.rows(blk)]
+
+    def phis(self, blk):
+        phi_id = self.mnemonic_ids.get('MULTIEQUAL')
+        opcodes = self.opcodes
+        return [OpView(self, row) for row in self.rows(blk) if opcodes[row] == phi_id]
+
+    def count(self, mnemonic):
+        """
+        How many ops in all the blocks are `mnemonic`s.
+        """
+        return self.opcodes.count(self.mnemonic_ids[mnemonic]) if mnemonic in self.mnemonic_ids else 0
+
+    def mask(self, skipped):
+        """
+        Bitset of the varnodes with none of the `skipped` flags.
+        """
+        mask = self.masks.get(skipped)
+
+        if mask is None:
+            mask = 0
+
+            for vid, flags in enumerate(self.flags):
+                if not flags & skipped:
+                    mask |= 1 << vid
+
+            self.masks[skipped] = mask
+
+        return mask
+
+    def scan_block(self, blk, ignore_uniq=False, ignore_pc=True):
+        """
+        (upward exposed, written, {predecessor: read by the phis over its edge})
+        for `blk`, the first two as bitsets of varnode ids. Like in Liveness,
+        phis count as reading their inputs at the end of their predecessors.
+        """
+        pos = self.block_rows[blk]
+        skipped = (UNIQUE_FLAG if ignore_uniq else 0) | (PC_FLAG if ignore_pc else 0)
+        key = (pos, skipped)
+
+        if key in self.scans:
+            return self.scans[key]
+
+        inputs = self.inputs
+        input_starts = self.input_starts
+        outputs = self.outputs
+        killed = self.killed
+        killed_starts = self.killed_starts
+
+        uses = 0
+        defs = 0
+        phi_uses = {}
+
+        for row in range(self.block_starts[pos], self.block_starts[pos + 1]):
+            start, end = input_starts[row], input_starts[row + 1]
+            preds = self.phi_preds.get(row)
+
+            if preds is not None:
+                for pred, vid in zip(preds, inputs[start:end]):
+                    if vid >= 0:
+                        phi_uses[pred] = phi_uses.get(pred, 0) | (1 << vid)
+            else:
+                read = 0
+
+                for vid in inputs[start:end]:
+                    if vid >= 0:
+                        read |= 1 << vid
+
+                uses |= read & ~defs
+
+            vid = outputs[row]
+
+            if vid >= 0:
+                defs |= 1 << vid
+
+            for vid in killed[killed_starts[row]:killed_starts[row + 1]]:
+                defs |= 1 << vid
+
+        # Filtering once at the end is the same as filtering each op, the
+        # skipped varnodes' bits just ride along until here.
+        mask = self.mask(skipped)
+        phi_uses = {pred: bits & mask for pred, bits in phi_uses.items() if bits & mask}
+
+        self.scans[key] = (uses & mask, defs & mask, phi_uses)
+        return self.scans[key]
+
+    def written_varnodes(self, blk, ignore_uniq=False, ignore_pc=True):
+        _, defs, _ = self.scan_block(blk, ignore_uniq, ignore_pc)
+        return self.index.varnodes(defs)
+
+    def upward_exposed_varnodes(self, blk, ignore_uniq=False, ignore_pc=True):
+        uses, _, _ = self.scan_block(blk, ignore_uniq, ignore_pc)
+        return self.index.varnodes(uses)
+
+
+class OpView(object):
+    """
+    A row of PcodeColumns that reads like a PcodeOp.
+    """
+    __slots__ = ('columns', 'row')
+
+    def __init__(self, columns, row):
+        self.columns = columns
+        self.row = row
+
+    def __repr__(self):
+        return '%s(%s) -> %s' % (self.mnemonic, ', '.join(map(str, self.inputs)), self.output)
+
+    @property
+    def mnemonic(self):
+        return self.columns.mnemonics[self.columns.opcodes[self.row]]
+
+    @property
+    def addr(self):
+        return self.columns.addrs[self.row]
+
+    @property
+    def output(self):
+        return self.columns.varnode(self.columns.outputs[self.row])
+
+    @property
+    def inputs(self):
+        columns = self.columns
+        start, end = columns.input_starts[self.row], columns.input_starts[self.row + 1]
+        return [columns.others[i] if columns.inputs[i] == NOT_A_VARNODE else columns.varnode(columns.inputs[i]) \
+                for i in range(start, end)]
+
+    @property
+    def killed_varnodes(self):
+        columns = self.columns
+        start, end = columns.killed_starts[self.row], columns.killed_starts[self.row + 1]
+        return [columns.varnode(vid) for vid in columns.killed[start:end]]
+
+    @property
+    def preds(self):
+        return self.columns.phi_preds.get(self.row)
+
+    def written_varnodes(self, ignore_uniq=False, ignore_pc=True):
+        vnodes = PcodeOp.written_varnodes(self, ignore_uniq, ignore_pc)
+        vnodes.update(v for v in self.killed_varnodes if self.shd_incl_output(v, ignore_uniq, ignore_pc))
+        return vnodes
+
+    returns = PcodeOp.returns
+    branches = PcodeOp.branches
+    terminates = PcodeOp.terminates
+    is_conditional = PcodeOp.is_conditional
+    is_indirect = PcodeOp.is_indirect
+    is_call = PcodeOp.is_call
+    is_ret = PcodeOp.is_ret
+    is_phi = PcodeOp.is_phi
+    target = PcodeOp.target
+    has_output = PcodeOp.has_output
+    shd_incl_output = PcodeOp.shd_incl_output
+    read_varnodes = PcodeOp.read_varnodes
@@ -0,0 +1,52 @@
+from collections import defaultdict
+from contextvars import ContextVar
+
+
+class AnalysisContext(object):
+    """
+    Everything the analysis of a single function accumulates as it goes:
+    SSA version counters and rename stacks, expression and variable caches,
+    the values copies were propagated into and the node name counter.
+
+    Use it as a context manager around the analysis of one function. Once
+    the context (and the function holding it) is dropped all of that state
+    goes with it instead of piling up in class attributes across functions.
+    Code that runs outside of any `with` block shares a default context.
+
+    The active contexts are kept in a ContextVar, so each thread (and each
+    asyncio task) has its own and analyses running concurrently don't see
+    each other's.
+    """
+    STACK = ContextVar('analysis_contexts', default=())
+
+    def __init__(self):
+        self.versions = defaultdict(int)         # base varnode -> next SSA version
+        self.rename_stacks = defaultdict(list)   # base varnode -> SSAVarnodes, latest last
+        self.exprs = {}                          # SSAVarnode -> compound Expr
+        self.variables = {}                      # Expr -> Variable
+        self.replacements = {}                   # id(SSAVarnode) -> (it, the value its uses moved to)
+        self.num_nodes = 0
+
+    def __enter__(self):
+        AnalysisContext.STACK.set(AnalysisContext.STACK.get() + (self,))
+        return self
+
+    def __exit__(self, *args):
+        AnalysisContext.STACK.set(AnalysisContext.STACK.get()[:-1])
+
+    def next_node_num(self):
+        num = self.num_nodes
+        self.num_nodes += 1
+        return num
+
+
+DEFAULT_CONTEXT = AnalysisContext()
+
+
+def current_context():
+    stack = AnalysisContext.STACK.get()
+
+    if len(stack) > 0:
+        return stack[-1]
+
+    return DEFAULT_CONTEXT
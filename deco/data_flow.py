@@ -18,15 +18,31 @@ class ExprUse(Use):
 
 
 class DataFlowObj(object):
+    """
+    Something with a definition and a set of uses.
+
+    `uses` maps id(user) -> Use so that adding, finding and removing the use
+    by a given user doesn't depend on how many uses there are. A user that
+    reads the value more than once has a single Use with all of its idxs.
+    """
+    # Empty so that slotted subclasses (SSAVarnode) stay slotted.
+    __slots__ = ()
+
     def __init__(self, defn=None):
         self.defn = defn
-        self.uses = []
+        self.uses = {}
 
     def use_type(self):
         raise NotImplementedError()
 
+    def num_uses(self):
+        return len(self.uses)
+
+    def users(self):
+        return [use.user for use in self.uses.values()]
+
     def get_input_idxs(self, user):
-        return [i for i, v in enumerate(user.inputs) if v == self]
+        return [i for i, v in enumerate(user.inputs) if v is self]
 
     def add_use(self, user, idx=None, idxs=[], **kwargs):
         if len(idxs) == 0 and idx is None:
@@ -34,36 +50,37 @@ class DataFlowObj(object):
         elif idx is not None:
             idxs = [idx]
 
-        use = self.use_type()(user, idxs, **kwargs)
-        self.uses.append(use)
+        use = self.get_use(user)
 
-    def get_use_idx(self, user):
-        idx = -1
+        if use is None:
+            self.uses[id(user)] = self.use_type()(user, list(idxs), **kwargs)
+        else:
+            use.idxs = sorted(set(use.idxs).union(idxs))
 
-        for i, use in enumerate(self.uses):
-            if use.user == user:
-                idx = i
-                break
-
-        return idx
+    def get_use(self, user):
+        return self.uses.get(id(user))
 
     def update_use(self, user):
-        idx = self.get_use_idx(user)
-
-        if idx >= 0:
-            self.uses[idx] = self.use_type()(user, self.get_input_idxs(user))
+        """
+        Re-derive which of `user`'s inputs are this object, e.g. after the
+        user has been rewritten.
+        """
+        idxs = self.get_input_idxs(user)
+
+        if len(idxs) == 0:
+            self.remove_use(user)
+        elif id(user) in self.uses:
+            self.uses[id(user)].idxs = idxs
+        else:
+            self.add_use(user, idxs=idxs)
 
     def remove_use(self, user):
-        idx = self.get_use_idx(user)
-
-        if idx >= 0:
-            del self.uses[idx]
+        self.uses.pop(id(user), None)
 
     def propagate_change_to(self, new_val):
         new_val.defn = self.defn
         new_val.uses = self.uses
 
-        for use in self.uses:
+        for use in self.uses.values():
             for idx in use.idxs:
                 use.user.replace_input(idx, new_val)
-
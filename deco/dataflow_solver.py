@@ -0,0 +1,134 @@
+"""
+Generic iterative dataflow over the blocks of a CFG.
+
+An analysis subclasses DataflowAnalysis and defines its lattice (`top`,
+`meet`), the value at the boundary (entry for forward problems, exits
+for backward ones) and the block transfer function. The solver visits
+blocks in reverse postorder (postorder for backward problems) with a
+worklist ordered by that position, so each round sweeps the CFG in the
+quick direction and only blocks whose inputs changed are revisited.
+"""
+from heapq import heappush, heappop
+
+FORWARD = 'forward'
+BACKWARD = 'backward'
+
+
+class DataflowAnalysis(object):
+    direction = FORWARD
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.ins = None
+        self.outs = None
+
+    def top(self):
+        raise NotImplementedError()
+
+    def boundary(self):
+        return self.top()
+
+    def meet(self, a, b):
+        raise NotImplementedError()
+
+    def transfer(self, blk, value):
+        """
+        The value on the far side of `blk` given the value flowing into it
+        (at the start for forward problems, at the end for backward ones).
+        """
+        raise NotImplementedError()
+
+    def edge_value(self, src, dst, value):
+        """
+        What flows along the edge from `src` to `dst` (in the direction of
+        the analysis) given `src`'s value. Override for edge-specific facts.
+        """
+        return value
+
+    def order(self):
+        trav = self.cfg.traversal()
+
+        if self.direction == FORWARD:
+            return trav.reverse_postorder
+
+        return trav.postorder
+
+    def is_boundary(self, blk):
+        if self.direction == FORWARD:
+            return blk is self.cfg.entry
+
+        return len(blk.successors) == 0
+
+    def flow_preds(self, blk):
+        if self.direction == FORWARD:
+            return blk.predecessors
+
+        return blk.successors
+
+    def flow_succs(self, blk):
+        if self.direction == FORWARD:
+            return blk.successors
+
+        return blk.predecessors
+
+    def solve(self):
+        order = self.order()
+        pos = {blk.idx: i for i, blk in enumerate(order)}
+
+        num_blocks = len(self.cfg.blocks)
+        before = [self.top() for _ in range(num_blocks)]
+        after = [self.top() for _ in range(num_blocks)]
+
+        heap = list(range(len(order)))
+        queued = set(heap)
+
+        while len(heap) > 0:
+            i = heappop(heap)
+            queued.discard(i)
+
+            blk = order[i]
+            value = self.boundary() if self.is_boundary(blk) else self.top()
+
+            for pred in self.flow_preds(blk):
+                if pred.idx in pos:
+                    value = self.meet(value, self.edge_value(pred, blk, after[pred.idx]))
+
+            before[blk.idx] = value
+            value = self.transfer(blk, value)
+
+            if value != after[blk.idx]:
+                after[blk.idx] = value
+
+                for succ in self.flow_succs(blk):
+                    j = pos.get(succ.idx)
+
+                    if j is not None and j not in queued:
+                        queued.add(j)
+                        heappush(heap, j)
+
+        if self.direction == FORWARD:
+            self.ins, self.outs = before, after
+        else:
+            self.ins, self.outs = after, before
+
+    def invalidate(self):
+        self.ins = None
+        self.outs = None
+
+    def block_in(self, blk):
+        """
+        The value at the start of `blk`.
+        """
+        if self.ins is None:
+            self.solve()
+
+        return self.ins[blk.idx]
+
+    def block_out(self, blk):
+        """
+        The value at the end of `blk`.
+        """
+        if self.outs is None:
+            self.solve()
+
+        return self.outs[blk.idx]
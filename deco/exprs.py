@@ -1,6 +1,7 @@
 import pdb
 from functools import reduce
 
+from context import current_context
 from data_flow import DataFlowObj, ExprUse
 from variable import Variable
 
@@ -27,8 +28,6 @@ MNEMONIC_TO_OPSTR = {
 
 
 class Expr(DataFlowObj):
-    CACHE = {}
-
     def use_type(self):
         return ExprUse
 
@@ -46,15 +45,17 @@ class Expr(DataFlowObj):
 
     @staticmethod
     def fromvnode(vnode):
-        if vnode in Expr.CACHE:
-            return Expr.CACHE[vnode]
+        ctx = current_context()
+
+        if vnode in ctx.exprs:
+            return ctx.exprs[vnode]
         elif vnode.is_const():
             return ConstExpr(vnode.offset)
         elif vnode.version == 0 or vnode.defn is None:
             vnode_expr = VarnodeExpr(vnode)
 
-            if vnode_expr in Variable.CACHE:
-                return Variable.CACHE[vnode_expr]
+            if vnode_expr in ctx.variables:
+                return ctx.variables[vnode_expr]
 
             return vnode_expr
 
@@ -73,7 +74,7 @@ class Expr(DataFlowObj):
             raise ValueError('Cannot create expression for 0-arity pcode expression %s' % defn)
 
         if expr.is_compound():
-            Expr.CACHE[vnode] = expr
+            ctx.exprs[vnode] = expr
 
         return expr
 
@@ -120,7 +121,6 @@ class CompoundExpr(Expr):
         self.inputs = list(inputs)
         self.opstr = MNEMONIC_TO_OPSTR.get(mnemonic, mnemonic)
 
-        # TODO: Handle multiple inputs that are the same Expr (`idxs` in add_use).
         for i, inpt in enumerate(inputs):
             inpt.add_use(self, idx=i)
 
@@ -1,33 +1,79 @@
 from functools import reduce
 
 from cfg import CFG
+from context import AnalysisContext
+from instrument import instrumented
 from stmt_list import MyAST
 
 
 class Function(object):
-    def __init__(self, cfg):
+    def __init__(self, cfg, ctx=None):
+        if ctx is None:
+            ctx = AnalysisContext()
+
         self.cfg = cfg
-        self.cfg.convert_to_ssa()
-        self.cfg.simplify()
-        #print(self.cfg)
+        self.ctx = ctx
+
+        with self.ctx:
+            self.cfg.convert_to_ssa()
+            self.cfg.propagate_constants()
+            self.cfg.number_values()
+            self.cfg.simplify()
+            #print(self.cfg)
 
-        #self.ast = MyAST.fromcfg(self.cfg)
-        #self.ast.simplify()
-        #print(self.ast)
-        self.ast = MyAST(None, [])
+            #self.ast = MyAST.fromcfg(self.cfg)
+            #self.ast.simplify()
+            #print(self.ast)
+            self.ast = MyAST(None, [])
 
     def __repr__(self):
         return str(self.cfg)
 
     @staticmethod
     def fromjson(j):
-        cfg = CFG.fromjson(j)
-        return Function(cfg)
+        with AnalysisContext() as ctx:
+            cfg = CFG.fromjson(j)
+
+        return Function(cfg, ctx)
+
+    @staticmethod
+    def frominsns(insns):
+        with AnalysisContext() as ctx:
+            cfg = CFG.frominsns(insns)
+
+        return Function(cfg, ctx)
 
+    @instrumented('tojson')
     def tojson(self):
-        cfg_j = self.cfg.tojson()
-        ast_j = self.ast.tojson()
+        with self.ctx:
+            cfg_j = self.cfg.tojson()
+            ast_j = self.ast.tojson()
+
         return {'cfg': cfg_j, 'ast': ast_j}
 
+    def reanalyze(self):
+        """
+        Update the analysis after edits made through the CFG (replace_pcode,
+        add_block, add_edge, remove_edge), only redoing what they affect.
+        """
+        with self.ctx:
+            return self.cfg.reanalyze()
+
+    def skeleton_json(self):
+        with self.ctx:
+            return self.cfg.skeleton_json()
+
+    def block_json(self, addr):
+        """
+        The full JSON of the block starting at `addr` or None if there isn't one.
+        """
+        blk = self.cfg.find_block(addr)
+
+        if blk is None:
+            return None
+
+        with self.ctx:
+            return blk.tojson()
+
     def draw(self):
         self.cfg.draw()
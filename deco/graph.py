@@ -1,7 +1,10 @@
 import pdb
 from collections import defaultdict
+from heapq import heappush, heappop
 
+from instrument import instrumented
 from node import Node
+from traversal import Traversal, dfs
 
 
 class Graph(object):
@@ -16,6 +19,7 @@ class Graph(object):
                 other_nodes.append(node)
 
         self.nodes = start_nodes + other_nodes
+        self._traversal = None
 
     def idom(self, node):
         return self.doms[node.idx]
@@ -29,97 +33,344 @@ class Graph(object):
             else:                     node2 = self.idom(node2)
         return node1
 
+    @instrumented('generate_dom_tree')
     def generate_dom_tree(self):
-        self.doms = {node.idx: None for node in self.nodes}
-        self.set_idom(self.start, self.start)
+        """
+        Compute immediate dominators with the semi-NCA algorithm.
+
+        Everything runs on dense integer arrays: nodes are numbered in DFS
+        preorder from the start node, semidominators are found with a
+        path-compressed link-eval forest and each idom is then the nearest
+        common ancestor of the node's DFS parent and its semidominator.
+        See Georgiadis, "Linear-Time Algorithms for Dominators and Related
+        Problems" (2005).
+
+        `idoms` maps a node's (postorder) idx to its idom's idx, -1 for nodes
+        unreachable from the start node. The start node is its own idom.
+        `dom_depth` is each node's depth in the dominator tree, also -1 when
+        it's unreachable.
+        """
+        num_nodes = len(self.nodes)
+
+        # DFS preorder numbering of the nodes reachable from the start node.
+        order = []              # preorder number -> node
+        parent = []             # preorder number -> preorder number of DFS parent
+        pre = [-1] * num_nodes  # node idx -> preorder number
+
+        stack = [(self.start, -1)]
+
+        while len(stack) > 0:
+            node, par = stack.pop()
+
+            if pre[node.idx] >= 0:
+                continue
+
+            pre[node.idx] = len(order)
+            order.append(node)
+            parent.append(par)
+
+            for succ in node.successors:
+                if pre[succ.idx] < 0:
+                    stack.append((succ, pre[node.idx]))
+
+        num_reachable = len(order)
+        semi = list(range(num_reachable))
+        label = list(range(num_reachable))
+        ancestor = [-1] * num_reachable
 
-        changed = True
+        def evaluate(v):
+            if ancestor[v] < 0:
+                return v
 
-        while changed:
-            changed = False
+            path = []
+            u = v
 
-            for node in self.nodes[:-1][::-1]: # reverse postorder
-                # DEBUG
-                for p in node.predecessors:
-                    if p not in self.nodes:
-                        pdb.set_trace()
-                # END
+            while ancestor[ancestor[u]] >= 0:
+                path.append(u)
+                u = ancestor[u]
 
-                processed_preds = [p for p in node.predecessors if self.idom(p) is not None]
+            while len(path) > 0:
+                u = path.pop()
+                a = ancestor[u]
 
-                if len(processed_preds) == 0:
+                if semi[label[a]] < semi[label[u]]:
+                    label[u] = label[a]
+
+                ancestor[u] = ancestor[a]
+
+            return label[v]
+
+        for w in range(num_reachable - 1, 0, -1):
+            for pred in order[w].predecessors:
+                v = pre[pred.idx]
+
+                if v < 0:
                     continue
 
-                new_idom = processed_preds[0]
+                u_semi = semi[evaluate(v)]
 
-                for pred in processed_preds:
-                    pred_idom = self.idom(pred)
-                    new_idom = self.shared_idom(pred, new_idom) 
+                if u_semi < semi[w]:
+                    semi[w] = u_semi
 
-                prev_idom = self.idom(node)
+            ancestor[w] = parent[w]
 
-                if prev_idom is None or prev_idom.idx != new_idom.idx:
-                    self.set_idom(node, new_idom)
-                    changed = True
+        idom = list(parent)
+        idom[0] = 0
 
-        # Reverse the idom `doms` linked list to get the dom tree adjacency list.
-        dt_nodes = []
+        for w in range(1, num_reachable):
+            while idom[w] > semi[w]:
+                idom[w] = idom[idom[w]]
 
-        def get_dt_node(node):
-            if node in dt_nodes:
-                return dt_nodes[dt_nodes.index(node)]
-            else:
-                dt_node = Node(name=node.name)
-                dt_nodes.append(dt_node)
-                return dt_node
+        self.idoms = [-1] * num_nodes
+        self.doms = {node.idx: None for node in self.nodes}
+        self.dom_children = [[] for _ in range(num_nodes)]
+        self.dom_depth = [-1] * num_nodes
 
-        for node in self.nodes[:-1]:
-            dt_node = get_dt_node(node)
+        for w, node in enumerate(order):
+            idom_node = order[idom[w]]
+            self.idoms[node.idx] = idom_node.idx
+            self.doms[node.idx] = idom_node
 
-            prev_idom = node
-            idom = self.idom(prev_idom)
-            if idom is None:
-                pdb.set_trace()
+            if w > 0:
+                self.dom_children[idom_node.idx].append(node)
+                self.dom_depth[node.idx] = self.dom_depth[idom_node.idx] + 1
+            else:
+                self.dom_depth[node.idx] = 0
 
-            while idom != prev_idom:
-                dt_idom = get_dt_node(idom)
-                dt_node.add_predecessor(dt_idom)
+        # Mirror the idom links as a standalone graph of dominator tree nodes.
+        self.dom_tree_nodes = {node.idx: Node(name=node.name) for node in order}
 
-                prev_idom = idom
-                idom = self.idom(prev_idom)
+        for node in order[1:]:
+            self.dom_tree_nodes[node.idx].add_predecessor(self.dom_tree_nodes[self.idoms[node.idx]])
 
-        self.dom_tree = Graph(dt_nodes)
+        self.dom_tree = Graph(list(self.dom_tree_nodes.values()))
 
+    @instrumented('generate_dom_frontiers')
     def generate_dom_frontiers(self):
         self.frontiers = defaultdict(set)
+        self.frontier_runners = defaultdict(set)    # join node idx -> idxs whose frontier it's in
 
         for node in self.nodes:
-            if len(node.predecessors) < 2:
+            self.add_to_frontiers(node)
+
+    def add_to_frontiers(self, node):
+        """
+        Add `node` to the frontier of everything between its predecessors
+        and its idom, if it's a join.
+        """
+        idoms = self.idoms
+
+        if len(node.predecessors) < 2:
+            return
+
+        idom = idoms[node.idx]
+
+        if idom < 0:
+            return
+
+        for pred in node.predecessors:
+            runner = pred.idx
+
+            if idoms[runner] < 0:
                 continue
 
-            idom = self.idom(node)
+            while runner != idom:
+                self.frontiers[runner].add(node)
+                self.frontier_runners[node.idx].add(runner)
+                runner = idoms[runner]
 
-            for pred in node.predecessors:
-                runner = pred
-                while runner.idx != idom.idx:
-                    self.frontiers[runner.idx].add(node)
-                    runner = self.idom(runner)
+    def update_frontiers(self, nodes):
+        """
+        Recompute the frontier entries of `nodes` after their predecessors
+        or the dominators along the way changed.
+        """
+        for node in nodes:
+            for runner in self.frontier_runners.pop(node.idx, ()):
+                self.frontiers[runner].discard(node)
 
-    def frontier(self, node):
-        return self.frontiers[node.idx]
+            self.add_to_frontiers(node)
 
-    def dfs_(self, node, visited, pre_fn=None, post_fn=None):
-        if pre_fn is not None:
-            pre_fn(node)
+    def is_reachable(self, node):
+        return self.idoms[node.idx] >= 0
+
+    def dominates(self, node1, node2):
+        """
+        Whether `node1` dominates `node2` (every node dominates itself).
+        """
+        if not (self.is_reachable(node1) and self.is_reachable(node2)):
+            return False
+
+        while self.dom_depth[node2.idx] > self.dom_depth[node1.idx]:
+            node2 = self.idom(node2)
+
+        return node1 is node2
+
+    def nearest_common_dominator(self, node1, node2):
+        depth = self.dom_depth
 
-        visited.add(node)
+        while depth[node1.idx] > depth[node2.idx]:
+            node1 = self.idom(node1)
 
-        for succ in node.successors:
-            if succ not in visited:
-                self.dfs_(succ, visited, pre_fn=pre_fn, post_fn=post_fn)
+        while depth[node2.idx] > depth[node1.idx]:
+            node2 = self.idom(node2)
 
-        if post_fn is not None:
-            post_fn(node)
+        while node1 is not node2:
+            node1 = self.idom(node1)
+            node2 = self.idom(node2)
+
+        return node1
+
+    def dominators(self, node):
+        """
+        The strict dominators of `node`, starting from the start node.
+        """
+        doms = []
+
+        while node is not self.start:
+            node = self.idom(node)
+            doms.append(node)
+
+        return doms[::-1]
+
+    def dominator_subtree(self, node):
+        """
+        `node` and everything it dominates, in dominator tree preorder.
+        """
+        subtree = []
+        stack = [node]
+
+        while len(stack) > 0:
+            node = stack.pop()
+            subtree.append(node)
+            stack.extend(reversed(self.dom_children[node.idx]))
+
+        return subtree
+
+    def update_dominators(self):
+        self.generate_dom_tree()
+        self.generate_dom_frontiers()
+
+    def add_node(self, node):
+        """
+        Add a node with no edges yet, it's unreachable until one is added.
+        """
+        node.set_idx(len(self.nodes))
+        self.nodes.append(node)
+
+        self.idoms.append(-1)
+        self.doms[node.idx] = None
+        self.dom_children.append([])
+        self.dom_depth.append(-1)
+
+    def add_edge(self, src, dst):
+        """
+        Add an edge and update the dominator tree and frontiers in place.
+        Returns the nodes whose idom changed.
+
+        This is the depth based search of Georgiadis et al., "An Experimental
+        Study of Dynamic Dominators" (2012): the nodes whose idom changes are
+        the ones reachable from `dst` through nodes deeper in the dominator
+        tree than themselves, and they all end up as children of the nearest
+        common dominator of the edge's ends. The frontiers of the joins
+        below that are redone too.
+        """
+        dst.add_predecessor(src)
+        self.invalidate_traversal()
+
+        if not self.is_reachable(src):
+            return []
+
+        if not self.is_reachable(dst):
+            # Everything newly reachable would need numbering, just start over.
+            old_idoms = list(self.idoms)
+            self.update_dominators()
+            return [node for node in self.nodes if self.idoms[node.idx] != old_idoms[node.idx]]
+
+        nca = self.nearest_common_dominator(src, dst)
+        depth = self.dom_depth
+        bound = depth[nca.idx] + 1
+        affected = []
+
+        if depth[dst.idx] > bound:
+            visited = {dst.idx}
+            heap = [(-depth[dst.idx], dst.idx, dst)]
+
+            while len(heap) > 0:
+                _, _, root = heappop(heap)
+                affected.append(root)
+                stack = [root]
+
+                while len(stack) > 0:
+                    node = stack.pop()
+
+                    for succ in node.successors:
+                        if succ.idx in visited or depth[succ.idx] <= bound:
+                            continue
+
+                        visited.add(succ.idx)
+
+                        if depth[succ.idx] > depth[root.idx]:
+                            stack.append(succ)
+                        else:
+                            heappush(heap, (-depth[succ.idx], succ.idx, succ))
+
+            for node in affected:
+                self.set_dominator(node, nca)
+
+        if len(affected) == 0:
+            self.update_frontiers([dst])
+        else:
+            self.update_frontiers([succ for node in self.dominator_subtree(nca) for succ in node.successors])
+
+        return affected
+
+    def remove_edge(self, src, dst):
+        """
+        Remove an edge and update the dominator tree and frontiers.
+
+        Removing an edge back to a dominator doesn't change any dominators,
+        only the frontiers of its target. Other removals rebuild the tree.
+        """
+        back_edge = self.dominates(dst, src)
+
+        src.remove_successor(dst)
+        dst.remove_predecessor(src)
+        self.invalidate_traversal()
+
+        if not self.is_reachable(src):
+            return
+
+        if back_edge:
+            self.update_frontiers([dst])
+        else:
+            self.update_dominators()
+
+    def set_dominator(self, node, idom):
+        old_idom = self.idom(node)
+
+        self.dom_children[old_idom.idx].remove(node)
+        self.dom_children[idom.idx].append(node)
+        self.idoms[node.idx] = idom.idx
+        self.set_idom(node, idom)
+
+        dt_node = self.dom_tree_nodes[node.idx]
+        dt_node.remove_predecessor(self.dom_tree_nodes[old_idom.idx])
+        self.dom_tree_nodes[old_idom.idx].remove_successor(dt_node)
+        dt_node.add_predecessor(self.dom_tree_nodes[idom.idx])
+
+        base = self.dom_depth[idom.idx] + 1 - self.dom_depth[node.idx]
+
+        for desc in self.dominator_subtree(node):
+            self.dom_depth[desc.idx] += base
+
+    def dominator_children(self, node):
+        return self.dom_children[node.idx]
+
+    def frontier(self, node):
+        return self.frontiers[node.idx]
+
+    def dfs_(self, node, visited, pre_fn=None, post_fn=None):
+        dfs(node, visited, pre_fn=pre_fn, post_fn=post_fn)
 
     def dfs(self, pre_fn=None, post_fn=None):
         visited = set()
@@ -128,19 +379,36 @@ class Graph(object):
             if node not in visited:
                 self.dfs_(node, visited, pre_fn=pre_fn, post_fn=post_fn)
 
-    def sort_by_postorder(self):
-        idx_ctr = 0
+    def traversal(self):
+        """
+        The (cached) traversal of everything reachable from the start node.
+        """
+        if self._traversal is None:
+            self._traversal = Traversal([self.start])
 
-        def set_idx(node):
-            nonlocal idx_ctr
-            node.set_idx(idx_ctr)
-            print(hex(int(node.start)), node.idx)
-            idx_ctr += 1
+        return self._traversal
+
+    def invalidate_traversal(self):
+        self._traversal = None
+
+    def dom_tree_dfs(self, pre_fn=None, post_fn=None, root=None):
+        if root is None:
+            root = self.start
+
+        dfs(root,
+            set(),
+            pre_fn=pre_fn,
+            post_fn=post_fn,
+            successors=self.dominator_children)
+
+    @instrumented('sort_by_postorder')
+    def sort_by_postorder(self):
+        for idx, node in enumerate(Traversal(self.nodes).postorder):
+            node.set_idx(idx)
 
-        self.dfs(post_fn=set_idx)
         self.nodes = sorted(self.nodes, key=lambda n: n.idx)
-        print([node.idx for node in self.nodes])
         self.start = self.nodes[-1]
+        self.invalidate_traversal()
 
     def copy(self, copy_fn):
         new_nodes = {}
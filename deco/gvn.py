@@ -0,0 +1,106 @@
+"""
+Dominator-based global value numbering over SSA pcode.
+
+Briggs, Cooper and Simpson, "Value Numbering" (1997). Blocks are visited
+in dominator tree order with a scoped hash table of the pure computations
+available so far, so an op that recomputes a value already computed in a
+dominating block (or earlier in the same one) is turned into a COPY of
+the earlier result. The copies are left for simplify to propagate.
+"""
+from sccp import FOLDERS
+
+PURE_MNEMONICS = set(FOLDERS.keys()) - {'COPY'}
+
+COMMUTATIVE_MNEMONICS = {'INT_ADD', 'INT_MULT', 'INT_AND', 'INT_OR', 'INT_XOR',
+                         'INT_EQUAL', 'INT_NOTEQUAL', 'INT_CARRY', 'INT_SCARRY',
+                         'BOOL_AND', 'BOOL_OR', 'BOOL_XOR'}
+
+
+class ValueNumbering(object):
+    def __init__(self, cfg):
+        self.cfg = cfg
+
+        self.leaders = {}   # id(varnode) -> varnode holding the same value
+        self.table = {}     # op key -> varnode holding its value
+        self.scopes = []    # keys added per block on the dom tree path
+        self.num_merged = 0
+
+    def leader(self, vnode):
+        return self.leaders.get(id(vnode), vnode)
+
+    def value_number(self, vnode):
+        if vnode.is_const():
+            return ('c', vnode.offset, vnode.size)
+
+        return ('v', id(self.leader(vnode)))
+
+    def key(self, pcop, blk):
+        vns = [self.value_number(inpt) for inpt in pcop.inputs]
+
+        if pcop.mnemonic in COMMUTATIVE_MNEMONICS:
+            vns.sort()
+
+        # Phis are only equivalent to other phis of the same block.
+        if pcop.is_phi():
+            return (pcop.mnemonic, blk.name, tuple(vns))
+
+        return (pcop.mnemonic, pcop.output.size, tuple(vns))
+
+    def visit_op(self, pcop, blk, merge=True):
+        # Memory isn't renamed, a [ram] varnode is version 0 everywhere even
+        # though a CALL or STORE in between may have changed it.
+        if any(inpt.is_ram() for inpt in pcop.inputs):
+            return
+
+        if pcop.is_identity():
+            self.leaders[id(pcop.output)] = self.leader(pcop.inputs[0])
+            return
+
+        if not (pcop.is_phi() or pcop.mnemonic in PURE_MNEMONICS):
+            return
+
+        key = self.key(pcop, blk)
+        leader = self.table.get(key)
+
+        if leader is None:
+            self.table[key] = pcop.output
+            self.scopes[-1].append(key)
+        elif merge and leader.size == pcop.output.size:
+            self.leaders[id(pcop.output)] = leader
+            pcop.relink_inputs(start_idx=0)
+            pcop.convert_to_identity(leader)
+            self.num_merged += 1
+
+    def enter_block(self, blk, merge=True):
+        self.scopes.append([])
+
+        for pcop in blk.pcode:
+            if pcop.has_output():
+                self.visit_op(pcop, blk, merge)
+
+    def leave_block(self, blk):
+        for key in self.scopes.pop():
+            del self.table[key]
+
+    def run(self, root=None):
+        """
+        Number the whole CFG or just the blocks dominated by `root`, after
+        taking in (but leaving alone) what's available from the blocks
+        dominating it.
+        """
+        if root is not None:
+            for blk in self.cfg.dominators(root):
+                self.enter_block(blk, merge=False)
+
+        self.cfg.dom_tree_dfs(pre_fn=self.enter_block,
+                              post_fn=self.leave_block,
+                              root=root)
+        return self.num_merged
+
+
+def number_values(cfg):
+    """
+    Turn recomputations of values available from a dominating op into
+    COPYs of that op's output and return how many there were.
+    """
+    return ValueNumbering(cfg).run()
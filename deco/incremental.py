@@ -0,0 +1,517 @@
+"""
+Incremental re-analysis of a CFG after its P-code or edges change.
+
+An edit only changes the SSA form of the blocks dominated by what was
+edited, so instead of redoing the whole pipeline we rebuild the dominator
+subtree rooted at the nearest common dominator of the edits. Its blocks go
+back to their original (pre-SSA) P-code, which the CFG keeps, get phis
+placed and are renamed starting from the values flowing in from the blocks
+dominating the subtree. Constant propagation, value numbering and simplify
+then run over the new ops only.
+
+Renaming the optimized ops in place wouldn't be sound: once a copy has
+been propagated, a register's uses may hold some other register's value.
+
+The rest of the function stays as it is, which only works if the rebuilt
+subtree fits back in:
+
+    - the values it reads from outside must still exist, simplify may have
+      removed them as dead since nothing used them
+    - the blocks it flows into must already have a phi for anything it
+      now sets differently
+
+When that isn't the case the rebuild starts over from a bigger subtree,
+one that dominates the block in the way, at worst the whole function.
+"""
+from collections import defaultdict
+from itertools import chain
+
+from context import current_context
+from gvn import ValueNumbering
+from pcode import PhiOp
+from sccp import SCCP
+from simplify import simplify_pcode
+from varnode import SSAVarnode
+
+
+class RegionTooSmall(Exception):
+    """
+    Rebuilding the subtree would have to change `blk`, outside of it.
+    """
+    def __init__(self, blk):
+        super().__init__(blk)
+        self.blk = blk
+
+
+def block_defs(blk):
+    """
+    The last definition of each base varnode in `blk`.
+    """
+    defs = {}
+
+    for pcop in blk.pcode:
+        for vnode in pcop.written_varnodes(ignore_pc=False):
+            defs[vnode.base()] = vnode
+
+    return defs
+
+
+def needs_phi(vnode):
+    # Same as insert_phis, temporaries and the PC never get phis.
+    return not (vnode.is_unique() or vnode.is_pc())
+
+
+def phi_sort_key(vnode):
+    return (vnode.space_id, vnode.offset, vnode.size)
+
+
+class SubtreeRebuild(object):
+    def __init__(self, cfg, root):
+        self.cfg = cfg
+        self.root = root
+        self.blocks = cfg.dominator_subtree(root)
+        self.block_set = set(self.blocks)
+
+        self.old_ops = [pcop for blk in self.blocks for pcop in blk.pcode]
+        self.old_op_ids = set(id(pcop) for pcop in self.old_ops)
+
+        self.chain_blocks = set()   # blocks outside the subtree we've looked up values in
+        self.chain_op_ids = set()   # ids of their ops
+        self.inputs = {}            # base varnode -> function input
+        self.entry_values = {}      # base varnode -> value flowing into the root
+        self.joins = {}             # base varnode -> blocks that would merge its values
+
+    def resolve(self, vnode):
+        """
+        Where `vnode`'s value is now, following the copies propagated since.
+        """
+        replacements = current_context().replacements
+
+        while id(vnode) in replacements:
+            vnode = replacements[id(vnode)][1]
+
+        return vnode
+
+    def add_chain(self, blk):
+        while blk not in self.chain_blocks:
+            self.chain_blocks.add(blk)
+            self.chain_op_ids.update(id(pcop) for pcop in blk.pcode)
+
+            if blk is self.cfg.entry:
+                break
+
+            blk = self.cfg.idom(blk)
+
+    def input_value(self, base):
+        if base not in self.inputs:
+            stack = current_context().rename_stacks.get(base)
+
+            if stack is not None and len(stack) > 0 and stack[0].defn is None:
+                self.inputs[base] = stack[0]
+            else:
+                self.inputs[base] = SSAVarnode(base.space, base.offset, base.size, None)
+
+        return self.inputs[base]
+
+    def join_blocks(self, base):
+        """
+        The iterated dominance frontier of the blocks writing `base`, i.e.
+        where it would have a phi if it were live there.
+        """
+        if base not in self.joins:
+            buff = [blk for blk in self.cfg.blocks if base in self.cfg.exit_defs.get(blk, {}) \
+                    or (blk in self.block_set and base in self.defined[blk])]
+            queued = set(buff)
+            joins = set()
+
+            while len(buff) > 0:
+                for df_blk in self.cfg.frontier(buff.pop()):
+                    joins.add(df_blk)
+
+                    if df_blk not in queued:
+                        queued.add(df_blk)
+                        buff.append(df_blk)
+
+            self.joins[base] = joins
+
+        return self.joins[base]
+
+    def value_at_exit(self, blk, base):
+        """
+        The value `base` holds at the end of `blk`, a block outside the subtree.
+        """
+        # A value's definition dominates the end of `blk`, so if it's still
+        # around at all it's in one of these.
+        self.add_chain(blk)
+
+        while True:
+            vnode = self.cfg.exit_defs.get(blk, {}).get(base)
+
+            if vnode is not None:
+                vnode = self.resolve(vnode)
+
+                if vnode.defn is not None and id(vnode.defn) not in self.chain_op_ids:
+                    raise RegionTooSmall(blk)
+
+                return vnode
+
+            # Phis are pruned, so there may have been no phi merging the
+            # values here because `base` wasn't live.
+            if blk in self.join_blocks(base):
+                raise RegionTooSmall(blk)
+
+            if blk is self.cfg.entry:
+                return self.input_value(base)
+
+            blk = self.cfg.idom(blk)
+
+    def entry_value(self, base):
+        if base not in self.entry_values:
+            if self.root is self.cfg.entry:
+                self.entry_values[base] = self.input_value(base)
+            else:
+                self.entry_values[base] = self.value_at_exit(self.cfg.idom(self.root), base)
+
+        return self.entry_values[base]
+
+    def collect(self):
+        """
+        Fresh copies of the subtree's original P-code and which varnodes
+        are live into each of its blocks.
+        """
+        self.pcode = {}
+        self.defined = {}
+        exposed = {}
+        exit_live = {}
+
+        for blk in self.blocks:
+            pcode = [pcop.clone() for pcop in self.cfg.raw_pcode[blk]]
+            defined = set()
+            read = set()
+
+            for pcop in pcode:
+                read.update(v for v in pcop.inputs if not (v.is_const() or v in defined))
+                defined.update(pcop.written_varnodes(ignore_pc=False))
+
+            self.pcode[blk] = pcode
+            self.defined[blk] = defined
+            exposed[blk] = read
+
+            # Whatever flows out of the subtree is only read by phis.
+            exit_live[blk] = set(phi.output.base() for succ in blk.successors \
+                                 if succ not in self.block_set for phi in succ.phis())
+
+        self.exit_live = set().union(*exit_live.values())
+        self.live_in = {blk: set(exposed[blk]) for blk in self.blocks}
+        changed = True
+
+        while changed:
+            changed = False
+
+            for blk in reversed(self.blocks):
+                live_out = set(exit_live[blk])
+
+                for succ in blk.successors:
+                    if succ in self.block_set:
+                        live_out |= self.live_in[succ]
+
+                live_in = exposed[blk] | (live_out - self.defined[blk])
+
+                if len(live_in) != len(self.live_in[blk]):
+                    self.live_in[blk] = live_in
+                    changed = True
+
+    def place_phis(self):
+        """
+        Decide which phis each block of the subtree needs, pruned like
+        insert_phis and with the root's incoming values from outside.
+        """
+        def_blocks = defaultdict(list)
+
+        for blk in self.blocks:
+            for vnode in self.defined[blk]:
+                if needs_phi(vnode):
+                    def_blocks[vnode].append(blk)
+
+        self.phis = defaultdict(list)   # block -> base varnodes
+
+        for vnode, blks in def_blocks.items():
+            has_phi = set()
+            buff = list(blks)
+            queued = set(buff)
+
+            while len(buff) > 0:
+                blk = buff.pop()
+
+                # Frontiers of blocks in the subtree are in it or outside of
+                # the root's, only the first matter here.
+                for df_blk in self.cfg.frontier(blk):
+                    if df_blk not in self.block_set or df_blk in has_phi:
+                        continue
+
+                    has_phi.add(df_blk)
+
+                    if df_blk not in queued:
+                        queued.add(df_blk)
+                        buff.append(df_blk)
+
+            for blk in has_phi:
+                if vnode in self.live_in[blk]:
+                    self.phis[blk].append(vnode)
+
+        # The root also needs a phi wherever different values come in from
+        # outside. Those are either already there or found again.
+        old_phis = {phi.output.base(): phi for phi in self.root.phis()}
+        outside_preds = [pred for pred in self.root.predecessors if pred not in self.block_set]
+
+        from_subtree = set(self.phis[self.root])
+        candidates = from_subtree | set(old_phis.keys())
+
+        if len(outside_preds) > 1:
+            candidates |= set(vnode for vnode in self.live_in[self.root] if needs_phi(vnode))
+
+        self.phis[self.root] = []
+        self.root_operands = {}   # base varnode -> {outside pred: value}
+
+        for vnode in sorted(candidates, key=phi_sort_key):
+            if vnode not in self.live_in[self.root]:
+                continue
+
+            old_phi = old_phis.get(vnode)
+            operands = {}
+
+            for pred in outside_preds:
+                if old_phi is not None and pred in old_phi.preds:
+                    operands[pred] = old_phi.inputs[old_phi.preds.index(pred)]
+                else:
+                    operands[pred] = self.value_at_exit(pred, vnode)
+
+            values = list(operands.values())
+
+            if vnode in from_subtree or any(value != values[0] for value in values[1:]):
+                self.phis[self.root].append(vnode)
+                self.root_operands[vnode] = operands
+
+    def defined_on_path(self, blk, vnode, old=False):
+        """
+        The definition of `vnode` reaching the end of `blk` from inside the
+        subtree, before the rebuild when `old`. None if it comes from outside.
+        """
+        while True:
+            if old:
+                defn = self.cfg.exit_defs.get(blk, {}).get(vnode)
+
+                if defn is not None:
+                    return defn
+            elif vnode in self.defined[blk] or vnode in self.phis[blk]:
+                return vnode
+
+            if blk is self.root:
+                return None
+
+            blk = self.cfg.idom(blk)
+
+    def live_outside(self, blk, base):
+        """
+        Whether `base` is read starting from `blk`, outside the subtree,
+        before it's written again. Goes by the original P-code.
+        """
+        buff = [blk]
+        visited = set(buff)
+
+        while len(buff) > 0:
+            blk = buff.pop()
+
+            if blk in self.block_set:
+                if base in self.live_in[blk]:
+                    return True
+                continue
+
+            written = False
+
+            for pcop in self.cfg.raw_pcode[blk]:
+                if base in pcop.inputs:
+                    return True
+
+                if base in pcop.written_varnodes(ignore_pc=False):
+                    written = True
+                    break
+
+            if written:
+                continue
+
+            for succ in blk.successors:
+                if succ not in visited:
+                    visited.add(succ)
+                    buff.append(succ)
+
+        return False
+
+    def check_exits(self):
+        """
+        Make sure each block the subtree flows into sees the same values as
+        before, except for the ones it has phis for, which get patched.
+        """
+        changed = set()
+
+        for blk in self.blocks:
+            changed.update(self.cfg.exit_defs.get(blk, {}).keys())
+            changed.update(self.defined[blk])
+
+        changed = [vnode for vnode in changed if needs_phi(vnode)]
+
+        for blk in self.blocks:
+            for succ in blk.successors:
+                if succ in self.block_set:
+                    continue
+
+                phi_bases = set(phi.output.base() for phi in succ.phis())
+
+                for vnode in changed:
+                    if vnode in phi_bases:
+                        continue
+
+                    # No phi because it isn't read there, or because the one
+                    # there was folded away and its value is used directly.
+                    if not self.live_outside(succ, vnode):
+                        continue
+
+                    old = self.defined_on_path(blk, vnode, old=True)
+                    old = self.entry_value(vnode) if old is None else self.resolve(old)
+
+                    if self.defined_on_path(blk, vnode) is not None or old != self.entry_value(vnode):
+                        raise RegionTooSmall(succ)
+
+    def rebuild(self):
+        self.collect()
+        self.place_phis()
+        self.check_exits()
+
+        seeds = (self.live_in[self.root] | self.exit_live) - set(self.phis[self.root])
+        seeds = {vnode: self.entry_value(vnode) for vnode in seeds}
+
+        # Nothing can go wrong from here on, swap in the new ops.
+        outside_defns = [inpt.defn for pcop in self.old_ops for inpt in pcop.inputs \
+                         if isinstance(inpt, SSAVarnode) and inpt.defn is not None and \
+                            id(inpt.defn) not in self.old_op_ids]
+
+        for pcop in self.old_ops:
+            pcop.relink_inputs(start_idx=0)
+
+        for blk in self.blocks:
+            phis = [PhiOp.fromblock(blk, vnode) for vnode in sorted(self.phis[blk], key=phi_sort_key)]
+            blk.update_elems(phis + self.pcode[blk])
+
+        for phi in self.root.phis():
+            operands = self.root_operands[phi.output]
+
+            for i, pred in enumerate(phi.preds):
+                if pred in operands:
+                    phi.inputs[i] = operands[pred]
+                    operands[pred].add_use(phi, idx=i)
+
+        exit_phis = []
+        self.rename(seeds, exit_phis)
+
+        for phi, pred, vnode in exit_phis:
+            for i, phi_pred in enumerate(phi.preds):
+                if phi_pred is pred:
+                    old = phi.inputs[i]
+                    phi.inputs[i] = vnode
+                    old.update_use(phi)
+                    vnode.add_use(phi, idx=i)
+
+                    if old.defn is not None and id(old.defn) not in self.old_op_ids:
+                        outside_defns.append(old.defn)
+
+        self.optimize([phi for phi, _, _ in exit_phis] + outside_defns)
+        return len(self.blocks)
+
+    def rename(self, seeds, exit_phis):
+        """
+        Convert the new ops to SSA along the dominator tree like convert_to_ssa,
+        starting from the values flowing into the root.
+        """
+        ctx = current_context()
+        rename_stacks = ctx.rename_stacks
+        ctx.rename_stacks = defaultdict(list)
+
+        for base, vnode in seeds.items():
+            ctx.rename_stacks[base].append(vnode)
+
+        def convert_block_to_ssa(blk):
+            for pcop in blk.pcode:
+                pcop.convert_to_ssa()
+
+            for succ in blk.successors:
+                for phi in succ.phis():
+                    if succ in self.block_set:
+                        phi.replace_input(blk)
+                    else:
+                        exit_phis.append((phi, blk, SSAVarnode.get_latest(phi.output)))
+
+            self.cfg.exit_defs[blk] = block_defs(blk)
+
+        def unwind_version(blk):
+            blk.unwind_version()
+
+        try:
+            self.cfg.dom_tree_dfs(pre_fn=convert_block_to_ssa,
+                                  post_fn=unwind_version,
+                                  root=self.root)
+        finally:
+            ctx.rename_stacks = rename_stacks
+
+    def optimize(self, outside_ops):
+        """
+        Run the rest of the pipeline over the new ops, plus `outside_ops`
+        whose inputs changed.
+        """
+        sccp = SCCP(self.cfg, self.blocks, self.root)
+        sccp.run()
+
+        num_edges = sum(len(blk.successors) for blk in self.blocks)
+        dead = sccp.rewrite()
+
+        if len(dead) > 0:
+            self.cfg.remove_blocks(dead)
+        elif num_edges != sum(len(blk.successors) for blk in self.blocks):
+            self.cfg.update_structure()
+
+        dead = set(dead)
+        blocks = [blk for blk in self.blocks if blk not in dead]
+
+        # The blocks around the subtree are simplified already, so simplify
+        # the new ops before numbering them too or they won't hash the same.
+        self.simplify(blocks, [pcop for blk in blocks for pcop in blk.pcode] + outside_ops)
+        ValueNumbering(self.cfg).run(root=self.root)
+        self.simplify(blocks, [pcop for blk in blocks for pcop in blk.pcode])
+
+    def simplify(self, blocks, pcode):
+        removed = simplify_pcode(pcode)
+
+        # Removals outside the subtree are rare, only look there if there are any.
+        outside = (blk for blk in self.cfg.blocks if blk not in self.block_set)
+        num_removed = 0
+
+        for blk in chain(blocks, outside):
+            if num_removed == len(removed):
+                break
+
+            pcode = [pcop for pcop in blk.pcode if id(pcop) not in removed]
+            num_removed += len(blk.pcode) - len(pcode)
+
+            if len(pcode) != len(blk.pcode):
+                blk.update_elems(pcode)
+
+
+def rebuild_subtree(cfg, root):
+    """
+    Rebuild the SSA form of the blocks dominated by `root`, or of a bigger
+    subtree if that one doesn't fit back in. Returns how many blocks were rebuilt.
+    """
+    while True:
+        try:
+            return SubtreeRebuild(cfg, root).rebuild()
+        except RegionTooSmall as e:
+            root = cfg.nearest_common_dominator(root, e.blk)
@@ -1,4 +1,6 @@
+from instrument import instrumented
 from pcode import PcodeOp, PcodeList
+from pcode_bin import op_addr
 
 
 class Instruction(PcodeList):
@@ -10,23 +12,29 @@ class Instruction(PcodeList):
         return Instruction(self.addr, self.length, [pcop.copy() for pcop in self.pcode])
 
     @staticmethod
+    @instrumented('Instruction.fromjson')
     def fromjson(j):
-        insn_addr = int(j['addr'], 16)
-        insn_len = j['length']
+        pcode = [PcodeOp.fromjson(pj, op_addr(j, i)) for i, pj in enumerate(j['pcode'])]
+        return Instruction.frompcode(j['length'], pcode)
 
+    @staticmethod
+    def frompcode(insn_len, all_pcode):
+        """
+        Split a machine instruction's P-code into `Instruction`s that each end
+        at (at most) one branch or return.
+        """
         insns = []
         pcode = []
 
-        for pj in j['pcode']:
-            pcop = PcodeOp.fromjson(pj)
+        for pcop in all_pcode:
             pcode.append(pcop)
 
             if pcop.branches() or pcop.returns():
-                insns.append(Instruction(pcode[0].addr, insn_len * float(len(pcode)) / len(j['pcode']), pcode))
+                insns.append(Instruction(pcode[0].addr, insn_len * float(len(pcode)) / len(all_pcode), pcode))
                 pcode = []
 
         if len(pcode) > 0:
-            insns.append(Instruction(pcode[0].addr, insn_len * float(len(pcode)) / len(j['pcode']), pcode))
+            insns.append(Instruction(pcode[0].addr, insn_len * float(len(pcode)) / len(all_pcode), pcode))
 
         return insns
 
@@ -0,0 +1,215 @@
+"""
+Instrumentation of the analysis passes.
+
+Passes are decorated with `instrumented`. While a Trace is active (use it
+as a context manager, like AnalysisContext) each call of one records how
+long it took, how many memory blocks it left allocated and, for passes
+over a CFG, the blocks, ops and phis before and after it. With no Trace
+active the decorator costs a call and a length check.
+
+    with Trace() as trace:
+        func = Function.fromjson(j)
+
+    print(trace.summary())
+    trace.save('trace.json')
+
+Saved traces are in the Chrome trace event format, which chrome://tracing
+and Perfetto can open.
+"""
+import json
+import sys
+import time
+import tracemalloc
+from contextvars import ContextVar
+from functools import wraps
+
+
+def cfg_counts(cfg):
+    num_ops = 0
+    num_phis = 0
+
+    for blk in cfg.blocks:
+        for pcop in blk.pcode:
+            num_ops += 1
+
+            if pcop.is_phi():
+                num_phis += 1
+
+    return {'blocks': len(cfg.blocks), 'ops': num_ops, 'phis': num_phis}
+
+
+class Trace(object):
+    """
+    The events recorded for each instrumented pass, in the order they finished.
+
+    `seconds` includes the passes a pass calls, `self_seconds` doesn't.
+    Neither includes the time spent counting for the trace itself.
+    `allocated_blocks` is the net change in the number of memory blocks the
+    interpreter has allocated, so what the pass kept around. With `memory`
+    tracemalloc also runs and `peak_bytes` is how far above the memory in
+    use at the start the pass went, at the cost of slowing everything down.
+
+    Like AnalysisContext, the active traces are per thread (and asyncio
+    task), so a trace only sees the passes run where it was entered.
+    """
+    STACK = ContextVar('traces', default=())
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.events = []
+        self.depth = 0
+        self.overhead = 0.0
+        self.nested = []    # time spent in the passes called by each running pass
+        self.peaks = [0]
+        self.started_tracing = False
+
+    def __enter__(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+        self.start = time.perf_counter()
+        Trace.STACK.set(Trace.STACK.get() + (self,))
+        return self
+
+    def __exit__(self, *args):
+        Trace.STACK.set(Trace.STACK.get()[:-1])
+
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def run(self, name, counts, fn, args, kwargs):
+        count_start = time.perf_counter()
+        event = {'name': name, 'depth': self.depth}
+
+        subject = args[0] if counts is not None and len(args) > 0 else None
+
+        if subject is not None:
+            event['before'] = counts(subject)
+
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peaks[-1] = max(self.peaks[-1], peak)
+            self.peaks.append(current)
+            tracemalloc.reset_peak()
+
+        num_blocks = sys.getallocatedblocks()
+        start = time.perf_counter()
+        self.overhead += start - count_start
+        self.depth += 1
+        self.nested.append(0.0)
+
+        # Times are on a clock that stops while we're counting.
+        event['start'] = start - self.start - self.overhead
+
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            end = time.perf_counter()
+            self.depth -= 1
+
+            event['seconds'] = end - self.start - self.overhead - event['start']
+            event['self_seconds'] = event['seconds'] - self.nested.pop()
+
+            if len(self.nested) > 0:
+                self.nested[-1] += event['seconds']
+            event['allocated_blocks'] = sys.getallocatedblocks() - num_blocks
+
+            if self.memory:
+                _, peak = tracemalloc.get_traced_memory()
+                current = self.peaks.pop()
+                peak = max(peak, current)
+
+                event['peak_bytes'] = peak - current
+                self.peaks[-1] = max(self.peaks[-1], peak)
+
+            if subject is not None:
+                event['after'] = counts(subject)
+
+            self.events.append(event)
+            self.overhead += time.perf_counter() - end
+
+    def passes(self):
+        """
+        The events of each pass combined, in the order the passes first ran.
+        """
+        totals = {}
+
+        for event in sorted(self.events, key=lambda event: event['start']):
+            if event['name'] not in totals:
+                totals[event['name']] = {'calls': 0, 'seconds': 0.0, 'self_seconds': 0.0, 'allocated_blocks': 0}
+
+            total = totals[event['name']]
+            total['calls'] += 1
+            total['seconds'] += event['seconds']
+            total['self_seconds'] += event['self_seconds']
+            total['allocated_blocks'] += event['allocated_blocks']
+
+            if 'peak_bytes' in event:
+                total['peak_bytes'] = max(total.get('peak_bytes', 0), event['peak_bytes'])
+
+            if 'after' in event:
+                total.setdefault('before', event['before'])
+                total['after'] = event['after']
+
+        return totals
+
+    def summary(self):
+        lines = ['%-22s %6s %10s %10s %12s %16s %14s' % ('pass', 'calls', 'seconds', 'self', 'alloc blocks',
+                                                        'ops', 'phis')]
+
+        for name, total in self.passes().items():
+            ops = phis = ''
+
+            if 'after' in total:
+                ops = '%d -> %d' % (total['before']['ops'], total['after']['ops'])
+                phis = '%d -> %d' % (total['before']['phis'], total['after']['phis'])
+
+            lines.append('%-22s %6d %10.4f %10.4f %12d %16s %14s' % (name, total['calls'], total['seconds'],
+                                                                     total['self_seconds'],
+                                                                     total['allocated_blocks'], ops, phis))
+
+        return '\n'.join(lines)
+
+    def tojson(self):
+        events = []
+
+        for event in sorted(self.events, key=lambda event: event['start']):
+            event_args = {key: value for key, value in event.items() \
+                          if key not in ['name', 'start', 'seconds', 'self_seconds']}
+            events.append({
+                'name': event['name'],
+                'ph': 'X',
+                'ts': event['start'] * 1e6,
+                'dur': event['seconds'] * 1e6,
+                'pid': 0,
+                'tid': 0,
+                'args': event_args
+            })
+
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.tojson(), f)
+
+
+def instrumented(name, counts=None):
+    """
+    Record calls of the decorated pass in the active Trace, if any. `counts`
+    maps the first argument (e.g. the CFG) to the numbers to record about it.
+    """
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            traces = Trace.STACK.get()
+
+            if len(traces) == 0:
+                return fn(*args, **kwargs)
+
+            return traces[-1].run(name, counts, fn, args, kwargs)
+
+        return wrapper
+
+    return decorate
@@ -0,0 +1,142 @@
+"""
+Block-level liveness of varnodes with integer bitsets.
+
+Every varnode gets a dense id and each set of varnodes is a Python int
+with bit `id` set, so the dataflow itself is just ORs and masks on ints
+instead of unions of sets of varnodes.
+"""
+from collections import defaultdict
+
+from dataflow_solver import DataflowAnalysis, BACKWARD
+from varnode import Varnode
+
+
+class VarnodeIndex(object):
+    """
+    Dense integer ids for varnodes.
+    """
+    def __init__(self):
+        self.ids = {}
+        self.vnodes = []
+
+    def __len__(self):
+        return len(self.vnodes)
+
+    def __contains__(self, vnode):
+        return vnode in self.ids
+
+    def id(self, vnode):
+        vid = self.ids.get(vnode)
+
+        if vid is None:
+            vid = len(self.vnodes)
+            self.ids[vnode] = vid
+            self.vnodes.append(vnode)
+
+        return vid
+
+    def bit(self, vnode):
+        vid = self.ids.get(vnode)
+        return 0 if vid is None else 1 << vid
+
+    def bits(self, vnodes):
+        bits = 0
+
+        for vnode in vnodes:
+            bits |= 1 << self.id(vnode)
+
+        return bits
+
+    def varnodes(self, bits):
+        vnodes = set()
+
+        while bits:
+            low = bits & -bits
+            vnodes.add(self.vnodes[low.bit_length() - 1])
+            bits ^= low
+
+        return vnodes
+
+
+class Liveness(DataflowAnalysis):
+    """
+    Live-in and live-out varnodes of each block of a CFG.
+
+    Works both before and after SSA conversion. A phi's output counts as
+    defined at the top of its block and its inputs as used at the end of
+    the predecessor they flow in from, so a phi input isn't live into the
+    phi's block itself.
+
+    Given the PcodeColumns of the CFG's blocks, the blocks are scanned from
+    those instead and the varnode ids are theirs.
+    """
+    direction = BACKWARD
+
+    def __init__(self, cfg, ignore_uniq=True, ignore_pc=True, columns=None):
+        super().__init__(cfg)
+        self.index = VarnodeIndex() if columns is None else columns.index
+
+        num_blocks = len(cfg.blocks)
+
+        self.uses = [0] * num_blocks        # upward exposed
+        self.defs = [0] * num_blocks
+        self.phi_uses = defaultdict(int)    # (pred idx, phi block idx) -> read by the phis over that edge
+
+        for blk in cfg.blocks:
+            if columns is None:
+                self.scan_block(blk, ignore_uniq, ignore_pc)
+            else:
+                self.scan_columns(columns, blk, ignore_uniq, ignore_pc)
+
+        self.solve()
+
+    def scan_block(self, blk, ignore_uniq, ignore_pc):
+        uses = 0
+        defs = 0
+
+        for pcop in blk.pcode:
+            if pcop.is_phi():
+                for pred, inpt in zip(pcop.preds, pcop.inputs):
+                    if isinstance(inpt, Varnode) and not inpt.is_const() and \
+                       pcop.shd_incl_output(inpt, ignore_uniq, ignore_pc):
+                        self.phi_uses[(pred.idx, blk.idx)] |= 1 << self.index.id(inpt)
+            else:
+                uses |= self.index.bits(pcop.read_varnodes(ignore_uniq, ignore_pc)) & ~defs
+
+            defs |= self.index.bits(pcop.written_varnodes(ignore_uniq, ignore_pc))
+
+        self.uses[blk.idx] = uses
+        self.defs[blk.idx] = defs
+
+    def scan_columns(self, columns, blk, ignore_uniq, ignore_pc):
+        uses, defs, phi_uses = columns.scan_block(blk, ignore_uniq, ignore_pc)
+
+        for pred, bits in phi_uses.items():
+            self.phi_uses[(pred.idx, blk.idx)] |= bits
+
+        self.uses[blk.idx] = uses
+        self.defs[blk.idx] = defs
+
+    def top(self):
+        return 0
+
+    def meet(self, a, b):
+        return a | b
+
+    def transfer(self, blk, live_out):
+        return self.uses[blk.idx] | (live_out & ~self.defs[blk.idx])
+
+    def edge_value(self, succ, blk, live_in):
+        return live_in | self.phi_uses.get((blk.idx, succ.idx), 0)
+
+    def is_live_in(self, vnode, blk):
+        return bool(self.block_in(blk) & self.index.bit(vnode))
+
+    def is_live_out(self, vnode, blk):
+        return bool(self.block_out(blk) & self.index.bit(vnode))
+
+    def live_in_varnodes(self, blk):
+        return self.index.varnodes(self.block_in(blk))
+
+    def live_out_varnodes(self, blk):
+        return self.index.varnodes(self.block_out(blk))
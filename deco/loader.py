@@ -0,0 +1,175 @@
+import json
+
+from insn import Instruction
+from pcode import PcodeOp
+from pcode_bin import MAGIC, VERSION, HEADER, STR_LEN, INSN, OP, INPUT, VARNODE, NO_OUTPUT
+from varnode import Varnode
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = ' \t\n\r'
+
+
+def iter_json_array(f, chunk_size=CHUNK_SIZE):
+    """
+    Incrementally decode the elements of the top-level JSON array in `f`.
+
+    Only the element currently being decoded (plus at most one chunk of
+    lookahead) is ever held in memory, so this works on exports that are
+    far larger than we'd like to `json.load` in one go.
+    """
+    decoder = json.JSONDecoder()
+    buff = ''
+    pos = 0
+    eof = False
+    started = False
+    expect_elem = True      # after `[` or `,`, otherwise after an element
+    elems = 0
+
+    def fill(size=chunk_size):
+        nonlocal buff, pos, eof
+        chunk = f.read(size)
+
+        if len(chunk) == 0:
+            eof = True
+
+        # Drop whatever we've already consumed so the buffer doesn't grow with the file.
+        buff = buff[pos:] + chunk
+        pos = 0
+
+    def fill_more():
+        # An element that didn't fit gets parsed again from its start after
+        # each read, so read as much as we already have to keep that linear.
+        fill(max(chunk_size, len(buff) - pos))
+
+    while True:
+        while pos < len(buff) and buff[pos] in WHITESPACE:
+            pos += 1
+
+        if pos == len(buff):
+            if eof:
+                raise ValueError('Unexpected end of P-code array')
+            fill()
+            continue
+
+        if not started:
+            if buff[pos] != '[':
+                raise ValueError('Expected a JSON array of instructions')
+            started = True
+            pos += 1
+            continue
+
+        if not expect_elem:
+            if buff[pos] == ']':
+                return
+
+            if buff[pos] != ',':
+                raise ValueError('Expected , or ] after an element of the P-code array')
+
+            pos += 1
+            expect_elem = True
+            continue
+
+        if buff[pos] == ']' and elems == 0:
+            return
+
+        if buff[pos] in ',]':
+            raise ValueError('Expected an element of the P-code array')
+
+        try:
+            elem, end = decoder.raw_decode(buff, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill_more()
+            continue
+
+        # A truncated scalar can still decode (e.g. `12` out of `123`), so make sure
+        # we've actually seen where the element ends before trusting it.
+        if end == len(buff) and not eof:
+            fill_more()
+            continue
+
+        pos = end
+        elems += 1
+        expect_elem = False
+        yield elem
+
+
+def iter_insns(f):
+    """
+    Lazily yield `Instruction`s from an exported function file object.
+    """
+    for ij in iter_json_array(f):
+        yield from Instruction.fromjson(ij)
+
+
+def load_insns(path):
+    with open(path) as f:
+        yield from iter_insns(f)
+
+
+def unpack_strings(buf, offset, n):
+    strs = []
+
+    for _ in range(n):
+        length, = STR_LEN.unpack_from(buf, offset)
+        offset += STR_LEN.size
+        strs.append(bytes(buf[offset:offset+length]).decode('utf-8'))
+        offset += length
+
+    return strs, offset
+
+
+def iter_binary_insns(buf, offset=0):
+    """
+    Lazily yield `Instruction`s from a pcode_bin container held in `buf`.
+
+    `buf` can be anything supporting the buffer protocol (bytes, mmap, memoryview).
+    All of the records are unpacked before the first instruction is built
+    and the view of `buf` is released then, so a generator that's only
+    partly consumed doesn't stop an mmap from being closed.
+    """
+    with memoryview(buf) as view:
+        magic, version, _, n_spaces, n_mnemonics, n_insns, n_ops, n_inputs, n_vnodes = HEADER.unpack_from(view, offset)
+
+        if magic != MAGIC:
+            raise ValueError('Not a P-code container (bad magic %r)' % magic)
+
+        if version > VERSION:
+            raise ValueError('Unsupported P-code container version %d' % version)
+
+        offset += HEADER.size
+        spaces, offset = unpack_strings(view, offset, n_spaces)
+        mnemonics, offset = unpack_strings(view, offset, n_mnemonics)
+
+        insns_off = offset
+        ops_off = insns_off + n_insns * INSN.size
+        inputs_off = ops_off + n_ops * OP.size
+        vnodes_off = inputs_off + n_inputs * INPUT.size
+
+        # Every distinct varnode is only built once, ops share them.
+        vnodes = [Varnode(spaces[space], vnode_off, size)
+                  for vnode_off, size, space in VARNODE.iter_unpack(view[vnodes_off:vnodes_off+n_vnodes*VARNODE.size])]
+        inputs = [idx for idx, in INPUT.iter_unpack(view[inputs_off:vnodes_off])]
+        insn_recs = list(INSN.iter_unpack(view[insns_off:ops_off]))
+        op_recs = list(OP.iter_unpack(view[ops_off:inputs_off]))
+
+    del buf
+
+    for _, length, first_op, num_ops in insn_recs:
+        pcode = []
+
+        for addr, mnemonic, arity, output, first_input in op_recs[first_op:first_op+num_ops]:
+            pcode.append(PcodeOp.fromparts(addr,
+                                           mnemonics[mnemonic],
+                                           [vnodes[idx] for idx in inputs[first_input:first_input+arity]],
+                                           None if output == NO_OUTPUT else vnodes[output]))
+
+        yield from Instruction.frompcode(length, pcode)
+
+
+def load_binary_insns(path):
+    with open(path, 'rb') as f:
+        buf = f.read()
+
+    yield from iter_binary_insns(buf)
@@ -1,8 +1,9 @@
 import pdb
 
-class Node(object):
-    NUM_NODES = 0
+from context import current_context
+
 
+class Node(object):
     def __init__(self, predecessor=None, predecessors=None, successors=None, idx=-1, name=None):
         self.predecessors = predecessors
         if predecessors is None:
@@ -16,9 +17,7 @@ class Node(object):
         self.name = name
 
         if name is None:
-            self.name = 'node_%d' % Node.NUM_NODES
-
-        Node.NUM_NODES += 1
+            self.name = 'node_%d' % current_context().next_node_num()
 
         if predecessor is not None:
             self.add_predecessor(predecessor)
@@ -26,9 +25,9 @@ class Node(object):
     def __repr__(self):
         return self.name
 
-    def __eq__(self, other):
-        return self.name == other.name
-
+    # Names are only unique within one AnalysisContext, so nodes compare by
+    # identity. Hashing by name still keeps set (and so phi input) order the
+    # same from one run to the next.
     def __hash__(self):
         return hash(self.name)
 
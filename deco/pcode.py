@@ -2,7 +2,9 @@ import pdb
 from functools import reduce
 
 from code_elem import CodeElement
+from context import current_context
 from exprs import *
+from simplify import simplify_pcode
 from stmts import *
 from varnode import Varnode, SSAVarnode
 from variable import Variable
@@ -25,6 +27,13 @@ class PcodeOp(CodeElement):
     def copy(self):
         return PcodeOp(self.addr, self.mnemonic, self.inputs, output=self.output)
 
+    def clone(self):
+        """
+        A new op with the same (pre-SSA) operands that shares nothing with
+        this one, for keeping the original P-code of a block around.
+        """
+        return PcodeOp.fromparts(self.addr, self.mnemonic, list(self.inputs), self.output)
+
     def __repr__(self):
         op_str = ', '.join([str(v) for v in self.inputs])
         rhs = '%s %s' % (self.mnemonic, op_str)
@@ -39,14 +48,21 @@ class PcodeOp(CodeElement):
         return self.addr == other.addr
 
     @classmethod
-    def fromjson(cls, j):
+    def fromjson(cls, j, addr=None):
         inputs = [Varnode.fromjson(ij) for ij in j['inputs']]
         output = None
 
         if 'output' in j:
             output = Varnode.fromjson(j['output'])
 
-        pcop = cls(j['addr'], j['mnemonic'], inputs, output)
+        if addr is None:
+            addr = j['addr']
+
+        return cls.fromparts(addr, j['mnemonic'], inputs, output)
+
+    @classmethod
+    def fromparts(cls, addr, mnemonic, inputs, output=None):
+        pcop = cls(addr, mnemonic, inputs, output)
 
         if pcop.is_call():
             pcop = CallOp.frompcop(pcop)
@@ -88,14 +104,7 @@ class PcodeOp(CodeElement):
         mnemonic = s[:mnem_idx]
         inputs = [Varnode.fromstring(comp) for comp in s[mnem_idx+1:].split(', ')]
 
-        pcop = cls(addr, mnemonic, inputs, output)
-
-        if pcop.is_call():
-            pcop = CallOp.frompcop(pcop)
-        elif pcop.is_ret():
-            pcop = RetOp.frompcop(pcop)
-
-        return pcop
+        return cls.fromparts(addr, mnemonic, inputs, output)
 
     def returns(self):
         return 'RETURN' in self.mnemonic
@@ -162,12 +171,41 @@ class PcodeOp(CodeElement):
 
         return vnodes
 
+    def read_varnodes(self, ignore_uniq=False, ignore_pc=True):
+        return { v for v in self.inputs \
+                 if isinstance(v, Varnode) and not v.is_const() and \
+                    self.shd_incl_output(v, ignore_uniq, ignore_pc) }
+
     def can_be_propagated(self):
         return self.has_output() and self.is_identity() and \
-               (self.is_phi() or not any([use.pcop.is_phi() for use in self.output.uses]))
+               (self.is_phi() or not any([use.pcop.is_phi() for use in self.output.uses.values()]))
 
     def is_dead(self):
-        return self.has_output() and len(self.output.uses) == 0
+        return self.has_output() and self.output.num_uses() == 0
+
+    def propagate_copy(self):
+        """
+        Replace every use of this copy's output with its input and move those
+        uses over to the input. Unlike propagate_change_to, the input keeps
+        its own definition and existing uses.
+        """
+        prop_vnode = self.inputs[0]
+        is_ssa = isinstance(prop_vnode, SSAVarnode)
+
+        if is_ssa:
+            prop_vnode.remove_use(self)
+
+        for use in self.output.uses.values():
+            for idx in use.idxs:
+                use.user.replace_input(idx, prop_vnode)
+
+            if is_ssa:
+                prop_vnode.add_use(use.user, idxs=use.idxs)
+
+        self.output.uses = {}
+
+        # Remember where the output's value lives now for incremental updates.
+        current_context().replacements[id(self.output)] = (self.output, prop_vnode)
 
     def replace_input(self, idx, new_input):
         self.inputs[idx] = new_input
@@ -176,8 +214,15 @@ class PcodeOp(CodeElement):
         return all([inpt == self.inputs[0] for inpt in self.inputs])
 
     def relink_inputs(self, start_idx=1):
+        """
+        Drop this op's uses of the inputs from `start_idx` on. An input that
+        also appears before `start_idx` keeps its use.
+        """
+        kept = self.inputs[:start_idx]
+
         for inpt in self.inputs[start_idx:]:
-            inpt.remove_use(self)
+            if not any(inpt is k for k in kept):
+                inpt.remove_use(self)
 
     def convert_to_identity(self, lhs=None):
         self.relink_inputs()
@@ -188,8 +233,23 @@ class PcodeOp(CodeElement):
         self.mnemonic = 'COPY'
         self.inputs = [lhs]
 
+        if isinstance(lhs, SSAVarnode):
+            lhs.update_use(self)
+
+    def convert_to_const(self, value):
+        self.relink_inputs(start_idx=0)
+        self.convert_to_identity(SSAVarnode('const', value, self.output.size, None, version=0))
+
+    def convert_to_branch(self):
+        """
+        Turn a conditional branch that's always taken into an unconditional one.
+        """
+        self.relink_inputs(start_idx=1)
+        self.mnemonic = 'BRANCH'
+        self.inputs = self.inputs[:1]
+
     def convert_to_zero(self, lhs=None):
-        self.relink_inputs()
+        self.relink_inputs(start_idx=0)
 
         if lhs is None:
             lhs = self.inputs[0]
@@ -222,7 +282,7 @@ class PcodeOp(CodeElement):
             self.output.unwind_version()
 
     def convert_to_ssa(self):
-        inputs = [vnode.convert_to_ssa(self) for vnode in self.inputs]
+        inputs = [vnode.convert_to_ssa(self, idx=i) for i, vnode in enumerate(self.inputs)]
         output = None
 
         if self.has_output():
@@ -256,6 +316,11 @@ class PcodeOp(CodeElement):
         return stmts
 
 
+# TODO: Read cspecs to get varnodes killedbycall.
+# Varnodes are interned and never mutated, so every CALL/RETURN can share this list.
+KILLED_VARNODES = [Varnode.reg(off, 8) for off in [0x0, 0x10, 0x1200]]
+
+
 class ABIOp(PcodeOp):
     """
     Pcode operations that require ABI-dependent information (like CALL, RETURN, etc).
@@ -266,9 +331,7 @@ class ABIOp(PcodeOp):
 
     @classmethod
     def frompcop(cls, pcop):
-        # TODO: Read cspecs to get varnodes killedbycall.
-        killed_varnodes = [Varnode('register', off, 8) for off in [0x0, 0x10, 0x1200]]
-        return cls(pcop.addr, pcop.mnemonic, pcop.inputs, pcop.output, killed_varnodes)
+        return cls(pcop.addr, pcop.mnemonic, pcop.inputs, pcop.output, KILLED_VARNODES)
 
 
 class CallOp(ABIOp):
@@ -312,6 +375,10 @@ class RetOp(ABIOp):
         # to add a use to the definition.
         self.inputs += killed_varnodes
 
+    def clone(self):
+        inputs = self.inputs[:len(self.inputs) - len(self.killed_varnodes)]
+        return PcodeOp.fromparts(self.addr, self.mnemonic, inputs, self.output)
+
     def convert_to_ssa(self):
         super().convert_to_ssa()
 
@@ -323,6 +390,16 @@ class RetOp(ABIOp):
 
 
 class PhiOp(PcodeOp):
+    def __init__(self, addr, mnemonic, inputs, output=None, preds=None):
+        super().__init__(addr, mnemonic, inputs, output)
+
+        # The predecessor block each input flows in from. SSA conversion
+        # replaces the blocks in `inputs` with varnodes but these stay.
+        self.preds = preds
+
+        if preds is None:
+            self.preds = list(inputs)
+
     def __repr__(self):
         op_strs = []
 
@@ -356,6 +433,20 @@ class PhiOp(PcodeOp):
                 super().replace_input(idx, vnode)
                 vnode.add_use(self, idx=idx)
 
+    def remove_pred(self, pred):
+        """
+        Drop the input flowing in from `pred`, e.g. once the edge is gone.
+        """
+        idx = [i for i, p in enumerate(self.preds) if p is pred][0]
+        inputs = list(self.inputs)
+
+        del self.inputs[idx]
+        del self.preds[idx]
+
+        for inpt in inputs:
+            if isinstance(inpt, SSAVarnode):
+                inpt.update_use(self)
+
     def convert_to_ssa(self):
         self.output = self.output.convert_to_ssa(self, assignment=True)
 
@@ -367,6 +458,11 @@ class PcodeList(CodeElement):
 
     def __repr__(self):
         addr_str = '%s: ' % addr_to_str(self.addr)
+
+        # Simplification can leave a block without any ops.
+        if len(self.pcode) == 0:
+            return addr_str.rstrip()
+
         return '\n'.join([addr_str + str(self.pcode[0])] + [(' ' * len(addr_str)) + str(pcop) for pcop in self.pcode[1:]])
 
     def __len__(self):
@@ -385,6 +481,19 @@ class PcodeList(CodeElement):
         return reduce(lambda x,y: x.union(y), 
                       [pcop.written_varnodes(ignore_uniq=ignore_uniq, ignore_pc=ignore_pc) for pcop in self.pcode])
 
+    def upward_exposed_varnodes(self, ignore_uniq=False, ignore_pc=True):
+        """
+        Varnodes that are read before (or without) being written in this list.
+        """
+        exposed = set()
+        written = set()
+
+        for pcop in self.pcode:
+            exposed.update(pcop.read_varnodes(ignore_uniq, ignore_pc) - written)
+            written.update(pcop.written_varnodes(ignore_uniq, ignore_pc))
+
+        return exposed
+
     def returns(self):
         return self.pcode[-1].returns()
 
@@ -408,23 +517,10 @@ class PcodeList(CodeElement):
         Do some basic arithmetic simplification on the pcop's then
         perform copy propagation on the result.
         """
-        new_pcode = []
-
-        for pcop in self.pcode:
-            pcop.simplify()
-
-            if pcop.is_dead():
-                pcop.relink_inputs(start_idx=0)
-            elif pcop.can_be_propagated():
-                prop_vnode = pcop.inputs[0]
-                pcop.output.propagate_change_to(prop_vnode)
-            else:
-                new_pcode.append(pcop)
-
-        changed = len(self.pcode) != len(new_pcode)
-        self.update_elems(new_pcode)
+        removed = simplify_pcode(self.pcode)
+        self.update_elems([pcop for pcop in self.pcode if id(pcop) not in removed])
 
-        return changed
+        return len(removed) > 0
 
     def unwind_version(self):
         for pcop in self.pcode:
@@ -439,7 +535,7 @@ class PcodeList(CodeElement):
         For each phi-node,
 
         1. Create a new variable.
-        2. Map the inputs and output to the new variable using Variable.CACHE.
+        2. Map the inputs and output to the new variable using the context's variable cache.
         3. For each input, flag its definition as an assign operation so that
            we'll create a statement for it later.
         """
@@ -455,7 +551,7 @@ class PcodeList(CodeElement):
 
             for inpt in pcop.inputs:
                 expr = VarnodeExpr(inpt)
-                Variable.CACHE[expr] = var
+                current_context().variables[expr] = var
 
                 if inpt.defn is not None and not inpt.defn.is_assign():
                     inpt.defn.set_is_assign(True)
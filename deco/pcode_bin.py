@@ -0,0 +1,142 @@
+"""
+Compact binary container for exported P-code.
+
+This module intentionally doesn't depend on anything else in deco/ (and
+sticks to Python 2 compatible syntax) so that the Ghidra export script
+can use the writer from Jython. The reader lives in loader.py.
+
+Layout (all little-endian):
+
+    header
+    space names     n_spaces    x (u16 length, utf-8 bytes)
+    mnemonics       n_mnemonics x (u16 length, utf-8 bytes)
+    instructions    n_insns     x INSN
+    ops             n_ops       x OP
+    op inputs       n_inputs    x u32 varnode index
+    varnodes        n_vnodes    x VARNODE
+
+Varnodes are interned, so every distinct (space, offset, size) triple is
+stored exactly once and ops refer to them by index.
+"""
+import json
+import struct
+import sys
+
+MAGIC = b'PCOD'
+VERSION = 1
+
+HEADER = struct.Struct('<4sHHHHIIII')  # magic, version, flags, n_spaces, n_mnemonics, n_insns, n_ops, n_inputs, n_vnodes
+STR_LEN = struct.Struct('<H')
+INSN = struct.Struct('<qIII')          # addr, length, first op, n ops
+OP = struct.Struct('<dHHiI')           # addr, mnemonic idx, n inputs, output varnode idx (-1 if none), first input
+INPUT = struct.Struct('<I')            # varnode idx
+VARNODE = struct.Struct('<qIH')        # offset, size, space idx
+
+NO_OUTPUT = -1
+
+
+class Interner(object):
+    def __init__(self):
+        self.lookup = {}
+        self.values = []
+
+    def __len__(self):
+        return len(self.values)
+
+    def get(self, value):
+        idx = self.lookup.get(value)
+
+        if idx is None:
+            idx = len(self.values)
+            self.lookup[value] = idx
+            self.values.append(value)
+
+        return idx
+
+
+def pack_strings(strs):
+    chunks = []
+
+    for s in strs:
+        b = s.encode('utf-8')
+        chunks.append(STR_LEN.pack(len(b)))
+        chunks.append(b)
+
+    return b''.join(chunks)
+
+
+def op_addr(ij, idx):
+    """
+    The address of op `idx` of the exported instruction `ij`. Older exports
+    (like funcs/sp_init.json) don't have one per op, so spread the ops over
+    the instruction's bytes the way export_func_pcode.py does.
+    """
+    pj = ij['pcode'][idx]
+
+    if 'addr' in pj:
+        return pj['addr']
+
+    return float(int(ij['addr'], 16)) + ij['length'] * float(idx) / len(ij['pcode'])
+
+
+def write_pcode(f, insn_js):
+    """
+    Write a list of instructions in the export_func_pcode.py JSON schema to `f`.
+    """
+    spaces = Interner()
+    mnemonics = Interner()
+    vnodes = Interner()
+
+    def vnode_idx(vj):
+        vnode = (spaces.get(vj['space']), int(vj['offset'], 16), int(vj['size'], 16))
+        return vnodes.get(vnode)
+
+    insn_recs = []
+    op_recs = []
+    input_recs = []
+
+    for ij in insn_js:
+        insn_recs.append(INSN.pack(int(ij['addr'], 16), ij['length'], len(op_recs), len(ij['pcode'])))
+
+        for i, pj in enumerate(ij['pcode']):
+            output = NO_OUTPUT
+
+            if 'output' in pj:
+                output = vnode_idx(pj['output'])
+
+            op_recs.append(OP.pack(op_addr(ij, i),
+                                   mnemonics.get(pj['mnemonic']),
+                                   len(pj['inputs']),
+                                   output,
+                                   len(input_recs)))
+
+            for vj in pj['inputs']:
+                input_recs.append(INPUT.pack(vnode_idx(vj)))
+
+    f.write(HEADER.pack(MAGIC,
+                        VERSION,
+                        0,
+                        len(spaces),
+                        len(mnemonics),
+                        len(insn_recs),
+                        len(op_recs),
+                        len(input_recs),
+                        len(vnodes)))
+    f.write(pack_strings(spaces.values))
+    f.write(pack_strings(mnemonics.values))
+    f.write(b''.join(insn_recs))
+    f.write(b''.join(op_recs))
+    f.write(b''.join(input_recs))
+    f.write(b''.join([VARNODE.pack(offset, size, space) for space, offset, size in vnodes.values]))
+
+
+def convert_json(json_path, bin_path):
+    with open(json_path) as f:
+        insn_js = json.load(f)
+
+    with open(bin_path, 'wb') as f:
+        write_pcode(f, insn_js)
+
+
+if __name__ == '__main__':
+    convert_json(sys.argv[1], sys.argv[2])
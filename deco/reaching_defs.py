@@ -0,0 +1,78 @@
+"""
+Reaching definitions of varnodes, on the generic dataflow framework.
+
+Each (op, written varnode) pair is a definition with a dense id and the
+sets of definitions are int bitsets, like in liveness.
+"""
+from collections import defaultdict
+
+from dataflow_solver import DataflowAnalysis, FORWARD
+
+
+class ReachingDefinitions(DataflowAnalysis):
+    direction = FORWARD
+
+    def __init__(self, cfg, ignore_uniq=True, ignore_pc=True):
+        super().__init__(cfg)
+
+        self.defs = []                      # def id -> (pcop, varnode)
+        self.vnode_defs = defaultdict(int)  # varnode -> ids of all of its defs
+
+        num_blocks = len(cfg.blocks)
+
+        self.gen = [0] * num_blocks
+        self.kill = [0] * num_blocks
+        block_writes = [[] for _ in range(num_blocks)]
+
+        for blk in cfg.blocks:
+            last_defs = {}
+
+            for pcop in blk.pcode:
+                for vnode in pcop.written_varnodes(ignore_uniq, ignore_pc):
+                    def_id = len(self.defs)
+                    self.defs.append((pcop, vnode))
+                    self.vnode_defs[vnode] |= 1 << def_id
+                    last_defs[vnode] = def_id
+
+            for def_id in last_defs.values():
+                self.gen[blk.idx] |= 1 << def_id
+
+            block_writes[blk.idx] = list(last_defs.keys())
+
+        for blk in cfg.blocks:
+            for vnode in block_writes[blk.idx]:
+                self.kill[blk.idx] |= self.vnode_defs[vnode]
+
+    def top(self):
+        return 0
+
+    def meet(self, a, b):
+        return a | b
+
+    def transfer(self, blk, reaching):
+        return self.gen[blk.idx] | (reaching & ~self.kill[blk.idx])
+
+    def definitions(self, bits):
+        defs = []
+        def_id = 0
+
+        while bits:
+            if bits & 1:
+                defs.append(self.defs[def_id])
+
+            bits >>= 1
+            def_id += 1
+
+        return defs
+
+    def reaching_in(self, blk, vnode=None):
+        """
+        The (op, varnode) definitions reaching the start of `blk`,
+        optionally only those of `vnode`.
+        """
+        bits = self.block_in(blk)
+
+        if vnode is not None:
+            bits &= self.vnode_defs.get(vnode, 0)
+
+        return self.definitions(bits)
@@ -0,0 +1,317 @@
+"""
+Sparse conditional constant propagation over SSA pcode.
+
+Wegman and Zadeck, "Constant Propagation with Conditional Branches" (1991).
+Values and reachability are solved together: a block only becomes
+executable through an edge whose branch can actually be taken, and phis
+only merge the inputs coming in over executable edges. A value is either
+unknown (not in the map yet), a constant or OVERDEFINED.
+"""
+from varnode import SSAVarnode
+from worklist import Worklist
+
+OVERDEFINED = object()
+
+
+def mask(value, size):
+    return value & ((1 << (size * 8)) - 1)
+
+
+def signed(value, size):
+    bits = size * 8
+
+    if value & (1 << (bits - 1)):
+        return value - (1 << bits)
+
+    return value
+
+
+def sdiv(a, b):
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def srem(a, b):
+    return a - b * sdiv(a, b)
+
+
+def shift_left(a, b, size):
+    return a << b if b < size * 8 else 0
+
+
+def shift_right(a, b, size):
+    return a >> b if b < size * 8 else 0
+
+
+# mnemonic -> fn(input values, input sizes, output size). Input values are
+# masked to their size, the result is masked to the output's size. None means
+# the op can't be folded (e.g. division by zero).
+FOLDERS = {
+    'COPY':           lambda v, s, o: v[0],
+    'INT_ADD':        lambda v, s, o: v[0] + v[1],
+    'INT_SUB':        lambda v, s, o: v[0] - v[1],
+    'INT_MULT':       lambda v, s, o: v[0] * v[1],
+    'INT_DIV':        lambda v, s, o: v[0] // v[1] if v[1] != 0 else None,
+    'INT_REM':        lambda v, s, o: v[0] % v[1] if v[1] != 0 else None,
+    'INT_SDIV':       lambda v, s, o: sdiv(signed(v[0], s[0]), signed(v[1], s[1])) if v[1] != 0 else None,
+    'INT_SREM':       lambda v, s, o: srem(signed(v[0], s[0]), signed(v[1], s[1])) if v[1] != 0 else None,
+    'INT_AND':        lambda v, s, o: v[0] & v[1],
+    'INT_OR':         lambda v, s, o: v[0] | v[1],
+    'INT_XOR':        lambda v, s, o: v[0] ^ v[1],
+    'INT_LEFT':       lambda v, s, o: shift_left(v[0], v[1], s[0]),
+    'INT_RIGHT':      lambda v, s, o: shift_right(v[0], v[1], s[0]),
+    'INT_SRIGHT':     lambda v, s, o: signed(v[0], s[0]) >> min(v[1], s[0] * 8),
+    'INT_EQUAL':      lambda v, s, o: int(v[0] == v[1]),
+    'INT_NOTEQUAL':   lambda v, s, o: int(v[0] != v[1]),
+    'INT_LESS':       lambda v, s, o: int(v[0] < v[1]),
+    'INT_LESSEQUAL':  lambda v, s, o: int(v[0] <= v[1]),
+    'INT_SLESS':      lambda v, s, o: int(signed(v[0], s[0]) < signed(v[1], s[1])),
+    'INT_SLESSEQUAL': lambda v, s, o: int(signed(v[0], s[0]) <= signed(v[1], s[1])),
+    'INT_ZEXT':       lambda v, s, o: v[0],
+    'INT_SEXT':       lambda v, s, o: signed(v[0], s[0]),
+    'INT_NEGATE':     lambda v, s, o: ~v[0],
+    'INT_2COMP':      lambda v, s, o: -v[0],
+    'INT_CARRY':      lambda v, s, o: int(v[0] + v[1] > mask(-1, s[0])),
+    'INT_SCARRY':     lambda v, s, o: int(signed(mask(v[0] + v[1], s[0]), s[0]) != signed(v[0], s[0]) + signed(v[1], s[1])),
+    'INT_SBORROW':    lambda v, s, o: int(signed(mask(v[0] - v[1], s[0]), s[0]) != signed(v[0], s[0]) - signed(v[1], s[1])),
+    'BOOL_NEGATE':    lambda v, s, o: int(not v[0]),
+    'BOOL_AND':       lambda v, s, o: int(bool(v[0]) and bool(v[1])),
+    'BOOL_OR':        lambda v, s, o: int(bool(v[0]) or bool(v[1])),
+    'BOOL_XOR':       lambda v, s, o: int(bool(v[0]) != bool(v[1])),
+    'PIECE':          lambda v, s, o: (v[0] << (s[1] * 8)) | v[1],
+    'SUBPIECE':       lambda v, s, o: v[0] >> (v[1] * 8),
+}
+
+
+def fold(pcop, vals):
+    sizes = [inpt.size for inpt in pcop.inputs]
+    vals = [mask(val, size) for val, size in zip(vals, sizes)]
+    res = FOLDERS[pcop.mnemonic](vals, sizes, pcop.output.size)
+
+    if res is None:
+        return OVERDEFINED
+
+    return mask(res, pcop.output.size)
+
+
+def meet(a, b):
+    if a is None:
+        return b
+    if b is None or a == b:
+        return a
+
+    return OVERDEFINED
+
+
+class SCCP(object):
+    def __init__(self, cfg, blocks=None, entry=None):
+        """
+        Analyse all of `cfg` or, given `blocks` and the `entry` dominating
+        them, only those. Then everything they read from the other blocks
+        is taken to be overdefined (constants there were folded already)
+        and every edge into `entry` to be executable.
+        """
+        self.cfg = cfg
+        self.blocks = cfg.blocks if blocks is None else blocks
+        self.entry = cfg.entry if entry is None else entry
+
+        self.values = {}            # id(SSAVarnode) -> constant or OVERDEFINED
+        self.executable = set()     # blocks
+        self.exec_edges = set()     # (pred, succ) blocks
+        self.op_blocks = {}         # id(pcop) -> block containing it
+
+        for blk in self.blocks:
+            for pcop in blk.pcode:
+                self.op_blocks[id(pcop)] = blk
+
+        self.block_set = set(self.blocks)
+
+    def value(self, vnode):
+        if vnode.is_const():
+            return mask(vnode.offset, vnode.size)
+
+        if not isinstance(vnode, SSAVarnode) or vnode.defn is None or \
+           id(vnode.defn) not in self.op_blocks:
+            return OVERDEFINED
+
+        return self.values.get(id(vnode))
+
+    def set_value(self, vnode, val):
+        """
+        Lower `vnode` to `val` and queue its users if that changed anything.
+        """
+        old = self.values.get(id(vnode))
+        new = meet(old, val)
+
+        if new is None or new == old:
+            return
+
+        self.values[id(vnode)] = new
+
+        for user in vnode.users():
+            blk = self.op_blocks.get(id(user))
+
+            if blk in self.executable:
+                self.ssa_worklist.push(user)
+
+    def mark_edge(self, pred, succ):
+        if (pred, succ) in self.exec_edges:
+            return
+
+        self.exec_edges.add((pred, succ))
+
+        if succ not in self.block_set:
+            return
+
+        if succ not in self.executable:
+            self.executable.add(succ)
+
+            for pcop in succ.pcode:
+                self.ssa_worklist.push(pcop)
+        else:
+            for pcop in succ.phis():
+                self.ssa_worklist.push(pcop)
+
+    def branch_targets(self, blk, pcop):
+        """
+        The successors of `blk` that its final op can actually transfer to.
+        """
+        if not pcop.is_conditional() or pcop.target() is None:
+            return blk.successors
+
+        cond = self.value(pcop.inputs[1])
+
+        if cond is None:
+            return []
+        if cond is OVERDEFINED:
+            return blk.successors
+
+        taken = [succ for succ in blk.successors if succ.start == pcop.target()]
+        not_taken = [succ for succ in blk.successors if succ.start != pcop.target()]
+
+        # A conditional branch to its own fallthrough only has one successor.
+        if len(not_taken) == 0:
+            not_taken = taken
+
+        targets = taken if cond else not_taken
+
+        # The edge may have been pruned by an earlier run, keep what's left.
+        if len(targets) == 0:
+            return blk.successors
+
+        return targets
+
+    def visit(self, pcop):
+        blk = self.op_blocks[id(pcop)]
+
+        if pcop.is_phi():
+            val = None
+
+            for pred, inpt in zip(pcop.preds, pcop.inputs):
+                if (pred, blk) in self.exec_edges:
+                    val = meet(val, self.value(inpt))
+
+            if val is not None:
+                self.set_value(pcop.output, val)
+
+        elif pcop.has_output():
+            if pcop.mnemonic in FOLDERS:
+                vals = [self.value(inpt) for inpt in pcop.inputs]
+
+                if any(val is OVERDEFINED for val in vals):
+                    self.set_value(pcop.output, OVERDEFINED)
+                elif all(val is not None for val in vals):
+                    self.set_value(pcop.output, fold(pcop, vals))
+            else:
+                self.set_value(pcop.output, OVERDEFINED)
+
+        for vnode in getattr(pcop, 'killed_varnodes', []):
+            if isinstance(vnode, SSAVarnode) and vnode.defn is pcop:
+                self.set_value(vnode, OVERDEFINED)
+
+        if pcop is blk.pcode[-1] and not pcop.returns():
+            for succ in self.branch_targets(blk, pcop):
+                self.mark_edge(blk, succ)
+
+    def run(self):
+        self.ssa_worklist = Worklist()
+
+        entry = self.entry
+        self.executable.add(entry)
+
+        for pred in entry.predecessors:
+            if pred not in self.block_set:
+                self.exec_edges.add((pred, entry))
+
+        for pcop in entry.pcode:
+            self.ssa_worklist.push(pcop)
+
+        while len(self.ssa_worklist) > 0:
+            self.visit(self.ssa_worklist.pop())
+
+    def rewrite(self):
+        """
+        Replace everything found to be constant, fold decided branches and
+        unlink the edges that can never be taken. Returns the blocks that are
+        no longer reachable.
+        """
+        dead = [blk for blk in self.blocks if blk not in self.executable]
+
+        for blk in self.blocks:
+            if blk not in self.executable:
+                continue
+
+            for pcop in blk.pcode:
+                if not pcop.has_output() or \
+                   (pcop.is_identity() and pcop.inputs[0].is_const()):
+                    continue
+
+                val = self.values.get(id(pcop.output))
+
+                if val is not None and val is not OVERDEFINED:
+                    pcop.convert_to_const(val)
+
+            last = blk.pcode[-1]
+
+            if last.is_conditional():
+                targets = list(self.branch_targets(blk, last))
+
+                if len(targets) == 1 and targets[0].start == last.target():
+                    last.convert_to_branch()
+                elif len(targets) == 1:
+                    # Never taken, the block just falls through.
+                    last.relink_inputs(start_idx=0)
+                    blk.update_elems(blk.pcode[:-1])
+
+            for succ in list(blk.successors):
+                if (blk, succ) not in self.exec_edges:
+                    blk.remove_successor(succ)
+                    succ.remove_predecessor(blk)
+
+                    for phi in succ.phis():
+                        phi.remove_pred(blk)
+
+        for blk in dead:
+            for pcop in blk.pcode:
+                pcop.relink_inputs(start_idx=0)
+
+            for succ in blk.successors:
+                succ.remove_predecessor(blk)
+
+                for phi in succ.phis():
+                    phi.remove_pred(blk)
+
+            for pred in blk.predecessors:
+                pred.remove_successor(blk)
+
+        return dead
+
+
+def propagate_constants(cfg):
+    """
+    Run SCCP on `cfg` and rewrite it with the result. Returns the blocks that
+    were found to be unreachable (already unlinked from the rest).
+    """
+    sccp = SCCP(cfg)
+    sccp.run()
+    return sccp.rewrite()
@@ -0,0 +1,61 @@
+"""
+Def-use driven simplification of SSA pcode.
+
+Instead of re-walking every op until nothing changes, an op is only
+revisited when something it depends on changes: one of its inputs gets
+replaced by copy propagation, or one of its output's uses goes away
+(which can make it dead or propagatable).
+"""
+from varnode import SSAVarnode
+from worklist import Worklist
+
+
+def input_defns(inputs):
+    return [inpt.defn for inpt in inputs if isinstance(inpt, SSAVarnode)]
+
+
+def simplify_pcode(pcode):
+    """
+    Simplify the given ops in place and return the ids of the ones that were
+    removed, either because they were dead or because they were copies that
+    got propagated into their uses.
+    """
+    worklist = Worklist(pcode)
+    removed = set()
+
+    def push_all(pcops):
+        for pcop in pcops:
+            if id(pcop) not in removed:
+                worklist.push(pcop)
+
+    while len(worklist) > 0:
+        pcop = worklist.pop()
+
+        if id(pcop) in removed:
+            continue
+
+        inputs = list(pcop.inputs)
+        pcop.simplify()
+
+        # Rewriting an op relinks its inputs' uses, so their definitions
+        # may now be dead or propagatable.
+        if len(pcop.inputs) != len(inputs):
+            push_all(input_defns(inputs))
+
+        if pcop.is_dead():
+            pcop.relink_inputs(start_idx=0)
+            removed.add(id(pcop))
+            push_all(input_defns(pcop.inputs))
+
+        elif pcop.can_be_propagated():
+            prop_vnode = pcop.inputs[0]
+            prop_defn = prop_vnode.defn if isinstance(prop_vnode, SSAVarnode) else None
+            users = pcop.output.users()
+
+            pcop.propagate_copy()
+            removed.add(id(pcop))
+
+            push_all(users)
+            push_all([prop_defn])
+
+    return removed
@@ -2,8 +2,10 @@ import pdb
 from functools import reduce
 
 from blocks import Block
+from context import current_context
 from exprs import Expr
 from graph import Graph
+from instrument import cfg_counts, instrumented
 from stmts import *
 from variable import Variable
 
@@ -78,13 +80,15 @@ class MyAST(object):
             assign = AssignStmt(insert_addr, var, expr)
             blk.stmts.insert(insert_idx, assign)
 
+    @instrumented('simplify_ast')
     def simplify(self):
-        for expr in Expr.CACHE.values():
+        for expr in current_context().exprs.values():
             if (isinstance(expr, VarnodeExpr) and expr.vnode.is_func_input()) or \
-               len(expr.uses) >= 2:
+               expr.num_uses() >= 2:
                 self.create_assign(expr)
 
     @staticmethod
+    @instrumented('build_ast', cfg_counts)
     def fromcfg(cfg):
         cfg.convert_from_ssa()
 
@@ -13,7 +13,7 @@ class Stmt(object):
     def update_expr_uses(self, expr):
         expr.defn = self
 
-        for use in expr.uses:
+        for use in expr.uses.values():
             use.addr = self.addr
 
 
@@ -0,0 +1,285 @@
+"""
+Made-up functions in the export_func_pcode.py JSON format, for seeing how
+the pipeline scales past the few real functions in funcs/.
+
+The code is laid out the way a compiler would: straight-line blocks,
+if/else diamonds, loops tested at the top with a branch back at the bottom
+and switches, nested inside each other. Switches are a cascade of compares
+and conditional branches since the CFG doesn't follow indirect branches.
+"""
+import argparse
+import json
+import random
+
+SPACE_ID = 0x1b1    # the const the exports pass LOAD/STORE for the ram space
+FLAG = 0x206        # ZF
+STACK_PTR = 0x20
+PC = 0x288
+
+# x86-64 general purpose registers, less the stack and frame pointers.
+GP_REGS = [0x0, 0x8, 0x10, 0x18, 0x30, 0x38] + list(range(0x80, 0xc0, 8))
+
+INSN_LENGTHS = [2, 3, 3, 4, 5, 7]
+ARITH_OPS = ['INT_ADD', 'INT_SUB', 'INT_AND', 'INT_OR', 'INT_XOR', 'INT_MULT', 'COPY']
+
+# if/else and switches can't nest deeper than this, on top of the loops.
+MAX_NESTING = 8
+
+
+def vnode(space, offset, size=8):
+    return {'space': space, 'offset': hex(offset), 'size': hex(size)}
+
+
+def reg(offset, size=8):
+    return vnode('register', offset, size)
+
+
+def const(value, size=8):
+    return vnode('const', value, size)
+
+
+class Label(object):
+    """
+    A branch target, its address is known once it's placed.
+    """
+    def __init__(self):
+        self.addr = None
+
+
+class FunctionSynthesizer(object):
+    """
+    num_blocks      roughly how many basic blocks to generate
+    block_size      the average number of instructions in a straight-line block
+    loop_depth      how deep loops can nest (0 for no loops)
+    switch_fanout   cases per switch (0 for no switches)
+    call_density    the fraction of instructions that are calls
+    num_regs        how many registers the code works on, more means more
+                    values live at once and so more phis
+    """
+    def __init__(self, num_blocks=100, block_size=4, loop_depth=2, switch_fanout=4,
+                 call_density=0.05, num_regs=6, seed=0, entry=0x1000):
+        if num_regs < 1 or num_regs > len(GP_REGS):
+            raise ValueError('num_regs must be between 1 and %d' % len(GP_REGS))
+
+        self.num_blocks = num_blocks
+        self.block_size = block_size
+        self.loop_depth = loop_depth
+        self.switch_fanout = switch_fanout
+        self.call_density = call_density
+        self.regs = GP_REGS[:num_regs]
+        self.rng = random.Random(seed)
+        self.entry = entry
+
+    def generate(self):
+        """
+        The function's instructions, as export_func_pcode.py would write them.
+        """
+        self.insns = []
+        self.fixups = []        # (CBRANCH/BRANCH op, Label)
+        self.addr = self.entry
+        self.blocks_started = 0
+        self.in_block = False
+        self.unique = 0x1000
+
+        self.region(self.num_blocks, 0, 0)
+        self.epilogue()
+
+        for pcop, label in self.fixups:
+            pcop['inputs'][0] = vnode('ram', label.addr)
+
+        return self.insns
+
+    def insn(self, pcode):
+        if not self.in_block:
+            self.blocks_started += 1
+            self.in_block = True
+
+        length = self.rng.choice(INSN_LENGTHS)
+
+        for i, pcop in enumerate(pcode):
+            pcop['addr'] = self.addr + length * float(i) / len(pcode)
+
+        self.insns.append({'addr': hex(self.addr), 'length': length, 'pcode': pcode})
+        self.addr += length
+
+    def place(self, label):
+        label.addr = self.addr
+        self.in_block = False
+
+    def branch(self, label, cond=None):
+        if cond is None:
+            pcop = {'mnemonic': 'BRANCH', 'inputs': [None]}
+        else:
+            pcop = {'mnemonic': 'CBRANCH', 'inputs': [None, cond]}
+
+        self.fixups.append((pcop, label))
+        self.insn([pcop])
+        self.in_block = False
+
+    def compare(self):
+        flag = reg(FLAG, 1)
+        self.insn([{'mnemonic': 'INT_EQUAL',
+                    'inputs': [reg(self.rng.choice(self.regs)), const(self.rng.randrange(16))],
+                    'output': flag}])
+        return flag
+
+    def next_unique(self):
+        self.unique += 0x10
+        return vnode('unique', self.unique)
+
+    def instruction(self):
+        rng = self.rng
+
+        if rng.random() < self.call_density:
+            ret_addr = const(self.addr + 5)
+            self.insn([{'mnemonic': 'INT_SUB', 'inputs': [reg(STACK_PTR), const(8)], 'output': reg(STACK_PTR)},
+                       {'mnemonic': 'STORE', 'inputs': [const(SPACE_ID), reg(STACK_PTR), ret_addr]},
+                       {'mnemonic': 'CALL', 'inputs': [vnode('ram', 0x100000 + 0x10 * rng.randrange(64))]}])
+            return
+
+        dst = reg(rng.choice(self.regs))
+        src = reg(rng.choice(self.regs))
+        kind = rng.random()
+
+        if kind < 0.15:
+            # mov reg, [reg + off]
+            addr = self.next_unique()
+            self.insn([{'mnemonic': 'INT_ADD', 'inputs': [src, const(8 * rng.randrange(8))], 'output': addr},
+                       {'mnemonic': 'LOAD', 'inputs': [const(SPACE_ID), addr], 'output': dst}])
+        elif kind < 0.25:
+            # mov [reg], reg
+            self.insn([{'mnemonic': 'STORE', 'inputs': [const(SPACE_ID), src, dst]}])
+        else:
+            mnemonic = rng.choice(ARITH_OPS)
+
+            if mnemonic == 'COPY':
+                inputs = [src]
+            elif rng.random() < 0.3:
+                inputs = [dst, const(rng.randrange(1, 256))]
+            else:
+                inputs = [dst, src]
+
+            self.insn([{'mnemonic': mnemonic, 'inputs': inputs, 'output': dst}])
+
+    def straight(self):
+        for _ in range(self.rng.randint(1, 2 * self.block_size - 1)):
+            self.instruction()
+
+    def region(self, budget, loops, nesting):
+        """
+        Code that takes up about `budget` blocks, inside `loops` loops and
+        `nesting` other constructs.
+        """
+        used = 0
+
+        while used < budget:
+            left = budget - used
+            before = self.blocks_started
+            choices = ['straight']
+
+            if left > 2 and nesting < MAX_NESTING:
+                choices.append('if')
+
+                if loops < self.loop_depth:
+                    choices.append('loop')
+
+                if self.switch_fanout > 0 and left > self.switch_fanout + 2:
+                    choices.append('switch')
+
+            kind = self.rng.choice(choices)
+            inner = self.rng.randint(1, max(1, left // 2))
+
+            if kind == 'straight':
+                self.straight()
+            elif kind == 'if':
+                self.if_else(inner, loops, nesting + 1)
+            elif kind == 'loop':
+                self.loop(inner, loops + 1, nesting)
+            else:
+                self.switch(inner, loops, nesting + 1)
+
+            # Straight-line code may just extend the current block.
+            used += max(1, self.blocks_started - before)
+
+    def if_else(self, budget, loops, nesting):
+        other = Label()
+        end = Label()
+
+        self.straight()
+        self.branch(other, self.compare())
+        self.region(max(1, budget // 2), loops, nesting)
+
+        if self.rng.random() < 0.5:
+            # No else.
+            self.place(other)
+            return
+
+        self.branch(end)
+        self.place(other)
+        self.region(max(1, budget // 2), loops, nesting)
+        self.place(end)
+
+    def loop(self, budget, loops, nesting):
+        head = Label()
+        exit = Label()
+
+        self.place(head)
+        self.branch(exit, self.compare())
+        self.region(budget, loops, nesting)
+        self.branch(head)
+        self.place(exit)
+
+    def switch(self, budget, loops, nesting):
+        cases = [Label() for _ in range(self.switch_fanout)]
+        end = Label()
+        case_budget = max(1, budget // (self.switch_fanout + 1))
+
+        for case in cases:
+            self.branch(case, self.compare())
+
+        # The default case.
+        self.region(case_budget, loops, nesting)
+
+        for case in cases:
+            self.branch(end)
+            self.place(case)
+            self.region(case_budget, loops, nesting)
+
+        self.place(end)
+
+    def epilogue(self):
+        self.insn([{'mnemonic': 'COPY', 'inputs': [reg(self.rng.choice(self.regs))], 'output': reg(0x0)}])
+        self.insn([{'mnemonic': 'LOAD', 'inputs': [const(SPACE_ID), reg(STACK_PTR)], 'output': reg(PC)},
+                   {'mnemonic': 'INT_ADD', 'inputs': [reg(STACK_PTR), const(8)], 'output': reg(STACK_PTR)},
+                   {'mnemonic': 'RETURN', 'inputs': [reg(PC)]}])
+
+
+def synthesize(num_blocks=100, **kwargs):
+    """
+    The instructions of a made-up function, see FunctionSynthesizer for the options.
+    """
+    return FunctionSynthesizer(num_blocks, **kwargs).generate()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic function as exported P-code JSON.')
+    parser.add_argument('output', help='JSON file to write')
+    parser.add_argument('-n', '--blocks', type=int, default=100, help='roughly how many basic blocks')
+    parser.add_argument('--block-size', type=int, default=4, help='average instructions per block')
+    parser.add_argument('--loop-depth', type=int, default=2, help='how deep loops can nest')
+    parser.add_argument('--switch-fanout', type=int, default=4, help='cases per switch')
+    parser.add_argument('--call-density', type=float, default=0.05, help='fraction of instructions that are calls')
+    parser.add_argument('--regs', type=int, default=6, help='how many registers the code uses')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    insns = synthesize(args.blocks,
+                       block_size=args.block_size,
+                       loop_depth=args.loop_depth,
+                       switch_fanout=args.switch_fanout,
+                       call_density=args.call_density,
+                       num_regs=args.regs,
+                       seed=args.seed)
+
+    with open(args.output, 'w') as f:
+        json.dump(insns, f, indent=True)
@@ -0,0 +1,71 @@
+"""
+Depth-first traversals with an explicit stack instead of recursion, so
+long chains of blocks don't run into Python's recursion limit.
+"""
+
+
+def get_successors(node):
+    return node.successors
+
+
+def dfs(root, visited, pre_fn=None, post_fn=None, successors=get_successors):
+    """
+    Visit everything reachable from `root` that isn't already in `visited`.
+
+    Callbacks fire in exactly the order a recursive DFS would fire them:
+    `pre_fn` when a node is first reached, `post_fn` once all of its
+    successors are finished.
+    """
+    if pre_fn is not None:
+        pre_fn(root)
+
+    visited.add(root)
+    stack = [(root, iter(successors(root)))]
+
+    while len(stack) > 0:
+        node, succs = stack[-1]
+
+        for succ in succs:
+            if succ not in visited:
+                if pre_fn is not None:
+                    pre_fn(succ)
+
+                visited.add(succ)
+                stack.append((succ, iter(successors(succ))))
+                break
+        else:
+            stack.pop()
+
+            if post_fn is not None:
+                post_fn(node)
+
+
+class Traversal(object):
+    """
+    Pre- and postorder of everything reachable from `roots`, computed once.
+    """
+    def __init__(self, roots, successors=get_successors):
+        self.preorder = []
+        self.postorder = []
+
+        visited = set()
+
+        for root in roots:
+            if root not in visited:
+                dfs(root,
+                    visited,
+                    pre_fn=self.preorder.append,
+                    post_fn=self.postorder.append,
+                    successors=successors)
+
+        self._reverse_postorder = None
+
+    def __len__(self):
+        return len(self.preorder)
+
+    @property
+    def reverse_postorder(self):
+        if self._reverse_postorder is None:
+            self._reverse_postorder = self.postorder[::-1]
+
+        return self._reverse_postorder
@@ -1,10 +1,9 @@
+from context import current_context
 from data_flow import DataFlowObj, ExprUse
 
 
 class Variable(DataFlowObj):
     # TODO: Make Variable a subclass of Expr.
-    CACHE = {}
-
     def __init__(self, value, name=None):
         super().__init__()
 
@@ -14,7 +13,7 @@ class Variable(DataFlowObj):
         self.name = name
         self.value = value
 
-        Variable.CACHE[value] = self
+        current_context().variables[value] = self
 
     def __repr__(self):
         return self.name
@@ -30,7 +29,7 @@ class Variable(DataFlowObj):
 
     @staticmethod
     def get_name():
-        return 'v%d' % len(Variable.CACHE)
+        return 'v%d' % len(current_context().variables)
 
     @staticmethod
     def fromexpr(expr, name=None):
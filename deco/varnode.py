@@ -1,30 +1,108 @@
-from collections import defaultdict
+import threading
+from weakref import ref
 
+from context import current_context
 from data_flow import DataFlowObj, VarnodeUse
 
+# Address spaces get small integer IDs so space checks are int compares and
+# so that array-backed storage can refer to them compactly.
+SPACES = ['const', 'unique', 'register', 'ram']
+SPACE_IDS = {space: i for i, space in enumerate(SPACES)}
+CONST, UNIQUE, REGISTER, RAM = range(4)
+
+
+def get_space_id(space):
+    space_id = SPACE_IDS.get(space)
+
+    if space_id is None:
+        space_id = len(SPACES)
+        SPACES.append(space)
+        SPACE_IDS[space] = space_id
+
+    return space_id
+
 
 class Varnode(object):
-    def __init__(self, space, offset, size):
-        self.space = space
-        self.offset = offset
-        self.size = size
+    """
+    Plain (non-SSA) varnodes are immutable and interned: constructing the same
+    (space, offset, size) twice returns the same object, so equality between
+    them is identity and every operand of every op shares one instance.
+
+    The intern table only holds varnodes weakly, so a varnode goes away
+    with the last function that uses it rather than living as long as the
+    process does.
+    """
+    __slots__ = ('space', 'space_id', 'offset', 'size', '_hash', '__weakref__')
+
+    INTERNED = {}       # (space, offset, size) -> weak reference to the varnode
+    INTERN_LOCK = threading.RLock()
+
+    def __new__(cls, space, offset, size, *args, **kwargs):
+        key = (space, offset, size)
+
+        if cls is Varnode:
+            vnode_ref = Varnode.INTERNED.get(key)
+            vnode = None if vnode_ref is None else vnode_ref()
+
+            if vnode is not None:
+                return vnode
+
+            # Two threads interning the same key at once must not end up
+            # with different instances.
+            with Varnode.INTERN_LOCK:
+                vnode_ref = Varnode.INTERNED.get(key)
+                vnode = None if vnode_ref is None else vnode_ref()
+
+                if vnode is None:
+                    vnode = Varnode.make(cls, space, offset, size, key)
+                    Varnode.INTERNED[key] = ref(vnode, lambda dead, key=key: Varnode.forget(key, dead))
+
+            return vnode
+
+        return Varnode.make(cls, space, offset, size, key)
+
+    @staticmethod
+    def forget(key, dead):
+        # The key may have been interned again since this reference died.
+        with Varnode.INTERN_LOCK:
+            if Varnode.INTERNED.get(key) is dead:
+                del Varnode.INTERNED[key]
+
+    @staticmethod
+    def make(cls, space, offset, size, key):
+        vnode = object.__new__(cls)
+        vnode.space_id = get_space_id(space)
+        vnode.space = SPACES[vnode.space_id]
+        vnode.offset = offset
+        vnode.size = size
+        vnode._hash = hash(key)
+        return vnode
+
+    def __getnewargs__(self):
+        return (self.space, self.offset, self.size)
 
     def __repr__(self):
-        if self.space == 'const':
+        if self.space_id == CONST:
             return '%s:%d' % (hex(self.offset), self.size)
-        elif self.space == 'unique':
+        elif self.space_id == UNIQUE:
             return 'U%x:%d' % (self.offset, self.size)
         else:
             return '[%s]%s:%d' % (self.space, hex(self.offset), self.size)
 
     def __hash__(self):
-        return hash((self.space, self.offset, self.size))
+        return self._hash
 
     def __eq__(self, other):
-        if isinstance(other, int):
+        if self is other:
+            return True
+        elif isinstance(other, int):
             return self.offset == other
         elif isinstance(other, Varnode):
-            return self.space == other.space and \
+            # Two distinct plain varnodes can't be equal since they're interned.
+            if type(self) is Varnode and type(other) is Varnode:
+                return False
+
+            return self.space_id == other.space_id and \
                    self.offset == other.offset and \
                    self.size == other.size
         else:
@@ -33,6 +111,12 @@ class Varnode(object):
             #raise TypeError(type(other))
             return False
 
+    def base(self):
+        """
+        The interned, version-less varnode for this location.
+        """
+        return self
+
     @staticmethod
     def reg(offset, size):
         return Varnode('register', offset, size)
@@ -68,16 +152,16 @@ class Varnode(object):
         return cls(space, offset, size)
 
     def is_ram(self):
-        return self.space == 'ram'
+        return self.space_id == RAM
 
     def is_unique(self):
-        return self.space == 'unique'
+        return self.space_id == UNIQUE
 
     def is_register(self):
-        return self.space == 'register'
+        return self.space_id == REGISTER
 
     def is_const(self):
-        return self.space == 'const'
+        return self.space_id == CONST
 
     def dominates(self, other):
         return other.is_const()
@@ -86,11 +170,11 @@ class Varnode(object):
         # TODO: Make nice (and arch-inderpendent).
         return self.is_register() and self.offset == 0x288
 
-    def convert_to_ssa(self, curr_pcop, assignment=False):
+    def convert_to_ssa(self, curr_pcop, assignment=False, idx=None):
         ssa_vnode = SSAVarnode.get_latest(self)
 
         if not assignment and ssa_vnode is not None:
-            ssa_vnode.add_use(curr_pcop)
+            ssa_vnode.add_use(curr_pcop, idx=idx)
         else:
             ssa_vnode = SSAVarnode(self.space, self.offset, self.size, curr_pcop)
 
@@ -98,13 +182,12 @@ class Varnode(object):
 
 
 class SSAVarnode(Varnode, DataFlowObj):
-    VERSION_LOOKUP = defaultdict(int)
-    EXISTING_VARNODES = defaultdict(list)
+    __slots__ = ('_base', 'version', 'defn', 'uses')
 
     def __init__(self, space, offset, size, defn, version=None):
-        Varnode.__init__(self, space, offset, size)
         DataFlowObj.__init__(self, defn)
-        SSAVarnode.EXISTING_VARNODES[hash(self)].append(self)
+        self._base = Varnode(space, offset, size)
+        current_context().rename_stacks[self._base].append(self)
 
         if version is None:
             self.version = SSAVarnode.get_version(self)
@@ -112,6 +195,9 @@ class SSAVarnode(Varnode, DataFlowObj):
             self.version = version
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         super_eq = super().__eq__(other)
 
         if type(other) == SSAVarnode:
@@ -120,11 +206,14 @@ class SSAVarnode(Varnode, DataFlowObj):
         return super_eq
 
     def __hash__(self):
-        return super().__hash__()
+        return self._hash
 
     def __repr__(self):
         return '%s (%d)' % (super().__repr__(), self.version)
 
+    def base(self):
+        return self._base
+
     def use_type(self):
         return VarnodeUse
 
@@ -135,7 +224,7 @@ class SSAVarnode(Varnode, DataFlowObj):
         j['defn']    = id(self.defn)
         j['uses']    = []
 
-        for use in self.uses:
+        for use in self.uses.values():
             j['uses'].append({
                 'pcop': id(use.pcop),
                 'idxs': use.idxs
@@ -175,16 +264,21 @@ class SSAVarnode(Varnode, DataFlowObj):
 
     @staticmethod
     def get_version(vnode):
-        ver = SSAVarnode.VERSION_LOOKUP[hash(vnode)]
-        SSAVarnode.VERSION_LOOKUP[hash(vnode)] += 1
+        versions = current_context().versions
+        base = vnode.base()
+        ver = versions[base]
+        versions[base] = ver + 1
         return ver
 
     @staticmethod
     def get_latest(vnode):
         ssa_vnode = None
 
-        if hash(vnode) in SSAVarnode.EXISTING_VARNODES:
-            ssa_vnodes = SSAVarnode.EXISTING_VARNODES[hash(vnode)]
+        rename_stacks = current_context().rename_stacks
+        base = vnode.base()
+
+        if base in rename_stacks:
+            ssa_vnodes = rename_stacks[base]
             if len(ssa_vnodes) > 0:
                 ssa_vnode = ssa_vnodes[-1]
 
@@ -196,7 +290,9 @@ class SSAVarnode(Varnode, DataFlowObj):
         return ssa_vnode
 
     def unwind_version(self):
-        if hash(self) in SSAVarnode.EXISTING_VARNODES:
-            vnodes = SSAVarnode.EXISTING_VARNODES[hash(self)]
+        rename_stacks = current_context().rename_stacks
+
+        if self._base in rename_stacks:
+            vnodes = rename_stacks[self._base]
             if len(vnodes) > 0:
                 vnodes.pop(-1)
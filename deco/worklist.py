@@ -0,0 +1,31 @@
+from collections import deque
+
+
+class Worklist(object):
+    """
+    FIFO of items to (re)visit where each item is queued at most once at a time.
+
+    Items are tracked by identity since pcode ops define __eq__ but aren't hashable.
+    """
+    def __init__(self, items=None):
+        self.queue = deque()
+        self.queued = set()
+
+        if items is None:
+            items = []
+
+        for item in items:
+            self.push(item)
+
+    def __len__(self):
+        return len(self.queue)
+
+    def push(self, item):
+        if item is not None and id(item) not in self.queued:
+            self.queued.add(id(item))
+            self.queue.append(item)
+
+    def pop(self):
+        item = self.queue.popleft()
+        self.queued.discard(id(item))
+        return item
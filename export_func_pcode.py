@@ -1,4 +1,11 @@
 import json
+import sys
+from os.path import join
+
+MYDECO_DIR = '/Users/samlerner/Projects/mydeco'
+
+sys.path.insert(0, join(MYDECO_DIR, 'deco'))
+from pcode_bin import write_pcode
 
 pcode_j = []
 
@@ -37,5 +44,8 @@ while insn is not None and getFunctionContaining(insn.address) == func:
     pcode_j.append(insn_j)
     insn = insn.next
 
-with open('/Users/samlerner/Projects/mydeco/funcs/%s.json' % func.name, 'w') as f:
+with open(join(MYDECO_DIR, 'funcs', '%s.json' % func.name), 'w') as f:
     json.dump(pcode_j, f, indent=True)
+
+with open(join(MYDECO_DIR, 'funcs', '%s.pcb' % func.name), 'wb') as f:
+    write_pcode(f, pcode_j)
@@ -0,0 +1,307 @@
+"""
+asyncio version of server.py for sharing one server between several people.
+
+Analysis runs in a process pool, never in the event loop, so a slow function
+doesn't hold up anyone else's requests. Each analysis is a job:
+
+    POST /jobs?func=<name>      start (or join) a job, returns its id and status
+    GET  /jobs/<id>             status of the job
+    GET  /jobs/<id>/result      the function's JSON once done (202 until then)
+    GET  /jobs/<id>/skeleton    just the graph, without any block bodies
+    GET  /jobs/<id>/blocks/<a>  the body of the block starting at <a>
+    GET  /jobs/<id>/events      server-sent events, one per status change
+
+Requests for a function that's already being analyzed join the running job
+instead of starting another one, and finished jobs are kept (LRU, dropped when
+the export's mtime changes) so repeat requests are free. /cfg still works
+like in server.py (as do /cfg/skeleton and /cfg/block), it just awaits the job.
+"""
+import sys
+sys.path.insert(0, '../deco')
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+from aiohttp import web
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from os.path import basename, getmtime, join, splitext
+
+from func import Function
+from loader import load_insns
+
+FUNCS_DIR = join('..', 'funcs')
+STATIC_DIR = 'static'
+
+# How many finished jobs to keep results for.
+CACHE_SIZE = 16
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def analyze(path):
+    """
+    Runs in a worker process, returns the serialized responses: the whole
+    function, its skeleton and each block's body keyed on its start.
+    """
+    func = Function.frominsns(load_insns(path))
+    func_j = func.tojson()
+
+    blocks = {addr: json.dumps(blk_j) for addr, blk_j in func_j['cfg']['blocks'].items()}
+    return json.dumps(func_j), json.dumps(func.skeleton_json()), blocks
+
+
+class Job(object):
+    def __init__(self, job_id, name, path, mtime):
+        self.id = job_id
+        self.name = name
+        self.path = path
+        self.mtime = mtime
+
+        self.status = PENDING
+        self.body = None
+        self.skeleton = None
+        self.blocks = None
+        self.error = None
+
+        # Set whenever the status changes, then replaced with a fresh event.
+        self.changed = asyncio.Event()
+        self.finished = asyncio.Event()
+
+    def set_status(self, status):
+        self.status = status
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+        if status in [DONE, FAILED]:
+            self.finished.set()
+
+    def tojson(self):
+        j = {
+                'id': self.id,
+                'func': self.name,
+                'status': self.status
+            }
+
+        if self.error is not None:
+            j['error'] = self.error
+
+        return j
+
+
+class JobManager(object):
+    def __init__(self, workers=None, max_finished=CACHE_SIZE):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        self.max_finished = max_finished
+
+        # Jobs only go to the pool when there's a worker free for them, so
+        # if the pool breaks, the jobs it takes down are the running ones.
+        self.slots = asyncio.Semaphore(self.workers)
+
+        self.ids = itertools.count(1)
+        self.jobs = {}                  # job id -> Job
+        self.by_path = OrderedDict()    # path -> latest Job for it, oldest first
+
+    def submit(self, name, path):
+        """
+        The job analyzing `path` as it is on disk now, started if need be.
+        """
+        mtime = getmtime(path)
+        job = self.by_path.get(path)
+
+        if job is not None and job.mtime == mtime and job.status != FAILED:
+            self.by_path.move_to_end(path)
+            return job
+
+        # The job this replaces can't be reached through by_path any more, so
+        # evict() would never get to it. If it's still running it finishes
+        # into an object nothing refers to.
+        if job is not None:
+            del self.jobs[job.id]
+
+        job = Job('%d' % next(self.ids), name, path, mtime)
+        self.jobs[job.id] = job
+        self.by_path[path] = job
+        self.by_path.move_to_end(path)
+
+        asyncio.get_running_loop().create_task(self.run(job))
+        self.evict()
+
+        return job
+
+    async def run(self, job):
+        async with self.slots:
+            job.set_status(RUNNING)
+            pool = self.pool
+
+            try:
+                job.body, job.skeleton, job.blocks = \
+                    await asyncio.get_running_loop().run_in_executor(pool, analyze, job.path)
+                job.set_status(DONE)
+            except Exception as e:
+                # A worker died (e.g. killed for running out of memory), which
+                # breaks the whole pool. Start another one for the jobs after.
+                if isinstance(e, BrokenProcessPool):
+                    self.replace_pool(pool)
+
+                job.error = '%s: %s' % (type(e).__name__, e)
+                job.set_status(FAILED)
+
+        self.evict()
+
+    def replace_pool(self, broken):
+        # Every job that was in the broken pool ends up here, only replace it once.
+        if self.pool is broken:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+            broken.shutdown(wait=False)
+
+    def evict(self):
+        finished = [path for path, job in self.by_path.items() if job.finished.is_set()]
+
+        for path in finished[:max(0, len(finished) - self.max_finished)]:
+            job = self.by_path.pop(path)
+            del self.jobs[job.id]
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+def func_path(name):
+    # Only allow plain names so a request can't point us outside FUNCS_DIR.
+    if name is None or name != basename(name):
+        raise web.HTTPBadRequest()
+
+    path = join(FUNCS_DIR, '%s.json' % name)
+
+    if not os.path.exists(path):
+        raise web.HTTPNotFound()
+
+    return path
+
+
+def get_job(request):
+    job = request.app['jobs'].jobs.get(request.match_info['job_id'])
+
+    if job is None:
+        raise web.HTTPNotFound()
+
+    return job
+
+
+def result_response(job, part=lambda job: job.body):
+    """
+    `part` of the job's result if it's done, otherwise the job's status.
+    """
+    if job.status == DONE:
+        body = part(job)
+
+        if body is None:
+            raise web.HTTPNotFound()
+
+        return web.Response(text=body, content_type='application/json')
+
+    status = 500 if job.status == FAILED else 202
+    return web.json_response(job.tojson(), status=status)
+
+
+async def home(request):
+    return web.FileResponse(join(STATIC_DIR, 'index.html'))
+
+async def funcs(request):
+    names = [splitext(fname)[0] for fname in os.listdir(FUNCS_DIR) if fname.endswith('.json')]
+    return web.json_response(sorted(names))
+
+async def submit_job(request):
+    name = request.query.get('func', request.app['default_func'])
+    job = request.app['jobs'].submit(name, func_path(name))
+    return web.json_response(job.tojson(), status=202)
+
+async def job_status(request):
+    return web.json_response(get_job(request).tojson())
+
+async def job_result(request):
+    return result_response(get_job(request))
+
+async def job_skeleton(request):
+    return result_response(get_job(request), lambda job: job.skeleton)
+
+async def job_block(request):
+    addr = request.match_info['addr']
+    return result_response(get_job(request), lambda job: job.blocks.get(addr))
+
+async def job_events(request):
+    job = get_job(request)
+
+    resp = web.StreamResponse(headers={'Content-Type': 'text/event-stream',
+                                       'Cache-Control': 'no-cache'})
+    await resp.prepare(request)
+
+    while True:
+        changed = job.changed
+        await resp.write(('data: %s\n\n' % json.dumps(job.tojson())).encode('utf-8'))
+
+        if job.finished.is_set():
+            break
+
+        await changed.wait()
+
+    return resp
+
+async def finished_job(request):
+    name = request.query.get('func', request.app['default_func'])
+    job = request.app['jobs'].submit(name, func_path(name))
+
+    await job.finished.wait()
+    return job
+
+async def cfg(request):
+    return result_response(await finished_job(request))
+
+async def cfg_skeleton(request):
+    return result_response(await finished_job(request), lambda job: job.skeleton)
+
+async def cfg_block(request):
+    addr = request.query.get('addr')
+    return result_response(await finished_job(request), lambda job: job.blocks.get(addr))
+
+
+def make_app(default_func=None, workers=None):
+    app = web.Application()
+    app['default_func'] = default_func
+    app['jobs'] = JobManager(workers=workers)
+
+    app.router.add_get('/', home)
+    app.router.add_static('/js', join(STATIC_DIR, 'js'))
+    app.router.add_get('/funcs', funcs)
+    app.router.add_get('/cfg', cfg)
+    app.router.add_get('/cfg/skeleton', cfg_skeleton)
+    app.router.add_get('/cfg/block', cfg_block)
+    app.router.add_post('/jobs', submit_job)
+    app.router.add_get('/jobs/{job_id}', job_status)
+    app.router.add_get('/jobs/{job_id}/result', job_result)
+    app.router.add_get('/jobs/{job_id}/skeleton', job_skeleton)
+    app.router.add_get('/jobs/{job_id}/blocks/{addr}', job_block)
+    app.router.add_get('/jobs/{job_id}/events', job_events)
+
+    async def shutdown(app):
+        app['jobs'].shutdown()
+
+    app.on_cleanup.append(shutdown)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('func', nargs='?', default=None, help='function /cfg shows when none is requested')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='number of analysis processes')
+    parser.add_argument('-p', '--port', type=int, default=8080)
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.func, args.workers), port=args.port)
@@ -2,13 +2,136 @@ import sys
 sys.path.insert(0, '../deco')
 
 import json
-from flask import Flask, jsonify
-from os.path import join
+import os
+from collections import OrderedDict
+from flask import Flask, Response, abort, jsonify, request
+from os.path import basename, getmtime, join, splitext
+from threading import Lock
 
 from func import Function
+from loader import load_insns
+
+FUNCS_DIR = join('..', 'funcs')
+DEFAULT_FUNC = sys.argv[1] if len(sys.argv) > 1 else None
+
+# How many analyzed functions to keep around.
+CACHE_SIZE = 16
 
 app = Flask(__name__, static_url_path='/static')
 
+
+class Analysis(object):
+    """
+    An analyzed function and its responses, each serialized the first time
+    it's asked for.
+
+    Serializing runs in the function's AnalysisContext, so requests for the
+    same function take turns.
+    """
+    def __init__(self, mtime, func):
+        self.mtime = mtime
+        self.func = func
+        self.lock = Lock()
+
+        self.body = None
+        self.skeleton = None
+        self.blocks = {}    # block start -> response body
+
+    def cfg_body(self):
+        with self.lock:
+            if self.body is None:
+                self.body = json.dumps(self.func.tojson())
+
+            return self.body
+
+    def skeleton_body(self):
+        with self.lock:
+            if self.skeleton is None:
+                self.skeleton = json.dumps(self.func.skeleton_json())
+
+            return self.skeleton
+
+    def block_body(self, addr):
+        with self.lock:
+            if addr not in self.blocks:
+                blk_j = self.func.block_json(addr)
+
+                if blk_j is None:
+                    return None
+
+                self.blocks[addr] = json.dumps(blk_j)
+
+            return self.blocks[addr]
+
+
+class AnalysisCache(object):
+    """
+    LRU of analyzed functions and their serialized responses, keyed on the
+    export's path. An entry is dropped once the file's mtime changes.
+
+    Each path has its own lock around analyzing it, so concurrent requests
+    for a stale or missing entry analyze it once and the rest wait for that.
+    """
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()    # path -> Analysis
+        self.path_locks = {}            # path -> Lock held while analyzing it
+        self.lock = Lock()
+
+    def lookup(self, path, mtime):
+        with self.lock:
+            entry = self.entries.get(path)
+
+            if entry is not None and entry.mtime == mtime:
+                self.entries.move_to_end(path)
+                return entry
+
+            return None
+
+    def get(self, path):
+        mtime = getmtime(path)
+        entry = self.lookup(path, mtime)
+
+        if entry is not None:
+            return entry
+
+        with self.lock:
+            path_lock = self.path_locks.setdefault(path, Lock())
+
+        with path_lock:
+            # Someone else may have analyzed it while we waited.
+            entry = self.lookup(path, mtime)
+
+            if entry is not None:
+                return entry
+
+            entry = Analysis(mtime, Function.frominsns(load_insns(path)))
+
+            with self.lock:
+                self.entries[path] = entry
+                self.entries.move_to_end(path)
+
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+
+        return entry
+
+
+analysis_cache = AnalysisCache()
+
+
+def func_path(name):
+    # Only allow plain names so a request can't point us outside FUNCS_DIR.
+    if name is None or name != basename(name):
+        abort(400)
+
+    path = join(FUNCS_DIR, '%s.json' % name)
+
+    if not os.path.exists(path):
+        abort(404)
+
+    return path
+
 @app.route('/', methods=['GET'])
 def home():
     return app.send_static_file('index.html')
@@ -17,14 +140,30 @@ def home():
 def get_script(path):
     return app.send_static_file(join('js', path))
 
+@app.route('/funcs', methods=['GET'])
+def funcs():
+    names = [splitext(fname)[0] for fname in os.listdir(FUNCS_DIR) if fname.endswith('.json')]
+    return jsonify(sorted(names))
+
+def get_analysis():
+    return analysis_cache.get(func_path(request.args.get('func', DEFAULT_FUNC)))
+
 @app.route('/cfg', methods=['GET'])
 def cfg():
-    with open(join('..', 'funcs', '%s.json' % sys.argv[1])) as f:
-        func_j = json.load(f)
+    return Response(get_analysis().cfg_body(), mimetype='application/json')
+
+@app.route('/cfg/skeleton', methods=['GET'])
+def cfg_skeleton():
+    return Response(get_analysis().skeleton_body(), mimetype='application/json')
+
+@app.route('/cfg/block', methods=['GET'])
+def cfg_block():
+    body = get_analysis().block_body(request.args.get('addr'))
+
+    if body is None:
+        abort(404)
 
-    func = Function.fromjson(func_j)
-    func_j = func.tojson()
-    return jsonify(func_j)
+    return Response(body, mimetype='application/json')
 
 if __name__ == '__main__':
     app.run(port=8080)
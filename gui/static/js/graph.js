@@ -37,6 +37,46 @@ function drawNode(container, node) {
      .attr('x', 10)
      .attr('y', 20)
      .text(node.start)
+
+    g.append('text')
+     .attr('x', 10)
+     .attr('y', 40)
+     .text(node.size + ' ops')
+
+    // Bodies aren't part of the skeleton, fetch one when its block is clicked.
+    g.on('click', () => fetchBlock(node.start, showBlock))
+}
+
+function varnodeString(vnode) {
+    var s
+
+    if (vnode.space === 'const')
+        s = '0x' + vnode.offset.toString(16) + ':' + vnode.size
+    else if (vnode.space === 'unique')
+        s = 'U' + vnode.offset.toString(16) + ':' + vnode.size
+    else
+        s = '[' + vnode.space + ']0x' + vnode.offset.toString(16) + ':' + vnode.size
+
+    if (vnode.version !== undefined)
+        s += ' (' + vnode.version + ')'
+
+    return s
+}
+
+function pcopString(pcop) {
+    var rhs = pcop.mnemonic + ' ' + pcop.inputs.map(varnodeString).join(', ')
+
+    if (pcop.output !== undefined)
+        return varnodeString(pcop.output) + ' = ' + rhs
+
+    return rhs
+}
+
+function showBlock(blockJson) {
+    var lines = blockJson.pcode.map((pcop) => pcop.addr + ': ' + pcopString(pcop))
+
+    d3.select('#block-body')
+      .text(blockJson.start + '\n\n' + lines.join('\n'))
 }
 
 function drawEdges(container, node) {
@@ -81,6 +121,7 @@ function DFS(start, nodes, preFn = null, postFn = null) {
     }
 }
 
+// cfgJson is the skeleton: starts, sizes and edges of the blocks but not their bodies.
 function displayCFG(cfgJson) {
     var container = d3.select('#cfg-container')
 
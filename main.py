@@ -9,15 +9,25 @@ from functools import reduce
 from os.path import join
 
 from func import Function
+from instrument import Trace
+from loader import load_insns
 
 
 if __name__ == '__main__':
     func_name = sys.argv[1]
 
-    with open(join('funcs', '%s.json' % func_name)) as f:
-        func_j = json.load(f)
+    insns = load_insns(join('funcs', '%s.json' % func_name))
+
+    # main.py func [trace.json] to also time each pass.
+    if len(sys.argv) > 2:
+        with Trace() as trace:
+            func = Function.frominsns(insns)
+
+        trace.save(sys.argv[2])
+        print(trace.summary(), file=sys.stderr)
+    else:
+        func = Function.frominsns(insns)
 
-    func = Function.fromjson(func_j)
     #print(func.tojson())
     print(func)
     #func.draw()
@@ -0,0 +1,113 @@
+import sys
+sys.path.insert(0, '..')
+sys.path.insert(0, '../gui')
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from os.path import join
+
+from async_server import JobManager, DONE, FAILED, PENDING, RUNNING
+from synth import synthesize
+
+
+class TestJobManager(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.jobs = JobManager(workers=2, max_finished=2)
+
+    def tearDown(self):
+        self.jobs.shutdown()
+        self.tmp_dir.cleanup()
+
+    def export(self, name, insn_js):
+        path = join(self.tmp_dir.name, '%s.json' % name)
+
+        with open(path, 'w') as f:
+            json.dump(insn_js, f)
+
+        return path
+
+    async def run_job(self, name, path):
+        job = self.jobs.submit(name, path)
+        await job.finished.wait()
+        return job
+
+    async def test_submit(self):
+        job = await self.run_job('func', self.export('func', synthesize(20)))
+
+        self.assertEqual(job.status, DONE)
+        self.assertIn('cfg', json.loads(job.body))
+        self.assertEqual(set(json.loads(job.skeleton)['blocks']), set(job.blocks))
+        self.assertIs(self.jobs.jobs[job.id], job)
+
+    async def test_reuse(self):
+        path = self.export('func', synthesize(20))
+        job = self.jobs.submit('func', path)
+
+        self.assertIs(self.jobs.submit('func', path), job)
+        await job.finished.wait()
+        self.assertIs(self.jobs.submit('func', path), job)
+        self.assertEqual(len(self.jobs.jobs), 1)
+
+    async def test_replace(self):
+        path = self.export('func', synthesize(20))
+        job = await self.run_job('func', path)
+
+        os.utime(path, (0, 0))
+        new_job = await self.run_job('func', path)
+
+        self.assertIsNot(new_job, job)
+        self.assertEqual(list(self.jobs.jobs), [new_job.id])
+
+    async def test_retry_failed(self):
+        path = self.export('func', [{}])
+        job = await self.run_job('func', path)
+        self.assertEqual(job.status, FAILED)
+
+        new_job = await self.run_job('func', path)
+
+        self.assertIsNot(new_job, job)
+        self.assertEqual(list(self.jobs.jobs), [new_job.id])
+
+    async def test_broken_pool(self):
+        self.jobs.shutdown()
+        self.jobs = JobManager(workers=1)
+
+        # Opening a fifo blocks the worker until we kill it.
+        fifo = join(self.tmp_dir.name, 'stuck.json')
+        os.mkfifo(fifo)
+
+        stuck = self.jobs.submit('stuck', fifo)
+        queued = self.jobs.submit('func', self.export('func', synthesize(20)))
+
+        while stuck.status != RUNNING:
+            await asyncio.sleep(0.01)
+
+        queued_status = queued.status
+        broken = self.jobs.pool
+
+        for proc in list(broken._processes.values()):
+            proc.kill()
+
+        await stuck.finished.wait()
+        await queued.finished.wait()
+
+        self.assertEqual(queued_status, PENDING)
+        self.assertEqual(stuck.status, FAILED)
+        self.assertIn('BrokenProcessPool', stuck.error)
+        self.assertEqual(queued.status, DONE)
+        self.assertIsNot(self.jobs.pool, broken)
+
+    async def test_evict(self):
+        jobs = [await self.run_job('func_%d' % i, self.export('func_%d' % i, synthesize(10, seed=i))) \
+                for i in range(4)]
+
+        self.assertEqual(sorted(self.jobs.jobs), sorted(job.id for job in jobs[2:]))
+        self.assertEqual(list(self.jobs.by_path.values()), jobs[2:])
+
+
+if __name__ == '__main__':
+    unittest.main()
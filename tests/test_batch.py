@@ -0,0 +1,27 @@
+import sys
+sys.path.insert(0, '..')
+
+import os
+import tempfile
+import unittest
+from os.path import join
+
+from batch import find_jobs
+
+
+class TestBatch(unittest.TestCase):
+    def test_find_jobs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for fname in ['foo.json', 'foo.pcb', 'bar.json', 'notes.txt']:
+                open(join(tmp_dir, fname), 'w').close()
+
+            jobs = find_jobs(tmp_dir)
+
+        # foo.json and foo.pcb would both write foo's output otherwise.
+        self.assertEqual([name for name, _, _ in jobs], ['bar', 'foo.json', 'foo.pcb'])
+        self.assertEqual([os.path.basename(path) for _, path, _ in jobs], ['bar.json', 'foo.json', 'foo.pcb'])
+        self.assertFalse(any(in_archive for _, _, in_archive in jobs))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,9 +3,11 @@ sys.path.insert(0, '..')
 
 import unittest
 
-from blocks import decompose_into_blocks
+from blocks import InstructionBlock, PcodeBlock
+from cfg import CFG, BlockIndex, decompose_into_blocks
 from insn import Instruction
 from pcode import PcodeOp
+from utils import addr_to_str
 from varnode import Varnode
 
 insn_addr = 0
@@ -24,3 +26,87 @@ insn2 = Instruction(insn_addr, insn_len, [PcodeOp(insn_addr, 'COPY', [u0], r3)])
 
 insn_addr += insn_len
 insn3 = Instruction(insn_addr, insn_len, [PcodeOp(insn_addr, 'COPY', [u0], r1)])
+
+insn_addr += insn_len
+insn4 = Instruction(insn_addr, insn_len, [PcodeOp(insn_addr, 'RETURN', [r1])])
+
+
+class TestBlockIndex(unittest.TestCase):
+    def test_containing(self):
+        index = BlockIndex()
+        blk1 = InstructionBlock([insn1, insn2])
+        blk2 = InstructionBlock([insn3, insn4])
+        index.add(blk2)
+        index.add(blk1)
+
+        self.assertEqual(index.values(), [blk1, blk2])
+        self.assertIn(insn1.addr, index)
+        self.assertNotIn(insn2.addr, index)
+
+        self.assertIsNone(index.containing(insn1.addr))
+        self.assertIs(index.containing(insn2.addr), blk1)
+        self.assertIs(index.containing(insn4.addr), blk2)
+        self.assertIsNone(index.containing(insn4.addr + insn_len))
+
+    def test_split(self):
+        index = BlockIndex()
+        blk = InstructionBlock([insn1, insn2, insn3, insn4])
+        index.add(blk)
+
+        new_blk1, new_blk2 = index.split(blk, insn3.addr)
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.values(), [new_blk1, new_blk2])
+        self.assertEqual(new_blk1.insns, [insn1, insn2])
+        self.assertEqual(new_blk2.insns, [insn3, insn4])
+        self.assertIs(index.containing(insn2.addr), new_blk1)
+        self.assertIs(index[insn3.addr], new_blk2)
+
+    def test_decompose_into_blocks(self):
+        blks = decompose_into_blocks([insn1, insn2, insn3, insn4])
+
+        self.assertEqual(len(blks), 1)
+        self.assertEqual(blks[0].insns, [insn1, insn2, insn3, insn4])
+
+    def test_decompose_split_pending(self):
+        # 0x10 branches back into the middle of the first block while the
+        # CBRANCH's fallthrough is still pending, which then has to come
+        # after the split's second half.
+        flag = Varnode('register', 0x200, 1)
+        insns = [Instruction(0, insn_len, [PcodeOp(0, 'COPY', [r1], r2)]),
+                 Instruction(4, insn_len, [PcodeOp(4, 'CBRANCH', [Varnode('ram', 0x10, 8), flag])]),
+                 Instruction(8, insn_len, [PcodeOp(8, 'RETURN', [r1])]),
+                 Instruction(0x10, insn_len, [PcodeOp(0x10, 'BRANCH', [Varnode('ram', 4, 8)])])]
+        blks = {blk.start: blk for blk in decompose_into_blocks(insns)}
+
+        self.assertEqual(sorted(blks), [0, 4, 8, 0x10])
+        self.assertEqual(blks[8].predecessors, {blks[4]})
+        self.assertEqual(blks[4].predecessors, {blks[0], blks[0x10]})
+        self.assertEqual(blks[4].successors, {blks[8], blks[0x10]})
+
+
+class TestBlockJSON(unittest.TestCase):
+    def setUp(self):
+        self.blk1 = PcodeBlock([pcop.copy() for pcop in insn1.pcode + insn2.pcode])
+        self.blk2 = PcodeBlock([pcop.copy() for pcop in insn3.pcode + insn4.pcode], predecessor=self.blk1)
+        self.cfg = CFG([self.blk1, self.blk2])
+
+    def test_skeleton(self):
+        skeleton = self.cfg.skeleton_json()
+        full = self.cfg.tojson()
+
+        self.assertEqual(skeleton['entry'], full['entry'])
+        self.assertEqual(set(skeleton['blocks']), set(full['blocks']))
+
+        for addr, blk_j in skeleton['blocks'].items():
+            self.assertNotIn('pcode', blk_j)
+            self.assertEqual(blk_j['size'], len(full['blocks'][addr]['pcode']))
+
+            for key in ['start', 'successors', 'predecessors']:
+                self.assertEqual(blk_j[key], full['blocks'][addr][key])
+
+    def test_find_block(self):
+        addr = addr_to_str(self.blk2.start)
+
+        self.assertIs(self.cfg.find_block(addr), self.blk2)
+        self.assertIsNone(self.cfg.find_block(addr_to_str(insn4.addr + insn_len)))
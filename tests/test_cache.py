@@ -0,0 +1,98 @@
+import sys
+sys.path.insert(0, '..')
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import FunctionCache, analyze, content_key
+
+insns_j = [
+    {'addr': '0x0', 'length': 4, 'pcode': [
+        {'addr': 0.0, 'mnemonic': 'INT_ADD',
+         'inputs': [{'space': 'register', 'offset': '0x0', 'size': '0x8'},
+                    {'space': 'const', 'offset': '0x8', 'size': '0x8'}],
+         'output': {'space': 'register', 'offset': '0x0', 'size': '0x8'}}]},
+    {'addr': '0x4', 'length': 4, 'pcode': [
+        {'addr': 4.0, 'mnemonic': 'STORE',
+         'inputs': [{'space': 'const', 'offset': '0x1b1', 'size': '0x8'},
+                    {'space': 'register', 'offset': '0x8', 'size': '0x8'},
+                    {'space': 'register', 'offset': '0x0', 'size': '0x8'}]}]}
+]
+
+
+class TestFunctionCache(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def test_key(self):
+        self.assertEqual(content_key(b'abc'), content_key(b'abc'))
+        self.assertNotEqual(content_key(b'abc'), content_key(b'abd'))
+        self.assertNotEqual(content_key(b'abc', version=1), content_key(b'abc', version=2))
+
+    def test_roundtrip(self):
+        cache = FunctionCache(self.root)
+        key = content_key(b'abc')
+
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {'a': [1, 2]})
+
+        self.assertIn(key, cache)
+        self.assertEqual(cache.get(key), {'a': [1, 2]})
+        self.assertEqual(FunctionCache(self.root).size, cache.size)
+
+    def test_overwrite(self):
+        cache = FunctionCache(self.root)
+        key = content_key(b'abc')
+
+        for _ in range(3):
+            cache.put(key, {'a': [1, 2]})
+
+        self.assertEqual(FunctionCache(self.root).size, cache.size)
+
+    def test_concurrent_puts(self):
+        cache = FunctionCache(self.root)
+        key = content_key(b'abc')
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: cache.put(key, {'data': 'x' * 10000}), range(32)))
+
+        self.assertEqual(cache.get(key), {'data': 'x' * 10000})
+        self.assertEqual(os.listdir(os.path.dirname(cache.path(key))), [os.path.basename(cache.path(key))])
+
+    def test_lru_eviction(self):
+        cache = FunctionCache(self.root)
+        keys = [content_key(b'%d' % i) for i in range(4)]
+
+        for i, key in enumerate(keys[:3]):
+            cache.put(key, {'data': 'x' * 100})
+            os.utime(cache.path(key), (i, i))
+
+        # Touch the oldest so the second one is now least recently used.
+        cache.get(keys[0])
+
+        cache.max_bytes = cache.size
+        cache.put(keys[3], {'data': 'x' * 100})
+
+        self.assertIn(keys[0], cache)
+        self.assertNotIn(keys[1], cache)
+        self.assertIn(keys[3], cache)
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_analyze(self):
+        cache = FunctionCache(self.root)
+        data = json.dumps(insns_j).encode('utf-8')
+
+        record, hit = analyze(data, cache=cache)
+        self.assertFalse(hit)
+        self.assertEqual(record['blocks'], 1)
+
+        cached, hit = analyze(data, cache=cache)
+        self.assertTrue(hit)
+        self.assertEqual(cached, json.loads(json.dumps(record)))
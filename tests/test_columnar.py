@@ -0,0 +1,100 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+
+from cfg import CFG
+from columnar import PcodeColumns
+from context import AnalysisContext
+from liveness import Liveness
+from synth import synthesize
+
+
+def build(num_blocks, **kwargs):
+    with AnalysisContext():
+        cfg = CFG.fromjson(synthesize(num_blocks, **kwargs))
+
+    return cfg
+
+
+def views_match(test, views, pcode):
+    test.assertEqual(len(views), len(pcode))
+
+    for view, pcop in zip(views, pcode):
+        test.assertEqual(view.mnemonic, pcop.mnemonic)
+        test.assertEqual(view.addr, pcop.addr)
+        test.assertEqual(view.inputs, pcop.inputs)
+        test.assertIs(view.output, pcop.output)
+        test.assertEqual(view.is_call(), pcop.is_call())
+        test.assertEqual(view.branches(), pcop.branches())
+
+        for ignore_uniq in [False, True]:
+            test.assertEqual(view.read_varnodes(ignore_uniq), pcop.read_varnodes(ignore_uniq))
+            test.assertEqual(view.written_varnodes(ignore_uniq), pcop.written_varnodes(ignore_uniq))
+
+
+class TestColumnar(unittest.TestCase):
+    def test_views(self):
+        cfg = build(100, call_density=0.2)
+        columns = PcodeColumns.fromcfg(cfg)
+
+        self.assertEqual(len(columns), sum(len(blk.pcode) for blk in cfg.blocks))
+        self.assertGreater(columns.count('CALL'), 0)
+
+        for blk in cfg.blocks:
+            views_match(self, columns.views(blk), blk.pcode)
+
+    def test_block_sets(self):
+        cfg = build(200, call_density=0.2)
+        columns = PcodeColumns.fromcfg(cfg)
+
+        for blk in cfg.blocks:
+            for ignore_uniq in [False, True]:
+                for ignore_pc in [False, True]:
+                    self.assertEqual(columns.written_varnodes(blk, ignore_uniq, ignore_pc),
+                                     blk.written_varnodes(ignore_uniq, ignore_pc))
+                    self.assertEqual(columns.upward_exposed_varnodes(blk, ignore_uniq, ignore_pc),
+                                     blk.upward_exposed_varnodes(ignore_uniq, ignore_pc))
+
+    def test_phis(self):
+        cfg = build(200)
+        cfg.insert_phis()
+        columns = PcodeColumns.fromcfg(cfg)
+
+        for blk in cfg.blocks:
+            phis = columns.phis(blk)
+            views_match(self, phis, blk.phis())
+            self.assertEqual([phi.preds for phi in phis], [phi.preds for phi in blk.phis()])
+
+    def test_liveness(self):
+        cfg = build(200)
+        cfg.insert_phis()
+
+        liveness = Liveness(cfg)
+        from_columns = Liveness(cfg, columns=PcodeColumns.fromcfg(cfg))
+
+        for blk in cfg.blocks:
+            self.assertEqual(from_columns.live_in_varnodes(blk), liveness.live_in_varnodes(blk))
+            self.assertEqual(from_columns.live_out_varnodes(blk), liveness.live_out_varnodes(blk))
+
+    def test_insert_phis(self):
+        # The phis placed from the columns agree with the sets the ops give.
+        cfg = build(200)
+        before = Liveness(cfg)
+        written = set().union(*[blk.written_varnodes(ignore_uniq=True) for blk in cfg.blocks])
+        exposed = set().union(*[blk.upward_exposed_varnodes(ignore_uniq=True) for blk in cfg.blocks])
+
+        self.assertGreater(cfg.insert_phis(), 0)
+
+        for blk in cfg.blocks:
+            for phi in blk.phis():
+                self.assertIn(phi.output, written & exposed)
+                self.assertTrue(before.is_live_in(phi.output, blk))
+
+    def test_modes(self):
+        num_phis = [build(200).insert_phis(mode=mode) for mode in ['minimal', 'semi-pruned', 'pruned']]
+        self.assertEqual(num_phis, sorted(num_phis, reverse=True))
+        self.assertGreater(num_phis[0], num_phis[2])
+
+if __name__ == '__main__':
+    unittest.main()
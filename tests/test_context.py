@@ -0,0 +1,101 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from blocks import PcodeBlock
+from context import AnalysisContext, current_context
+from func import Function
+from node import Node
+from pcode import PcodeOp
+from synth import synthesize
+from varnode import Varnode, SSAVarnode
+
+reg_size = 8
+
+r1 = Varnode('register', 0, reg_size)
+
+
+def analyze(insn_js):
+    func = Function.fromjson(insn_js)
+    return [[str(pcop) for pcop in blk.pcode] for blk in func.cfg.blocks]
+
+
+class TestAnalysisContext(unittest.TestCase):
+    def test_nesting(self):
+        outer = current_context()
+
+        with AnalysisContext() as ctx1:
+            self.assertIs(current_context(), ctx1)
+
+            with AnalysisContext() as ctx2:
+                self.assertIs(current_context(), ctx2)
+
+            self.assertIs(current_context(), ctx1)
+
+        self.assertIs(current_context(), outer)
+
+    def test_independent_versions(self):
+        with AnalysisContext() as ctx1:
+            v1 = SSAVarnode('register', 0, reg_size, None)
+            v2 = SSAVarnode('register', 0, reg_size, None)
+
+        with AnalysisContext() as ctx2:
+            v3 = SSAVarnode('register', 0, reg_size, None)
+            self.assertIs(SSAVarnode.get_latest(r1), v3)
+
+        self.assertEqual((v1.version, v2.version), (0, 1))
+        self.assertEqual(v3.version, 0)
+        self.assertEqual(ctx1.rename_stacks[r1], [v1, v2])
+        self.assertEqual(ctx2.rename_stacks[r1], [v3])
+
+    def test_node_names(self):
+        with AnalysisContext():
+            names1 = [Node().name for _ in range(2)]
+
+        with AnalysisContext():
+            names2 = [Node().name for _ in range(2)]
+
+        self.assertEqual(names1, ['node_0', 'node_1'])
+        self.assertEqual(names1, names2)
+
+    def test_nodes_from_other_contexts(self):
+        # Same names, different nodes.
+        with AnalysisContext():
+            blk1 = PcodeBlock([PcodeOp(0, 'COPY', [r1], r1)])
+
+        with AnalysisContext():
+            blk2 = PcodeBlock([PcodeOp(4, 'COPY', [r1], r1)])
+
+        self.assertEqual(blk1.name, blk2.name)
+        self.assertNotEqual(blk1, blk2)
+        self.assertEqual(len({blk1, blk2}), 2)
+
+        blk1.add_predecessor(blk2)
+        self.assertEqual(blk2.successors, {blk1})
+        self.assertEqual(blk1.predecessors, {blk2})
+
+        # A block made outside the function's context still gets its own edge.
+        func = Function.fromjson(synthesize(10, seed=0))
+
+        with AnalysisContext():
+            new_blk = PcodeBlock([PcodeOp(0x10000, 'COPY', [r1], r1)])
+
+        with func.ctx:
+            func.cfg.add_block(new_blk)
+            func.cfg.add_edge(func.cfg.entry, new_blk)
+
+        self.assertIn(new_blk, func.cfg.entry.successors)
+        self.assertEqual(new_blk.predecessors, {func.cfg.entry})
+        self.assertIn(new_blk, func.cfg.blocks)
+
+    def test_threads(self):
+        # Concurrent analyses each see only their own context.
+        funcs = [synthesize(100, seed=seed) for seed in range(8)]
+        expected = [analyze(insn_js) for insn_js in funcs]
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(analyze, funcs * 3))
+
+        self.assertEqual(results, expected * 3)
@@ -0,0 +1,94 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+
+from blocks import PcodeBlock
+from cfg import CFG
+from dataflow_solver import DataflowAnalysis, FORWARD
+from pcode import PcodeOp
+from reaching_defs import ReachingDefinitions
+from varnode import Varnode
+
+reg_size = 4
+
+r1 = Varnode('register', 0, reg_size)
+r2 = Varnode('register', reg_size, reg_size)
+space = Varnode('const', 0x1b1, reg_size)
+
+
+def make_loop():
+    """
+    Entry -> header <-> body, header -> exit. r1 is written in the entry
+    and the body, r2 only in the entry.
+    """
+    f_block1 = PcodeBlock([PcodeOp(0, 'COPY', [space], r1),
+                           PcodeOp(1, 'COPY', [space], r2)], name='f_block_1')
+    f_block2 = PcodeBlock([PcodeOp(4, 'STORE', [space, r1, r2])], predecessor=f_block1, name='f_block_2')
+    f_block3 = PcodeBlock([PcodeOp(8, 'INT_ADD', [r1, r2], r1)], predecessor=f_block2, name='f_block_3')
+    f_block4 = PcodeBlock([PcodeOp(12, 'STORE', [space, r1, r1])], predecessor=f_block2, name='f_block_4')
+    f_block2.add_predecessor(f_block3)
+
+    blocks = [f_block1, f_block2, f_block3, f_block4]
+    return CFG(blocks), blocks
+
+
+class Dominators(DataflowAnalysis):
+    """
+    The classic must-analysis: a block's dominators are itself plus the
+    blocks dominating all of its predecessors.
+    """
+    direction = FORWARD
+
+    def top(self):
+        return (1 << len(self.cfg.blocks)) - 1
+
+    def boundary(self):
+        return 0
+
+    def meet(self, a, b):
+        return a & b
+
+    def transfer(self, blk, doms):
+        return doms | (1 << blk.idx)
+
+
+class TestDataflow(unittest.TestCase):
+    def test_dominators(self):
+        cfg, blocks = make_loop()
+        doms = Dominators(cfg)
+
+        for blk in blocks:
+            expected = 0
+            idx = blk.idx
+
+            while True:
+                expected |= 1 << idx
+
+                if cfg.idoms[idx] == idx:
+                    break
+
+                idx = cfg.idoms[idx]
+
+            self.assertEqual(doms.block_out(blk), expected, blk.name)
+
+    def test_reaching_definitions(self):
+        cfg, (entry, header, body, exit_blk) = make_loop()
+        reaching = ReachingDefinitions(cfg)
+
+        r1_defs = reaching.reaching_in(header, r1)
+        self.assertEqual(sorted(pcop.addr for pcop, _ in r1_defs), [0, 8])
+        self.assertEqual([pcop.addr for pcop, _ in reaching.reaching_in(exit_blk, r2)], [1])
+        self.assertEqual(reaching.reaching_in(entry), [])
+
+    def test_cached(self):
+        cfg, (entry, header, body, exit_blk) = make_loop()
+        reaching = ReachingDefinitions(cfg)
+
+        self.assertIsNone(reaching.ins)
+        bits = reaching.block_in(header)
+        self.assertIs(reaching.block_in(header), bits)
+
+        reaching.invalidate()
+        self.assertIsNone(reaching.ins)
+        self.assertEqual(reaching.block_in(header), bits)
@@ -0,0 +1,86 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+
+from blocks import PcodeBlock
+from cfg import CFG
+from context import AnalysisContext
+from pcode import PcodeOp
+from varnode import Varnode
+
+reg_size = 8
+
+rsp = Varnode('register', 0x20, reg_size)
+r1 = Varnode('register', 0, reg_size)
+r2 = Varnode('register', reg_size, reg_size)
+u1 = Varnode('unique', 0x100, reg_size)
+u2 = Varnode('unique', 0x200, reg_size)
+space = Varnode('const', 0x1b1, reg_size)
+eight = Varnode('const', 8, reg_size)
+ram = Varnode('ram', 0x1000, reg_size)
+
+
+def make_diamond():
+    """
+    The entry and both sides compute rsp + 8 and the join stores it again.
+    Only the recomputations dominated by the entry's copy can be merged
+    into it, the sides don't dominate each other or the join.
+    """
+    g_block1 = PcodeBlock([PcodeOp(0, 'INT_ADD', [rsp, eight], u1),
+                           PcodeOp(1, 'LOAD', [space, u1], r1)], name='g_block_1')
+    g_block2 = PcodeBlock([PcodeOp(4, 'INT_ADD', [eight, rsp], u2),
+                           PcodeOp(5, 'STORE', [space, u2, r1])], predecessor=g_block1, name='g_block_2')
+    g_block3 = PcodeBlock([PcodeOp(8, 'INT_ADD', [rsp, eight], u2),
+                           PcodeOp(9, 'INT_ADD', [u2, eight], u1),
+                           PcodeOp(10, 'STORE', [space, u1, r1])], predecessor=g_block1, name='g_block_3')
+    g_block4 = PcodeBlock([PcodeOp(12, 'INT_ADD', [rsp, eight], u2),
+                           PcodeOp(13, 'LOAD', [space, u2], r2),
+                           PcodeOp(14, 'STORE', [space, u2, r2])], predecessor=g_block2, name='g_block_4')
+    g_block4.add_predecessor(g_block3)
+
+    return CFG([g_block1, g_block2, g_block3, g_block4])
+
+
+class TestGVN(unittest.TestCase):
+    def test_merges_dominated(self):
+        cfg = make_diamond()
+
+        with AnalysisContext():
+            cfg.convert_to_ssa()
+            self.assertEqual(cfg.number_values(), 3)
+            cfg.simplify()
+
+        entry_sum = cfg.entry.pcode[0].output
+        adds = [pcop for blk in cfg.blocks for pcop in blk.pcode if pcop.mnemonic == 'INT_ADD']
+
+        # Only the entry's rsp + 8 and g_block_3's (rsp + 8) + 8 are left.
+        self.assertEqual(len(adds), 2)
+
+        for blk in cfg.blocks:
+            if blk.name == 'g_block_3':
+                continue
+
+            for pcop in blk.pcode:
+                if pcop.mnemonic in ['LOAD', 'STORE']:
+                    self.assertIs(pcop.inputs[1], entry_sum)
+
+    def test_keeps_loads(self):
+        cfg = CFG([PcodeBlock([PcodeOp(0, 'LOAD', [space, rsp], r1),
+                               PcodeOp(1, 'LOAD', [space, rsp], r2),
+                               PcodeOp(2, 'STORE', [space, r1, r2])], name='g_block_5')])
+
+        with AnalysisContext():
+            cfg.convert_to_ssa()
+            self.assertEqual(cfg.number_values(), 0)
+
+    def test_keeps_ram_reads(self):
+        # The STORE in between may write [ram]0x1000.
+        cfg = CFG([PcodeBlock([PcodeOp(0, 'INT_ADD', [ram, eight], r1),
+                               PcodeOp(1, 'STORE', [space, rsp, r1]),
+                               PcodeOp(2, 'INT_ADD', [ram, eight], r2),
+                               PcodeOp(3, 'STORE', [space, r1, r2])], name='g_block_6')])
+
+        with AnalysisContext():
+            cfg.convert_to_ssa()
+            self.assertEqual(cfg.number_values(), 0)
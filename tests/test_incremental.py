@@ -0,0 +1,165 @@
+import sys
+sys.path.insert(0, '..')
+
+import random
+import unittest
+
+from blocks import PcodeBlock
+from cfg import CFG
+from context import AnalysisContext
+from func import Function
+from pcode import PcodeOp
+from varnode import Varnode
+
+reg_size = 4
+
+r1 = Varnode('register', 0, reg_size)
+r2 = Varnode('register', reg_size, reg_size)
+r3 = Varnode('register', reg_size * 2, reg_size)
+flag = Varnode('register', 0x200, 1)
+ram = Varnode('ram', 0x1000, reg_size)
+space = Varnode('const', 0x1b1, reg_size)
+
+
+def const(value, size=reg_size):
+    return Varnode('const', value, size)
+
+
+def make_diamond():
+    """
+    The entry branches on a loaded value to i_block_3 or falls through to
+    i_block_2, each writes something different to r3 which the join stores.
+    r2 is set (and stored) on the entry and on i_block_2 but never read after
+    that, so with pruned phis the join doesn't get a phi for it. i_block_5
+    follows the join.
+    """
+    i_block1 = PcodeBlock([PcodeOp(0, 'LOAD', [space, ram], r1),
+                           PcodeOp(1, 'LOAD', [space, r1], r2),
+                           PcodeOp(2, 'STORE', [space, ram, r2]),
+                           PcodeOp(3, 'INT_EQUAL', [r1, const(0)], flag),
+                           PcodeOp(4, 'CBRANCH', [Varnode('ram', 0x10, 8), flag])], name='i_block_1')
+    i_block2 = PcodeBlock([PcodeOp(8, 'COPY', [const(2)], r3),
+                           PcodeOp(9, 'COPY', [const(2)], r2),
+                           PcodeOp(10, 'STORE', [space, ram, r2]),
+                           PcodeOp(11, 'BRANCH', [Varnode('ram', 0x20, 8)])], predecessor=i_block1, name='i_block_2')
+    i_block3 = PcodeBlock([PcodeOp(0x10, 'INT_ADD', [r1, const(1)], r3)], predecessor=i_block1, name='i_block_3')
+    i_block4 = PcodeBlock([PcodeOp(0x20, 'STORE', [space, ram, r3])], predecessor=i_block2, name='i_block_4')
+    i_block4.add_predecessor(i_block3)
+    i_block5 = PcodeBlock([PcodeOp(0x28, 'STORE', [space, ram, r1])], predecessor=i_block4, name='i_block_5')
+
+    return CFG([i_block1, i_block2, i_block3, i_block4, i_block5])
+
+
+def analyzed(cfg):
+    return Function(cfg, AnalysisContext())
+
+
+def block(cfg, name):
+    return [blk for blk in cfg.blocks if blk.name == name][0]
+
+
+def stored(cfg, name):
+    return block(cfg, name).pcode[-1].inputs[2]
+
+
+def random_cfg(rng, num_blocks):
+    blocks = [PcodeBlock([PcodeOp(i * 4, 'INT_ADD', [r1, const(1)], r1)], name='r_block_%d' % i) \
+              for i in range(num_blocks)]
+
+    for i in range(1, num_blocks):
+        blocks[i].add_predecessor(blocks[rng.randrange(i)])
+
+    for _ in range(num_blocks):
+        blocks[rng.randrange(1, num_blocks)].add_predecessor(blocks[rng.randrange(num_blocks)])
+
+    return CFG(blocks)
+
+
+def dominance(cfg):
+    reachable = [blk for blk in cfg.blocks if cfg.is_reachable(blk)]
+
+    return ({blk.name: cfg.idom(blk).name for blk in reachable},
+            {blk.name: cfg.dom_depth[blk.idx] for blk in reachable},
+            {blk.name: sorted(df.name for df in cfg.frontier(blk)) for blk in reachable})
+
+
+class TestIncremental(unittest.TestCase):
+    def test_dominators_match_recompute(self):
+        rng = random.Random(0)
+
+        for _ in range(30):
+            cfg = random_cfg(rng, rng.randint(2, 10))
+
+            with AnalysisContext():
+                cfg.convert_to_ssa()
+
+                for _ in range(8):
+                    blocks = [blk for blk in cfg.blocks if cfg.is_reachable(blk)]
+                    src = rng.choice(blocks)
+                    dst = rng.choice(blocks)
+
+                    if dst is cfg.entry:
+                        continue
+
+                    if dst in src.successors:
+                        cfg.remove_edge(src, dst)
+                    else:
+                        cfg.add_edge(src, dst)
+
+                    updated = dominance(cfg)
+                    cfg.update_dominators()
+                    self.assertEqual(updated, dominance(cfg))
+
+    def test_edit_block(self):
+        func = analyzed(make_diamond())
+        cfg = func.cfg
+        i_block2 = block(cfg, 'i_block_2')
+
+        cfg.replace_pcode(i_block2, [PcodeOp(8, 'COPY', [const(7)], r3),
+                                     PcodeOp(9, 'COPY', [const(2)], r2),
+                                     PcodeOp(10, 'STORE', [space, ram, r2]),
+                                     PcodeOp(11, 'BRANCH', [Varnode('ram', 0x20, 8)])])
+        self.assertEqual(func.reanalyze(), 1)
+
+        phi = stored(cfg, 'i_block_4').defn
+        self.assertTrue(phi.is_phi())
+
+        # Copies into phis are kept, like in the full pipeline.
+        copy = phi.inputs[phi.preds.index(i_block2)].defn
+        self.assertEqual(copy.mnemonic, 'COPY')
+        self.assertEqual(copy.inputs[0], const(7))
+        self.assertEqual(i_block2.pcode[-2].inputs[2], const(2))
+
+    def test_newly_live_across_join(self):
+        func = analyzed(make_diamond())
+        cfg = func.cfg
+        i_block4 = block(cfg, 'i_block_4')
+        self.assertEqual(i_block4.num_phis(), 1)
+
+        # Reading r2 after the join needs the phi there that was pruned,
+        # so the join is rebuilt too.
+        cfg.replace_pcode(block(cfg, 'i_block_5'), [PcodeOp(0x28, 'STORE', [space, ram, r2])])
+        self.assertEqual(func.reanalyze(), 2)
+        self.assertEqual(i_block4.num_phis(), 2)
+
+        phi = stored(cfg, 'i_block_5').defn
+        self.assertIn(phi, i_block4.phis())
+        self.assertEqual(phi.inputs[phi.preds.index(block(cfg, 'i_block_2'))], const(2))
+        self.assertEqual(phi.inputs[phi.preds.index(block(cfg, 'i_block_3'))].defn.mnemonic, 'LOAD')
+
+    def test_remove_edge(self):
+        func = analyzed(make_diamond())
+        cfg = func.cfg
+
+        with func.ctx:
+            cfg.remove_edge(cfg.entry, block(cfg, 'i_block_3'))
+
+        func.reanalyze()
+
+        self.assertEqual(sorted(blk.name for blk in cfg.blocks), ['i_block_1', 'i_block_2', 'i_block_4', 'i_block_5'])
+        self.assertEqual(block(cfg, 'i_block_4').num_phis(), 0)
+        self.assertEqual(stored(cfg, 'i_block_4'), const(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
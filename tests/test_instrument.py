@@ -0,0 +1,93 @@
+import sys
+sys.path.insert(0, '..')
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from func import Function
+from instrument import Trace, instrumented
+from synth import synthesize
+
+
+@instrumented('outer')
+def outer(n):
+    return inner(n) + 1
+
+
+@instrumented('inner')
+def inner(n):
+    return sum(range(n))
+
+
+class TestInstrument(unittest.TestCase):
+    def test_disabled(self):
+        self.assertEqual(outer(10), 46)
+        self.assertEqual(len(Trace.STACK.get()), 0)
+
+    def test_nesting(self):
+        with Trace() as trace:
+            outer(100000)
+
+        self.assertEqual([event['name'] for event in trace.events], ['inner', 'outer'])
+
+        inner_event, outer_event = trace.events
+        self.assertEqual((inner_event['depth'], outer_event['depth']), (1, 0))
+        self.assertLessEqual(outer_event['start'], inner_event['start'])
+        self.assertGreaterEqual(outer_event['seconds'], inner_event['seconds'])
+        self.assertAlmostEqual(outer_event['self_seconds'], outer_event['seconds'] - inner_event['seconds'])
+
+    def test_pipeline(self):
+        with Trace() as trace:
+            Function.fromjson(synthesize(50))
+
+        passes = trace.passes()
+
+        for name in ['decompose_into_blocks', 'insert_phis', 'convert_to_ssa', 'simplify']:
+            self.assertIn(name, passes)
+
+        self.assertEqual(passes['insert_phis']['before']['phis'], 0)
+        self.assertGreater(passes['insert_phis']['after']['phis'], 0)
+        self.assertLessEqual(passes['simplify']['after']['ops'], passes['simplify']['before']['ops'])
+        self.assertIn('insert_phis', trace.summary())
+
+    def test_threads(self):
+        # A pass run on another thread isn't recorded in this one's trace.
+        thread = threading.Thread(target=outer, args=(10,))
+
+        with Trace() as trace:
+            inner(10)
+            thread.start()
+            thread.join()
+
+        self.assertEqual([event['name'] for event in trace.events], ['inner'])
+
+    def test_memory(self):
+        with Trace(memory=True) as trace:
+            outer(1000)
+
+        self.assertTrue(all(event['peak_bytes'] >= 0 for event in trace.events))
+
+    def test_save(self):
+        with Trace() as trace:
+            outer(10)
+
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+
+        try:
+            trace.save(path)
+
+            with open(path) as f:
+                events = json.load(f)['traceEvents']
+        finally:
+            os.remove(path)
+
+        self.assertEqual([event['name'] for event in events], ['outer', 'inner'])
+        self.assertTrue(all(event['ph'] == 'X' for event in events))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+
+from blocks import PcodeBlock
+from cfg import CFG
+from context import AnalysisContext
+from liveness import Liveness, VarnodeIndex
+from pcode import PcodeOp
+from varnode import Varnode
+
+reg_size = 4
+
+r1 = Varnode('register', 0, reg_size)
+r2 = Varnode('register', reg_size, reg_size)
+r3 = Varnode('register', reg_size * 2, reg_size)
+u1 = Varnode('unique', 0x100, reg_size)
+space = Varnode('const', 0x1b1, reg_size)
+
+
+def make_diamond():
+    """
+    r2 is read in the join, written on one side only. r3 is written on both
+    sides and read in the join. r1 is only read on the left.
+    """
+    l_block1 = PcodeBlock([PcodeOp(0, 'LOAD', [space, r1], u1)], name='l_block_1')
+    l_block2 = PcodeBlock([PcodeOp(4, 'COPY', [r1], r3)], predecessor=l_block1, name='l_block_2')
+    l_block3 = PcodeBlock([PcodeOp(8, 'COPY', [u1], r3),
+                           PcodeOp(9, 'COPY', [u1], r2)], predecessor=l_block1, name='l_block_3')
+    l_block4 = PcodeBlock([PcodeOp(12, 'STORE', [space, r2, r3])], predecessor=l_block2, name='l_block_4')
+    l_block4.add_predecessor(l_block3)
+
+    blocks = [l_block1, l_block2, l_block3, l_block4]
+    return CFG(blocks), blocks
+
+
+class TestVarnodeIndex(unittest.TestCase):
+    def test_bits(self):
+        index = VarnodeIndex()
+        bits = index.bits([r1, r3])
+
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.varnodes(bits), {r1, r3})
+        self.assertEqual(index.bit(r2), 0)
+        self.assertEqual(index.bits([r3]), index.bit(r3))
+
+
+class TestLiveness(unittest.TestCase):
+    def test_diamond(self):
+        cfg, (entry, left, right, join) = make_diamond()
+        liveness = Liveness(cfg)
+
+        self.assertEqual(liveness.live_in_varnodes(join), {r2, r3})
+        self.assertEqual(liveness.live_in_varnodes(left), {r1, r2})
+        self.assertEqual(liveness.live_in_varnodes(right), set())
+        self.assertEqual(liveness.live_in_varnodes(entry), {r1, r2})
+        self.assertEqual(liveness.live_out_varnodes(entry), {r1, r2})
+        self.assertTrue(liveness.is_live_out(r3, right))
+        self.assertFalse(liveness.is_live_in(r3, right))
+
+    def test_unique(self):
+        cfg, (entry, left, right, join) = make_diamond()
+
+        self.assertFalse(Liveness(cfg).is_live_out(u1, entry))
+        self.assertTrue(Liveness(cfg, ignore_uniq=False).is_live_out(u1, entry))
+
+    def test_ssa_phis(self):
+        cfg, (entry, left, right, join) = make_diamond()
+
+        with AnalysisContext():
+            cfg.convert_to_ssa()
+
+        phi = join.phis()[0]
+        liveness = Liveness(cfg)
+
+        for pred, inpt in zip(phi.preds, phi.inputs):
+            self.assertTrue(liveness.is_live_out(inpt, pred))
+            self.assertFalse(liveness.is_live_in(inpt, join))
+
+        self.assertFalse(liveness.is_live_in(phi.output, join))
@@ -0,0 +1,214 @@
+import sys
+sys.path.insert(0, '..')
+
+import io
+import json
+import os
+import tempfile
+import unittest
+from os.path import join
+
+from archive import ArchiveWriter, FunctionArchive
+
+from insn import Instruction
+from loader import iter_json_array, iter_insns, iter_binary_insns
+from pcode_bin import write_pcode
+
+insn_js = [
+    {
+        'addr': '0x10',
+        'length': 4,
+        'pcode': [
+            {
+                'addr': 16.0,
+                'mnemonic': 'INT_ADD',
+                'inputs': [
+                    {'space': 'register', 'offset': '0x0', 'size': '0x8'},
+                    {'space': 'const', 'offset': '-0x8', 'size': '0x8'}
+                ],
+                'output': {'space': 'unique', 'offset': '0x100', 'size': '0x8'}
+            },
+            {
+                'addr': 18.0,
+                'mnemonic': 'COPY',
+                'inputs': [{'space': 'unique', 'offset': '0x100', 'size': '0x8'}],
+                'output': {'space': 'register', 'offset': '0x20', 'size': '0x8'}
+            }
+        ]
+    },
+    {
+        'addr': '0x14',
+        'length': 1,
+        'pcode': [
+            {
+                'addr': 20.0,
+                'mnemonic': 'RETURN',
+                'inputs': [{'space': 'register', 'offset': '0x288', 'size': '0x8'}]
+            }
+        ]
+    }
+]
+
+insn_json_str = json.dumps(insn_js, indent=True)
+
+
+class TestLoader(unittest.TestCase):
+    def test_iter_json_array(self):
+        for chunk_size in [1, 7, 64, len(insn_json_str)]:
+            elems = list(iter_json_array(io.StringIO(insn_json_str), chunk_size=chunk_size))
+            self.assertEqual(elems, insn_js)
+
+    def test_iter_json_array_empty(self):
+        self.assertEqual(list(iter_json_array(io.StringIO(' [ ] '))), [])
+
+    def test_iter_json_array_truncated(self):
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO(insn_json_str[:-10]), chunk_size=16))
+
+    def test_iter_json_array_invalid(self):
+        for bad in ['[1,,2]', '[,1]', '[1,]', '[1 2]']:
+            with self.assertRaises(ValueError):
+                list(iter_json_array(io.StringIO(bad), chunk_size=2))
+
+    def test_iter_json_array_large_element(self):
+        # An element much bigger than a chunk takes a logarithmic number of reads.
+        f = io.StringIO(json.dumps([list(range(100000)), 1]))
+        reads = []
+        read = f.read
+        f.read = lambda size: reads.append(size) or read(size)
+
+        elems = list(iter_json_array(f, chunk_size=64))
+
+        self.assertEqual(elems, [list(range(100000)), 1])
+        self.assertLess(len(reads), 30)
+
+    def test_iter_insns(self):
+        streamed = list(iter_insns(io.StringIO(insn_json_str)))
+        loaded = [insn for ij in insn_js for insn in Instruction.fromjson(ij)]
+
+        self.assertEqual([str(insn) for insn in streamed], [str(insn) for insn in loaded])
+        self.assertEqual([insn.length for insn in streamed], [insn.length for insn in loaded])
+
+    def test_binary_roundtrip(self):
+        f = io.BytesIO()
+        write_pcode(f, insn_js)
+
+        from_bin = list(iter_binary_insns(f.getvalue()))
+        from_json = list(iter_insns(io.StringIO(insn_json_str)))
+
+        self.assertEqual([str(insn) for insn in from_bin], [str(insn) for insn in from_json])
+        self.assertEqual([insn.addr for insn in from_bin], [insn.addr for insn in from_json])
+        self.assertEqual([insn.length for insn in from_bin], [insn.length for insn in from_json])
+        self.assertEqual([type(pcop) for insn in from_bin for pcop in insn.pcode],
+                         [type(pcop) for insn in from_json for pcop in insn.pcode])
+
+    def test_no_op_addrs(self):
+        # Older exports only have the instruction's address.
+        old_js = [dict(ij, pcode=[{key: value for key, value in pj.items() if key != 'addr'} \
+                                  for pj in ij['pcode']]) for ij in insn_js]
+
+        f = io.BytesIO()
+        write_pcode(f, old_js)
+
+        from_json = list(iter_insns(io.StringIO(json.dumps(old_js))))
+        from_binary = list(iter_binary_insns(f.getvalue()))
+
+        self.assertEqual([pcop.addr for insn in from_json for pcop in insn.pcode], [16.0, 18.0, 20.0])
+        self.assertEqual([str(insn) for insn in from_binary], [str(insn) for insn in from_json])
+
+    def test_binary_bad_magic(self):
+        with self.assertRaises(ValueError):
+            list(iter_binary_insns(b'JUNK' + bytes(64)))
+
+    def test_archive(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = join(tmp_dir, 'funcs.pca')
+
+            with ArchiveWriter(path) as writer:
+                writer.add_json('func_a', insn_js)
+                writer.add_json('func_b', insn_js[1:])
+
+            with FunctionArchive(path) as archive:
+                self.assertEqual(len(archive), 2)
+                self.assertEqual(sorted(archive.names()), ['func_a', 'func_b'])
+                self.assertEqual(archive.name_at(0x10), 'func_a')
+                self.assertEqual(archive.name_at(0x14), 'func_b')
+
+                from_archive = [str(insn) for insn in archive.insns_at(0x10)]
+                from_json = [str(insn) for insn in iter_insns(io.StringIO(insn_json_str))]
+                self.assertEqual(from_archive, from_json)
+
+                self.assertEqual(len(list(archive.insns('func_b'))), 1)
+
+    def test_archive_json_and_pcb(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with open(join(tmp_dir, 'func_a.json'), 'w') as f:
+                json.dump(insn_js[1:], f)
+
+            with open(join(tmp_dir, 'func_a.pcb'), 'wb') as f:
+                write_pcode(f, insn_js)
+
+            with open(join(tmp_dir, 'func_b.json'), 'w') as f:
+                json.dump(insn_js, f)
+
+            path = join(tmp_dir, 'funcs.pca')
+            paths = [join(tmp_dir, fname) for fname in ['func_a.json', 'func_b.json', 'func_a.pcb']]
+
+            with ArchiveWriter(path) as writer:
+                writer.add_files(paths)
+
+            with FunctionArchive(path) as archive:
+                self.assertEqual(sorted(archive.names()), ['func_a', 'func_b'])
+                self.assertEqual(len(list(archive.insns('func_a'))), 2)
+
+    def test_archive_partial_read(self):
+        # Generators left part way (or not started) don't keep the mmap exported.
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = join(tmp_dir, 'funcs.pca')
+
+            with ArchiveWriter(path) as writer:
+                writer.add_json('func_a', insn_js)
+
+            with FunctionArchive(path) as archive:
+                started = archive.insns('func_a')
+                next(started)
+                unstarted = archive.insns('func_a')
+
+            self.assertEqual(len(list(started)), 1)
+
+    def test_archive_duplicate(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = join(tmp_dir, 'funcs.pca')
+
+            with ArchiveWriter(path) as writer:
+                writer.add_json('func_a', insn_js)
+
+                with self.assertRaises(ValueError):
+                    writer.add_json('func_a', insn_js[1:])
+
+            with FunctionArchive(path) as archive:
+                self.assertEqual(len(list(archive.insns('func_a'))), 2)
+
+    def test_archive_abort(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = join(tmp_dir, 'funcs.pca')
+
+            with self.assertRaises(KeyError):
+                with ArchiveWriter(path) as writer:
+                    writer.add_json('func_a', insn_js)
+                    writer.add_json('func_b', [{}])
+
+            self.assertEqual(os.listdir(tmp_dir), [])
+
+            # A failed rebuild leaves the existing archive alone.
+            with ArchiveWriter(path) as writer:
+                writer.add_json('func_a', insn_js)
+
+            with self.assertRaises(KeyError):
+                with ArchiveWriter(path) as writer:
+                    writer.add_json('func_b', [{}])
+
+            self.assertEqual(os.listdir(tmp_dir), ['funcs.pca'])
+
+            with FunctionArchive(path) as archive:
+                self.assertEqual(archive.names(), ['func_a'])
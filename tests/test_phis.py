@@ -0,0 +1,86 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+
+from blocks import PcodeBlock
+from cfg import CFG
+from pcode import PcodeOp
+from varnode import Varnode
+
+reg_size = 4
+
+r1 = Varnode('register', 0, reg_size)
+r2 = Varnode('register', reg_size, reg_size)
+r3 = Varnode('register', reg_size * 2, reg_size)
+r4 = Varnode('register', reg_size * 3, reg_size)
+
+
+def make_diamond():
+    """
+    Both sides of the diamond write r1, r3 and r4 (r1 also in the entry).
+    r1 is read before being written (in d_block_2) but is dead at the join,
+    r3 is read after the join and r4 is never read at all.
+    """
+    d_block1 = PcodeBlock([PcodeOp(0, 'COPY', [r2], r1)], name='d_block_1')
+    d_block2 = PcodeBlock([PcodeOp(4, 'COPY', [r1], r3),
+                           PcodeOp(5, 'COPY', [r1], r4)], predecessor=d_block1, name='d_block_2')
+    d_block3 = PcodeBlock([PcodeOp(8, 'COPY', [r2], r3),
+                           PcodeOp(9, 'COPY', [r2], r1),
+                           PcodeOp(10, 'COPY', [r2], r4)], predecessor=d_block1, name='d_block_3')
+    d_block4 = PcodeBlock([PcodeOp(12, 'COPY', [r3], r2)], predecessor=d_block2, name='d_block_4')
+    d_block4.add_predecessor(d_block3)
+
+    return CFG([d_block1, d_block2, d_block3, d_block4]), d_block4
+
+
+class TestPhiPlacement(unittest.TestCase):
+    def phi_outputs(self, blk):
+        return {pcop.output for pcop in blk.phis()}
+
+    def test_minimal(self):
+        cfg, join_blk = make_diamond()
+        self.assertEqual(cfg.insert_phis(mode='minimal'), 3)
+        self.assertEqual(self.phi_outputs(join_blk), {r1, r3, r4})
+
+    def test_semi_pruned(self):
+        cfg, join_blk = make_diamond()
+        self.assertEqual(cfg.insert_phis(mode='semi-pruned'), 2)
+        self.assertEqual(self.phi_outputs(join_blk), {r1, r3})
+
+    def test_pruned(self):
+        cfg, join_blk = make_diamond()
+        self.assertEqual(cfg.insert_phis(mode='pruned'), 1)
+        self.assertEqual(self.phi_outputs(join_blk), {r3})
+
+    def test_no_phis_outside_frontier(self):
+        cfg, join_blk = make_diamond()
+        cfg.insert_phis(mode='minimal')
+
+        for blk in cfg.blocks:
+            if blk is not join_blk:
+                self.assertEqual(blk.num_phis(), 0)
+
+    def test_live_in(self):
+        cfg, join_blk = make_diamond()
+        live_in = cfg.live_in_varnodes()
+
+        self.assertEqual(live_in[cfg.entry], {r2})
+        self.assertEqual(live_in[join_blk], {r3})
+
+    def test_pruned_ssa(self):
+        cfg, join_blk = make_diamond()
+        cfg.convert_to_ssa(phi_mode='pruned')
+
+        phi = join_blk.pcode[0]
+        copy = join_blk.pcode[1]
+
+        self.assertTrue(phi.is_phi())
+        self.assertEqual(len(phi.inputs), 2)
+        self.assertIs(copy.inputs[0], phi.output)
+
+    def test_bad_mode(self):
+        cfg, _ = make_diamond()
+
+        with self.assertRaises(ValueError):
+            cfg.insert_phis(mode='maximal')
@@ -0,0 +1,131 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+
+from blocks import PcodeBlock
+from cfg import CFG
+from context import AnalysisContext
+from func import Function
+from pcode import PcodeOp
+from sccp import fold
+from varnode import Varnode
+
+reg_size = 4
+
+r1 = Varnode('register', 0, reg_size)
+r2 = Varnode('register', reg_size, reg_size)
+r3 = Varnode('register', reg_size * 2, reg_size)
+flag = Varnode('register', 0x200, 1)
+ram = Varnode('ram', 0x1000, reg_size)
+space = Varnode('const', 0x1b1, reg_size)
+
+
+def const(value, size=reg_size):
+    return Varnode('const', value, size)
+
+
+def make_branch(cond_value):
+    """
+    The entry compares r1 (always 5) against `cond_value` and branches to
+    c_block_3 when they're equal, falling through to c_block_2 otherwise.
+    Each side writes a different constant to r3, which is stored at the join.
+    """
+    c_block1 = PcodeBlock([PcodeOp(0, 'COPY', [const(5)], r1),
+                           PcodeOp(1, 'INT_EQUAL', [r1, const(cond_value)], flag),
+                           PcodeOp(2, 'CBRANCH', [Varnode('ram', 0x10, 8), flag])], name='c_block_1')
+    c_block2 = PcodeBlock([PcodeOp(8, 'COPY', [const(2)], r3),
+                           PcodeOp(9, 'BRANCH', [Varnode('ram', 0x20, 8)])], predecessor=c_block1, name='c_block_2')
+    c_block3 = PcodeBlock([PcodeOp(0x10, 'INT_ADD', [r1, const(1)], r3)], predecessor=c_block1, name='c_block_3')
+    c_block4 = PcodeBlock([PcodeOp(0x20, 'STORE', [space, ram, r3])], predecessor=c_block2, name='c_block_4')
+    c_block4.add_predecessor(c_block3)
+
+    return CFG([c_block1, c_block2, c_block3, c_block4])
+
+
+def vnode_js(space, offset, size):
+    return {'space': space, 'offset': hex(offset), 'size': hex(size)}
+
+
+def insn_js(addr, mnemonic, inputs, output=None):
+    pj = {'addr': float(addr), 'mnemonic': mnemonic, 'inputs': inputs}
+
+    if output is not None:
+        pj['output'] = output
+
+    return {'addr': hex(addr), 'length': 4, 'pcode': [pj]}
+
+
+def propagated(cfg):
+    with AnalysisContext():
+        cfg.convert_to_ssa()
+        dead = cfg.propagate_constants()
+        cfg.simplify()
+
+    return dead
+
+
+class TestSCCP(unittest.TestCase):
+    def test_fold(self):
+        out = Varnode('register', 0, 1)
+        cases = [('INT_ADD', [0xff, 1], 1, 0),
+                 ('INT_SUB', [0, 1], 1, 0xff),
+                 ('INT_SLESS', [0xff, 0], 1, 1),
+                 ('INT_LESS', [0xff, 0], 1, 0),
+                 ('INT_SDIV', [0xf9, 2], 1, 0xfd),
+                 ('INT_SRIGHT', [0x80, 7], 1, 0xff),
+                 ('INT_CARRY', [0xff, 1], 1, 1),
+                 ('INT_SCARRY', [0x7f, 1], 1, 1),
+                 ('BOOL_NEGATE', [1], 1, 0)]
+
+        for mnemonic, vals, size, res in cases:
+            pcop = PcodeOp(0, mnemonic, [const(v, size) for v in vals], out)
+            self.assertEqual(fold(pcop, vals), res, mnemonic)
+
+    def test_taken(self):
+        cfg = make_branch(5)
+        self.assertEqual(propagated(cfg), 1)
+
+        self.assertEqual(sorted(blk.name for blk in cfg.blocks), ['c_block_1', 'c_block_3', 'c_block_4'])
+
+        entry = cfg.entry
+        self.assertEqual(entry.pcode[-1].mnemonic, 'BRANCH')
+        self.assertEqual(entry.pcode[-1].target(), 0x10)
+
+        join = [blk for blk in cfg.blocks if blk.name == 'c_block_4'][0]
+        self.assertEqual(join.num_phis(), 0)
+        self.assertEqual(join.pcode[-1].inputs[2], const(6))
+
+    def test_not_taken(self):
+        cfg = make_branch(4)
+        self.assertEqual(propagated(cfg), 1)
+
+        self.assertEqual(sorted(blk.name for blk in cfg.blocks), ['c_block_1', 'c_block_2', 'c_block_4'])
+
+        join = [blk for blk in cfg.blocks if blk.name == 'c_block_4'][0]
+        self.assertEqual(join.pcode[-1].inputs[2], const(2))
+
+    def test_not_taken_json(self):
+        # The CBRANCH goes away rather than becoming a BRANCH to the fallthrough.
+        r0 = vnode_js('register', 0, 8)
+        f = vnode_js('register', 0x200, 1)
+        func = Function.fromjson([insn_js(0, 'COPY', [vnode_js('const', 0, 8)], r0),
+                                  insn_js(4, 'INT_EQUAL', [r0, vnode_js('const', 1, 8)], f),
+                                  insn_js(8, 'CBRANCH', [vnode_js('ram', 0x10, 8), f]),
+                                  insn_js(0xc, 'COPY', [vnode_js('const', 2, 8)], r0),
+                                  insn_js(0x10, 'RETURN', [r0])])
+
+        self.assertNotIn('CBRANCH', str(func))
+        self.assertNotIn('BRANCH', [pcop.mnemonic for blk in func.cfg.blocks for pcop in blk.pcode])
+        self.assertEqual([succ.start for succ in func.cfg.entry.successors], [0xc])
+        func.tojson()
+
+    def test_unknown_condition(self):
+        cfg = make_branch(4)
+        cfg.entry.pcode[0] = PcodeOp(0, 'LOAD', [space, ram], r1)
+
+        self.assertEqual(propagated(cfg), 0)
+        self.assertEqual(len(cfg.blocks), 4)
+
+        join = [blk for blk in cfg.blocks if blk.name == 'c_block_4'][0]
+        self.assertEqual(join.num_phis(), 1)
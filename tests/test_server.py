@@ -0,0 +1,90 @@
+import sys
+sys.path.insert(0, '..')
+sys.path.insert(0, '../gui')
+
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from os.path import join
+
+import server
+from synth import synthesize
+
+NAMES = ['func_%d' % i for i in range(4)]
+
+
+def strip_ids(j):
+    # Ids are addresses of the objects, so they differ between analyses.
+    if isinstance(j, dict):
+        return {key: strip_ids(value) for key, value in j.items() if key not in ['id', 'defn', 'pcop']}
+    elif isinstance(j, list):
+        return [strip_ids(value) for value in j]
+
+    return j
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.funcs_dir = server.FUNCS_DIR
+        server.FUNCS_DIR = self.tmp_dir.name
+        server.analysis_cache = server.AnalysisCache()
+
+        for seed, name in enumerate(NAMES):
+            with open(join(self.tmp_dir.name, '%s.json' % name), 'w') as f:
+                json.dump(synthesize(100, seed=seed), f)
+
+        self.client = server.app.test_client()
+
+    def tearDown(self):
+        server.FUNCS_DIR = self.funcs_dir
+        self.tmp_dir.cleanup()
+
+    def fetch(self, name):
+        skeleton = self.client.get('/cfg/skeleton?func=%s' % name).get_json()
+        blocks = [self.client.get('/cfg/block?func=%s&addr=%s' % (name, addr)).get_json() \
+                  for addr in sorted(skeleton['blocks'])]
+
+        return skeleton, strip_ids(blocks)
+
+    def test_concurrent_functions(self):
+        expected = {name: self.fetch(name) for name in NAMES}
+        server.analysis_cache = server.AnalysisCache()
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(self.fetch, NAMES * 3))
+
+        self.assertEqual(results, [expected[name] for name in NAMES * 3])
+
+    def test_concurrent_same_function(self):
+        load_insns = server.load_insns
+        num_loads = []
+
+        def counting_load(path):
+            num_loads.append(path)
+            return load_insns(path)
+
+        server.load_insns = counting_load
+
+        try:
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(self.fetch, [NAMES[0]] * 8))
+        finally:
+            server.load_insns = load_insns
+
+        self.assertEqual(len(num_loads), 1)
+        self.assertTrue(all(result == results[0] for result in results))
+
+    def test_stale(self):
+        self.fetch(NAMES[0])
+        path = join(self.tmp_dir.name, '%s.json' % NAMES[0])
+        first = server.analysis_cache.get(path)
+
+        os.utime(path, (0, 0))
+        self.assertIsNot(server.analysis_cache.get(path), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
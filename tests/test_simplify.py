@@ -0,0 +1,80 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+
+from blocks import PcodeBlock
+from cfg import CFG
+from context import AnalysisContext
+from pcode import PcodeOp
+from varnode import Varnode
+
+reg_size = 4
+
+r1 = Varnode('register', 0, reg_size)
+r2 = Varnode('register', reg_size, reg_size)
+r3 = Varnode('register', reg_size * 2, reg_size)
+ram = Varnode('ram', 0x1000, reg_size)
+zero = Varnode('const', 0, reg_size)
+one = Varnode('const', 1, reg_size)
+space = Varnode('const', 0x1b1, reg_size)
+
+
+def simplified(pcode):
+    with AnalysisContext():
+        blk = PcodeBlock(pcode, name='s_block_1')
+        cfg = CFG([blk])
+        cfg.convert_to_ssa()
+        cfg.simplify()
+
+    return blk
+
+
+class TestSimplify(unittest.TestCase):
+    def test_dead_chain(self):
+        # Each op only becomes dead once the one after it is gone.
+        pcode = [PcodeOp(i, 'INT_ADD', [r1, one], r1) for i in range(100)]
+        pcode.append(PcodeOp(100, 'STORE', [space, ram, r2]))
+
+        blk = simplified(pcode)
+
+        self.assertEqual([pcop.mnemonic for pcop in blk.pcode], ['STORE'])
+
+    def test_copy_propagation(self):
+        blk = simplified([PcodeOp(0, 'INT_ADD', [r1, zero], r2),
+                          PcodeOp(1, 'INT_OR', [r2, zero], r3),
+                          PcodeOp(2, 'STORE', [space, ram, r3])])
+
+        self.assertEqual(len(blk.pcode), 1)
+
+        store = blk.pcode[0]
+        src = store.inputs[2]
+
+        self.assertEqual(src.base(), r1)
+        self.assertEqual(src.version, 0)
+        self.assertEqual(src.users(), [store])
+
+    def test_propagation_keeps_live_defn(self):
+        # r2 is used by the store as well as the copy into r3, so it has to
+        # survive propagating the copy.
+        blk = simplified([PcodeOp(0, 'INT_ADD', [r1, one], r2),
+                          PcodeOp(1, 'COPY', [r2], r3),
+                          PcodeOp(2, 'STORE', [space, ram, r2]),
+                          PcodeOp(3, 'STORE', [space, ram, r3])])
+
+        self.assertEqual([pcop.mnemonic for pcop in blk.pcode], ['INT_ADD', 'STORE', 'STORE'])
+        self.assertIs(blk.pcode[1].inputs[2], blk.pcode[0].output)
+        self.assertIs(blk.pcode[2].inputs[2], blk.pcode[0].output)
+        self.assertEqual(blk.pcode[0].output.num_uses(), 2)
+
+    def test_repeated_input(self):
+        # r2 = r1 & r1 reads r1 twice through a single use.
+        blk = simplified([PcodeOp(0, 'INT_ADD', [r1, one], r1),
+                          PcodeOp(1, 'INT_AND', [r1, r1], r2),
+                          PcodeOp(2, 'STORE', [space, ram, r2])])
+
+        self.assertEqual([pcop.mnemonic for pcop in blk.pcode], ['INT_ADD', 'STORE'])
+
+        add, store = blk.pcode
+        self.assertEqual(add.output.users(), [store])
+        self.assertEqual(add.output.get_use(store).idxs, [2])
@@ -0,0 +1,71 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+
+from cfg import CFG
+from context import AnalysisContext
+from func import Function
+from synth import synthesize
+
+
+def build(insns):
+    with AnalysisContext() as ctx:
+        cfg = CFG.fromjson(insns)
+
+    return cfg, ctx
+
+
+def back_edges(cfg):
+    return [(blk, succ) for blk in cfg.blocks for succ in blk.successors if cfg.dominates(succ, blk)]
+
+
+def mnemonics(insns):
+    return [pj['mnemonic'] for ij in insns for pj in ij['pcode']]
+
+
+class TestSynth(unittest.TestCase):
+    def test_deterministic(self):
+        self.assertEqual(synthesize(50, seed=3), synthesize(50, seed=3))
+        self.assertNotEqual(synthesize(50, seed=3), synthesize(50, seed=4))
+
+    def test_block_count(self):
+        for num_blocks in [10, 200]:
+            cfg, _ = build(synthesize(num_blocks))
+
+            self.assertGreater(len(cfg.blocks), num_blocks * 0.8)
+            self.assertLess(len(cfg.blocks), num_blocks * 1.2)
+            self.assertTrue(all(cfg.is_reachable(blk) for blk in cfg.blocks))
+
+    def test_loops(self):
+        cfg, _ = build(synthesize(200, loop_depth=0))
+        self.assertEqual(len(back_edges(cfg)), 0)
+
+        cfg, _ = build(synthesize(200, loop_depth=2))
+        self.assertGreater(len(back_edges(cfg)), 0)
+
+    def test_switch_fanout(self):
+        # The default and every case end up at the end of the switch.
+        cfg, _ = build(synthesize(200, loop_depth=0, switch_fanout=6))
+        self.assertTrue(any(len(blk.predecessors) >= 7 for blk in cfg.blocks))
+
+    def test_call_density(self):
+        self.assertNotIn('CALL', mnemonics(synthesize(100, call_density=0)))
+        self.assertIn('CALL', mnemonics(synthesize(100, call_density=0.2)))
+
+    def test_registers(self):
+        insns = synthesize(100, num_regs=3, call_density=0)
+        regs = set(int(pj['output']['offset'], 16) for ij in insns for pj in ij['pcode'] \
+                   if 'output' in pj and pj['output']['space'] == 'register' and pj['output']['size'] == '0x8')
+
+        # Plus the stack pointer and PC from the epilogue.
+        self.assertEqual(len(regs), 3 + 2)
+
+    def test_pipeline(self):
+        cfg, ctx = build(synthesize(100))
+        func = Function(cfg, ctx)
+        self.assertGreater(len(func.cfg.blocks), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import sys
+sys.path.insert(0, '..')
+
+import unittest
+
+from graph import Graph
+from node import Node
+from traversal import Traversal, dfs
+
+# Diamond with a back edge: 1 -> {2, 3} -> 4 -> 1
+d_node1 = Node(name='d_node_1')
+d_node2 = Node(d_node1, name='d_node_2')
+d_node3 = Node(d_node1, name='d_node_3')
+d_node4 = Node(d_node2, name='d_node_4')
+d_node4.add_predecessor(d_node3)
+d_node1.add_predecessor(d_node4)
+
+# Long chain, deeper than the default recursion limit.
+chain_len = 5 * sys.getrecursionlimit()
+chain_nodes = [Node(name='chain_node_0')]
+for i in range(1, chain_len):
+    chain_nodes.append(Node(chain_nodes[-1], name='chain_node_%d' % i))
+
+
+def recursive_dfs(node, visited, events):
+    events.append(('pre', node))
+    visited.add(node)
+
+    for succ in node.successors:
+        if succ not in visited:
+            recursive_dfs(succ, visited, events)
+
+    events.append(('post', node))
+
+
+class TestTraversal(unittest.TestCase):
+    def test_matches_recursive_order(self):
+        expected = []
+        recursive_dfs(d_node1, set(), expected)
+
+        events = []
+        dfs(d_node1,
+            set(),
+            pre_fn=lambda n: events.append(('pre', n)),
+            post_fn=lambda n: events.append(('post', n)))
+
+        self.assertEqual(events, expected)
+
+    def test_orders(self):
+        trav = Traversal([d_node1])
+
+        self.assertEqual(len(trav), 4)
+        self.assertEqual(trav.preorder[0], d_node1)
+        self.assertEqual(trav.postorder[-1], d_node1)
+        self.assertEqual(trav.postorder[0], d_node4)
+        self.assertEqual(trav.reverse_postorder, trav.postorder[::-1])
+
+        # Every forward edge goes later in reverse postorder.
+        rpo_idx = {node: i for i, node in enumerate(trav.reverse_postorder)}
+        self.assertLess(rpo_idx[d_node1], rpo_idx[d_node2])
+        self.assertLess(rpo_idx[d_node1], rpo_idx[d_node3])
+        self.assertLess(rpo_idx[d_node2], rpo_idx[d_node4])
+        self.assertLess(rpo_idx[d_node3], rpo_idx[d_node4])
+
+    def test_custom_successors(self):
+        trav = Traversal([d_node4], successors=lambda n: n.predecessors)
+
+        self.assertEqual(set(trav.preorder), {d_node1, d_node2, d_node3, d_node4})
+        self.assertEqual(trav.preorder[0], d_node4)
+
+    def test_deep_chain(self):
+        trav = Traversal([chain_nodes[0]])
+
+        self.assertEqual(trav.preorder, chain_nodes)
+        self.assertEqual(trav.postorder, chain_nodes[::-1])
+
+    def test_graph_dfs_deep_chain(self):
+        visited = []
+        graph = Graph(chain_nodes)
+        graph.dfs(post_fn=visited.append)
+
+        self.assertEqual(visited, chain_nodes[::-1])
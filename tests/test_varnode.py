@@ -0,0 +1,79 @@
+import sys
+sys.path.insert(0, '..')
+
+import gc
+import pickle
+import unittest
+
+from pcode import PcodeOp
+from varnode import Varnode, SSAVarnode
+
+reg_size = 8
+
+r1 = Varnode('register', 0, reg_size)
+r2 = Varnode('register', reg_size, reg_size)
+
+
+class TestVarnode(unittest.TestCase):
+    def test_interned(self):
+        self.assertIs(Varnode('register', 0, reg_size), r1)
+        self.assertIs(Varnode.reg(reg_size, reg_size), r2)
+        self.assertIs(Varnode.fromjson({'space': 'register', 'offset': '0x0', 'size': '0x8'}), r1)
+        self.assertIs(pickle.loads(pickle.dumps(r1)), r1)
+
+    def test_interned_weakly(self):
+        key = ('ram', 0xdeadbeef, reg_size)
+        vnode = Varnode(*key)
+        self.assertIn(key, Varnode.INTERNED)
+
+        del vnode
+        gc.collect()
+        self.assertNotIn(key, Varnode.INTERNED)
+
+    def test_equality(self):
+        self.assertEqual(r1, Varnode('register', 0, reg_size))
+        self.assertNotEqual(r1, r2)
+        self.assertNotEqual(r1, Varnode('unique', 0, reg_size))
+        self.assertEqual(r2, reg_size)
+        self.assertEqual(hash(r1), hash(Varnode('register', 0, reg_size)))
+
+    def test_spaces(self):
+        self.assertTrue(r1.is_register())
+        self.assertTrue(Varnode('const', 1, 4).is_const())
+        self.assertTrue(Varnode('unique', 0x100, 4).is_unique())
+        self.assertTrue(Varnode('ram', 0x1000, 8).is_ram())
+        self.assertFalse(Varnode('stack', 0x10, 8).is_ram())
+
+    def test_ssa_varnodes(self):
+        v1 = SSAVarnode('register', 0, reg_size, None)
+        v2 = SSAVarnode('register', 0, reg_size, None)
+
+        self.assertIs(v1.base(), r1)
+        self.assertIs(v2.base(), r1)
+        self.assertEqual(v2.version, v1.version + 1)
+
+        self.assertNotEqual(v1, v2)
+        self.assertEqual(v1, r1)
+        self.assertEqual(hash(v1), hash(r1))
+        self.assertIs(SSAVarnode.get_latest(r1), v2)
+
+    def test_uses(self):
+        v = SSAVarnode('register', reg_size, reg_size, None)
+        w = SSAVarnode('register', 0, reg_size, None)
+        pcop1 = PcodeOp(0, 'INT_AND', [v, v], w)
+        pcop2 = PcodeOp(1, 'COPY', [v], w)
+
+        v.add_use(pcop1, idx=0)
+        v.add_use(pcop1, idx=1)
+        v.add_use(pcop2)
+
+        self.assertEqual(v.num_uses(), 2)
+        self.assertEqual(v.get_use(pcop1).idxs, [0, 1])
+        self.assertEqual(v.get_use(pcop2).idxs, [0])
+
+        pcop1.inputs[1] = w
+        v.update_use(pcop1)
+        self.assertEqual(v.get_use(pcop1).idxs, [0])
+
+        v.remove_use(pcop1)
+        self.assertEqual(v.users(), [pcop2])